@@ -6,24 +6,25 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 # 웹 화면 생성 라이브러리 
 import streamlit as st
-from src.rag import answer_question
+from src.engine import get_engine
 
 import uuid
-import random
-from src.storage import log_event
+from src.config import UI_EXPERIMENT
+from src.experiments import get_experiment
+from src.manifest import list_documents
+from src.retrievers import doc_filter
+from src.storage import log_query, log_vote
 
 
 
-#  a/b 테스트 실험 설계도 작성
+#  a/b 테스트 실험 설계도: experiments/experiments.json 에서 읽음 (arm 별 top_k / retriever / model / prompt)
 
 # DB에서 데이터를 가져올떄 구분자
-EXPERIMENT = "topk_ab"
-# 실험의 핵심 설정 k=3와 k=5로 설정
-TOPK_BY_VARIANT = {"A": 2, "B": 4}
+EXPERIMENT = UI_EXPERIMENT
 
 
 st.set_page_config(page_title="Mini RAG Q&A (A/B)", layout="wide")
-st.title("Mini RAG: PDF Q&A + A/B (top_k)")
+st.title(f"Mini RAG: PDF Q&A + A/B ({EXPERIMENT})")
 
 # st.markdown("Ask questions about the indexed PDF.")
 
@@ -36,38 +37,59 @@ st.title("Mini RAG: PDF Q&A + A/B (top_k)")
 if "session_id" not in st.session_state:
     st.session_state.session_id = str(uuid.uuid4())
 
-# random choice를 통해 사용자를 A로 보낼지 B로 보낼지 결정(A/B 테스트의 핵심)
-if "variant" not in st.session_state:
-    st.session_state.variant = random.choice(["A", "B"])
+# session_id 해시로 arm 결정(A/B 테스트의 핵심) - 같은 세션은 항상 같은 arm, 비율은 arm 의 weight
+@st.cache_resource
+def load_experiment():
+    return get_experiment(EXPERIMENT)
 
+
+arm = load_experiment().assign(st.session_state.session_id)
 # variant 확인
-variant = st.session_state.variant
+variant = arm.name
 # 확인된 variant에 따라 k 설정
-top_k = TOPK_BY_VARIANT[variant]
+top_k = arm.top_k
 
 
 
 # 화면에 variant 표시
-st.caption(f"Experiment: {EXPERIMENT} | Session: {st.session_state.session_id[:8]} | Variant: {variant} | top_k={top_k}")
+st.caption(f"Experiment: {EXPERIMENT} | Session: {st.session_state.session_id[:8]} | Variant: {variant} | {arm.describe()}")
 
 # 질문 입력 박스 생성
 question = st.text_input("Enter your question:")
 
+# 엔진(임베딩/LLM 클라이언트, Chroma 컬렉션)은 모든 세션이 공유 - 질문마다 새로 만들지 않음
+@st.cache_resource
+def load_engine(collection=None):
+    return get_engine(collection)
+
+
+# 인덱싱된 문서가 여러 개면 검색할 문서를 고를 수 있게 (아무것도 안 고르면 전체 검색)
+documents = list_documents(arm.collection) if arm.collection else list_documents()
+selected_docs = []
+if len(documents) > 1:
+    titles = {d["doc_id"]: f"{d['title']} ({d['doc_id']})" for d in documents}
+    selected_docs = st.multiselect("Search in documents (empty = all)", list(titles), format_func=titles.get)
+
+
 if "last_result" not in  st.session_state:
     st.session_state.last_result = None
 
 
 
 if st.button("Ask") and question:
-    # 로딩 애니메이션 삽입(돌아가는)
-    with st.spinner("Thinking..."):
-        # rag.py 함수 호출
-        answer, citations, sources, elapsed, source_pages = answer_question(question, top_k = top_k)
+    # 중간 크기의 제목
+    st.subheader("Answer")
+    # 답변을 토큰 단위로 받아서 바로바로 화면에 출력 (전체 답변을 기다리지 않음)
+    stream = load_engine(arm.collection).stream_answer(question, **arm.answer_kwargs(),
+                                                       where=doc_filter(selected_docs))
+    st.write_stream(stream)
+    result = stream.result
+    answer, citations, sources, elapsed, source_pages = result.as_tuple()
 
     latency_ms = int(elapsed * 1000)
 
-    # 질문 이벤트 1회 DB에 로깅, experiments/events.db
-    log_event(
+    # 질문 이벤트 1회 DB에 로깅, experiments/events.db (queries 테이블). 투표는 query_id 로 연결
+    query_id = log_query(
         session_id=st.session_state.session_id,
         experiment=EXPERIMENT,
         variant=variant,
@@ -78,7 +100,10 @@ if st.button("Ask") and question:
         source_pages=source_pages,
         # DB 용량을 적정 수준으로 유지하기 위해.
         answer=answer[:2000],
-        user_vote=None,
+        timings=result.timings,
+        cache_hit=result.cache_hit,
+        retriever=result.retriever,
+        usage=result.usage,
     )
 
 
@@ -87,24 +112,23 @@ if st.button("Ask") and question:
     # 단순히 RAG 결과를 보여주는 것에서 나아가 이 결과에 대한 유저의 만족도를 수집하기 위함
     # 피드백 숮비을 통해 실제 서비스 운영과 성능 개선(RLHF의 기초)
 
-    # 중간 크기의 제목
-    st.subheader("Answer")
-    # write, gpt 답변을 화면에 출력
-    st.write(answer)
     st.write(citations)
 
     st.subheader("Sources")
     for i, s in enumerate(sources, 1):
         # 글자를 굵게 표시 **...**
-        st.markdown(f"**{i}. Page {s['page']}**")
+        st.markdown(f"**{i}. {s['doc_id']} - Page {s['page']}**" if s.get("doc_id") else f"**{i}. Page {s['page']}**")
         st.write(s["snippet"])
     # 최 하단 작은 폰트로
-    st.caption(f"Latency: {elapsed:.2f}s")
+    st.caption(f"Latency: {elapsed:.2f}s | " + " | ".join(f"{k}={v:.0f}" for k, v in result.timings.items())
+               + "".join(f" | {k}={v}" for k, v in result.usage.items())
+               + (f" | cached ({result.cache_hit})" if result.cache_hit else ""))
 
 
 
     # 만족도 투표을 위한 session state에 임시 저장 
     st.session_state.last_result = {
+        "query_id": query_id,
         "question": question,
         "answer": answer,
         "citations": citations,
@@ -112,6 +136,8 @@ if st.button("Ask") and question:
         "latency_ms": latency_ms,
         "top_k": top_k,
         "variant": variant,
+        "cache_hit": result.cache_hit,
+        "retriever": result.retriever,
     }
 
 
@@ -129,36 +155,14 @@ if st.session_state.last_result is not None:
         if st.button("👍 Good"):
             # session_state에서 데이터 꺼내기
             r = st.session_state.last_result
-            
-            log_event(
-                session_id=st.session_state.session_id,
-                experiment=EXPERIMENT,
-                variant=r["variant"],
-                question=r["question"],
-                top_k=r["top_k"],
-                latency_ms=r["latency_ms"],
-                citations=r["citations"],
-                source_pages=r["source_pages"],
-                answer=r["answer"][:2000],
-                user_vote="up", # UP이라고 DB에 기록
-            )
+            # 질문/답변은 이미 queries 에 있으므로 투표만 기록
+            log_vote(r["query_id"], st.session_state.session_id, EXPERIMENT, r["variant"], "up")  # UP이라고 DB에 기록
             st.success("Logged 👍")
 
     with c2:
         if st.button("👎 Bad"):
             r = st.session_state.last_result
-            log_event(
-                session_id=st.session_state.session_id,
-                experiment=EXPERIMENT,
-                variant=r["variant"],
-                question=r["question"],
-                top_k=r["top_k"],
-                latency_ms=r["latency_ms"],
-                citations=r["citations"],
-                source_pages=r["source_pages"],
-                answer=r["answer"][:2000],
-                user_vote="down",
-            )
+            log_vote(r["query_id"], st.session_state.session_id, EXPERIMENT, r["variant"], "down")
             st.success("Logged 👎")
 # 얇은 줄을 통해 시각적으로 분리해 주는 역할
 st.divider()
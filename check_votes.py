@@ -1,31 +1,4 @@
-import sqlite3
+# python -m src votes 와 같음 (예전 스크립트 이름 유지)
+from src.cli import votes
 
-conn = sqlite3.connect("experiments/events.db")
-cur = conn.cursor()
-
-print("=== vote 개수 ===")
-cur.execute("SELECT count(*) FROM events WHERE user_vote IS NOT NULL")
-print(cur.fetchone())
-
-print("\n=== vote가 있는 행 요약 ===")
-cur.execute("""
-SELECT experiment, variant, user_vote, count(*)
-FROM events
-WHERE user_vote IS NOT NULL
-GROUP BY experiment, variant, user_vote
-ORDER BY count(*) DESC
-""")
-for row in cur.fetchall():
-    print(row)
-
-print("\n=== experiment 목록 ===")
-cur.execute("""
-SELECT experiment, count(*)
-FROM events
-GROUP BY experiment
-ORDER BY count(*) DESC
-""")
-for row in cur.fetchall():
-    print(row)
-
-conn.close()
\ No newline at end of file
+votes()
@@ -0,0 +1,4 @@
+"""python -m src <command> - see src/cli.py."""
+from src.cli import main
+
+main()
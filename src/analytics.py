@@ -0,0 +1,249 @@
+"""SQL-side aggregation over the events DB (queries / votes tables).
+
+행을 파이썬 리스트로 전부 가져오지 않는다.
+- 건수, 투표 집계: SQL GROUP BY
+- latency 분위수(p50/p90/p99): SQL 에서 ms 단위 히스토그램(값, 개수)을 만들고 NumPy 누적합으로 계산
+  메모리는 행 수가 아니라 서로 다른 latency 값의 개수에 비례 -> 수천만 행이어도 수만 개 정도
+  latency_ms 는 정수 ms 이므로 결과는 근사가 아닌 정확한 값 (ttft_ms 등 REAL 컬럼은 1ms 단위로 반올림)
+- 시간 구간(since/until, epoch ms)과 임의의 experiment / variant 집합으로 필터
+
+    from src.analytics import latency_stats
+    latency_stats(["topk_ab"], since_ms=parse_time("7d"))
+"""
+import re
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Sequence, Tuple
+
+from src.storage import flush, get_conn
+
+PERCENTILES = (50, 90, 99)
+# 히스토그램을 만들 수 있는 컬럼 (SQL 에 그대로 들어가므로 화이트리스트)
+METRICS = ("latency_ms", "ttft_ms", "generate_ms", "embed_ms", "retrieve_ms", "shared_retrieval_ms",
+           "prompt_tokens", "completion_tokens", "context_tokens")
+
+# latency 분석에서 빼는 캐시 hit: 답변 캐시(cache_hit) 와 검색 결과 캐시(retrieval_cache_hit)
+UNCACHED_SQL = " AND cache_hit IS NULL AND retrieval_cache_hit IS NULL"
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_RELATIVE_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNIT_S = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_time(value: Optional[str]) -> Optional[int]:
+    """'7d' / '24h' / '30m' (ago), an ISO date/time (UTC) or epoch ms -> epoch ms."""
+    if value is None or value == "":
+        return None
+    m = _RELATIVE_RE.match(value)
+    if m:
+        return int((time.time() - float(m.group(1)) * _UNIT_S[m.group(2)]) * 1000)
+    if value.isdigit():
+        return int(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _window(since_ms: Optional[int], until_ms: Optional[int]) -> Tuple[str, list]:
+    sql, params = "", []
+    if since_ms is not None:
+        sql += " AND ts_ms >= ?"
+        params.append(since_ms)
+    if until_ms is not None:
+        sql += " AND ts_ms < ?"
+        params.append(until_ms)
+    return sql, params
+
+
+def variants_of(conn, table: str, experiment: str) -> list:
+    """Distinct variants of an experiment via index seeks (no scan over the experiment's rows)."""
+    out, last = [], None
+    while True:
+        if last is None:
+            row = conn.execute(f"SELECT MIN(variant) FROM {table} WHERE experiment = ?", (experiment,)).fetchone()
+        else:
+            row = conn.execute(f"SELECT MIN(variant) FROM {table} WHERE experiment = ? AND variant > ?",
+                               (experiment, last)).fetchone()
+        if row[0] is None:
+            return out
+        last = row[0]
+        out.append(last)
+
+
+def _pairs(conn, table: str, experiments: Iterable[str], variants: Optional[Sequence[str]]):
+    for experiment in experiments:
+        for variant in (variants if variants is not None else variants_of(conn, table, experiment)):
+            yield experiment, variant
+
+
+def histograms(experiments: Iterable[str], variants: Optional[Sequence[str]] = None, since_ms=None, until_ms=None,
+               metric: str = "latency_ms", include_cached: bool = False,
+               by_experiment: bool = False) -> Dict[object, Tuple["np.ndarray", "np.ndarray"]]:
+    """{variant (or (experiment, variant)): (values, counts)} with values sorted ascending."""
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric!r} (expected one of {', '.join(METRICS)})")
+    flush()
+    value = metric if metric == "latency_ms" or metric.endswith("_tokens") else f"CAST(ROUND({metric}) AS INTEGER)"
+    window_sql, window_params = _window(since_ms, until_ms)
+    cached_sql = "" if include_cached else UNCACHED_SQL
+    # (experiment, variant) 쌍마다 따로 질의 -> idx_queries_latency_hist 를 latency 순서대로 읽음
+    sql = f"""
+        SELECT {value} AS v, COUNT(*)
+        FROM queries
+        WHERE experiment = ? AND variant = ?{cached_sql} AND {metric} IS NOT NULL{window_sql}
+        GROUP BY v
+    """
+    merged: Dict[object, Dict[int, int]] = {}
+    conn = get_conn()
+    try:
+        for experiment, variant in _pairs(conn, "queries", experiments, variants):
+            key = (experiment, variant) if by_experiment else variant
+            hist = merged.setdefault(key, {})
+            for v, c in conn.execute(sql, [experiment, variant] + window_params):
+                hist[v] = hist.get(v, 0) + c
+    finally:
+        conn.close()
+
+    # numpy 는 실제로 계산할 때만 import (분석 CLI 의 시작 시간을 줄이려고)
+    import numpy as np
+
+    out = {}
+    for key, hist in merged.items():
+        if not hist:
+            continue
+        values = np.fromiter(hist.keys(), dtype=np.float64, count=len(hist))
+        counts = np.fromiter(hist.values(), dtype=np.int64, count=len(hist))
+        order = np.argsort(values)
+        out[key] = (values[order], counts[order])
+    return out
+
+
+def percentile(values: "np.ndarray", counts: "np.ndarray", q: float) -> float:
+    """Nearest-rank percentile of a histogram (same as sorting every row and indexing)."""
+    import numpy as np
+
+    cum = np.cumsum(counts)
+    rank = max(1, int(np.ceil(q / 100 * cum[-1])))
+    return float(values[np.searchsorted(cum, rank)])
+
+
+def summarize_histogram(values: "np.ndarray", counts: "np.ndarray", percentiles=PERCENTILES, unit: str = "ms") -> dict:
+    n = int(counts.sum())
+    row = {"n": n, f"mean_{unit}": round(float((values * counts).sum() / n), 1)}
+    for q in percentiles:
+        row[f"p{q}_{unit}"] = percentile(values, counts, q)
+    row[f"min_{unit}"], row[f"max_{unit}"] = float(values[0]), float(values[-1])
+    return row
+
+
+def latency_stats(experiments: Iterable[str], variants: Optional[Sequence[str]] = None, since_ms=None,
+                  until_ms=None, metric: str = "latency_ms", include_cached: bool = False,
+                  by_experiment: bool = False) -> dict:
+    """{variant: {n, mean_ms, p50_ms, p90_ms, p99_ms, min_ms, max_ms}} computed from SQL histograms.
+
+    *_tokens 컬럼이면 키 단위가 ms 대신 tok (mean_tok, p50_tok ...).
+    """
+    hists = histograms(experiments, variants, since_ms, until_ms, metric, include_cached, by_experiment)
+    unit = "tok" if metric.endswith("_tokens") else "ms"
+    return {key: summarize_histogram(values, counts, unit=unit) for key, (values, counts) in sorted(hists.items())}
+
+
+def vote_stats(experiments: Iterable[str], variants: Optional[Sequence[str]] = None, since_ms=None,
+               until_ms=None, by_experiment: bool = False) -> dict:
+    """{variant: {votes, up, down, up_rate_%}} from one GROUP BY over the votes table."""
+    experiments = list(experiments)
+    flush()
+    window_sql, window_params = _window(since_ms, until_ms)
+    params = experiments[:]
+    variant_sql = ""
+    if variants is not None:
+        variant_sql = f" AND variant IN ({', '.join('?' * len(variants))})"
+        params += list(variants)
+    conn = get_conn()
+    rows = conn.execute(
+        f"""
+        SELECT experiment, variant, vote, COUNT(*)
+        FROM votes
+        WHERE experiment IN ({', '.join('?' * len(experiments))}){variant_sql}{window_sql}
+        GROUP BY experiment, variant, vote
+        """,
+        params + window_params,
+    ).fetchall()
+    conn.close()
+
+    out = {}
+    for experiment, variant, vote, n in rows:
+        key = (experiment, variant) if by_experiment else variant
+        row = out.setdefault(key, {"votes": 0, "up": 0, "down": 0})
+        row["votes"] += n
+        if vote in ("up", "down"):
+            row[vote] += n
+    for row in out.values():
+        rated = row["up"] + row["down"]
+        row["up_rate_%"] = round(row["up"] / rated * 100, 1) if rated else None
+    return dict(sorted(out.items()))
+
+
+def query_counts(experiments: Iterable[str], since_ms=None, until_ms=None) -> dict:
+    """{(experiment, variant): {queries, cache_hits, retrieval_cache_hits}}."""
+    experiments = list(experiments)
+    flush()
+    window_sql, window_params = _window(since_ms, until_ms)
+    conn = get_conn()
+    rows = conn.execute(
+        f"""
+        SELECT experiment, variant, COUNT(*), COUNT(cache_hit), COUNT(retrieval_cache_hit)
+        FROM queries
+        WHERE experiment IN ({', '.join('?' * len(experiments))}){window_sql}
+        GROUP BY experiment, variant
+        """,
+        experiments + window_params,
+    ).fetchall()
+    conn.close()
+    return {(e, v): {"queries": n, "cache_hits": hits, "retrieval_cache_hits": r_hits}
+            for e, v, n, hits, r_hits in rows}
+
+
+def _series(sql_select: str, table: str, experiments, variants, bucket_ms: int, since_ms, until_ms,
+            extra_where: str = "") -> list:
+    experiments, variants = list(experiments), list(variants)
+    flush()
+    window_sql, window_params = _window(since_ms, until_ms)
+    conn = get_conn()
+    rows = conn.execute(
+        f"""
+        SELECT ts_ms / ? AS bucket, variant, {sql_select}
+        FROM {table}
+        WHERE experiment IN ({', '.join('?' * len(experiments))})
+          AND variant IN ({', '.join('?' * len(variants))}){extra_where}{window_sql}
+        GROUP BY bucket, variant
+        ORDER BY bucket
+        """,
+        [bucket_ms] + experiments + variants + window_params,
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def vote_series(experiments, variants, bucket_ms: int = 86_400_000, since_ms=None, until_ms=None) -> list:
+    """[(bucket_start_ms, {variant: (up, rated)})] per time bucket, oldest first (not cumulative)."""
+    rows = _series("SUM(vote = 'up'), SUM(vote IN ('up', 'down'))", "votes", experiments, variants,
+                   bucket_ms, since_ms, until_ms)
+    out = {}
+    for bucket, variant, up, rated in rows:
+        out.setdefault(bucket * bucket_ms, {})[variant] = (up or 0, rated or 0)
+    return sorted(out.items())
+
+
+def latency_series(experiments, variants, bucket_ms: int = 86_400_000, since_ms=None, until_ms=None,
+                   include_cached: bool = False) -> list:
+    """[(bucket_start_ms, {variant: (n, sum_ms, sum_sq_ms)})] per time bucket, oldest first (not cumulative)."""
+    rows = _series("COUNT(latency_ms), SUM(latency_ms), SUM(latency_ms * latency_ms)", "queries", experiments,
+                   variants, bucket_ms, since_ms, until_ms, "" if include_cached else UNCACHED_SQL)
+    out = {}
+    for bucket, variant, n, s, ss in rows:
+        out.setdefault(bucket * bucket_ms, {})[variant] = (n, float(s or 0), float(ss or 0))
+    return sorted(out.items())
@@ -1,61 +1,181 @@
-import sqlite3
-from pathlib import Path
-import statistics
+import argparse
+import time
 
-DB_PATH = Path("experiments") / "events.db"
+from src import stats
+from src.analytics import (
+    histograms,
+    latency_stats,
+    latency_series,
+    parse_time,
+    query_counts,
+    summarize_histogram,
+    vote_series,
+    vote_stats,
+)
+from src.experiments import load_experiments
 
-def main():
-    conn = sqlite3.connect(DB_PATH)
-    rows = conn.execute(
-        """
-        SELECT variant, latency_ms, user_vote
-        FROM events
-        WHERE experiment IN ('topk_ab', 'topk_ab_offline_k2_k4')
-        """
-    ).fetchall()
-    conn.close()
-
-    # latency, vote 결과 등을 담을 변수 준비
-    by_variant = {"A": {"lat": [], "vote_up": 0, "vote_down": 0, "vote_total": 0},
-                  "B": {"lat": [], "vote_up": 0, "vote_down": 0, "vote_total": 0}}
-
-    for variant, latency_ms, user_vote in rows:
-        if variant not in by_variant:
+EXPERIMENTS = ("topk_ab", "topk_ab_offline_k2_k4")
+BUCKETS = {"1h": 3_600_000, "1d": 86_400_000, "1w": 7 * 86_400_000}
+
+
+def _fmt_ci(ci, scale=1.0, digits=1):
+    return None if ci is None else (round(ci[0] * scale, digits), round(ci[1] * scale, digits))
+
+
+def _comparisons(keys, control):
+    """(control_key, other_key) pairs; with --by-experiment only within the same experiment."""
+    for key in keys:
+        if isinstance(key, tuple):
+            base = (key[0], control)
+            if key[1] != control and base in keys:
+                yield base, key
+        elif key != control and control in keys:
+            yield control, key
+
+
+def significance(experiments, scope, control, alpha, n_boot):
+    """Vote-rate z-test + Wilson CIs, latency Mann-Whitney + bootstrap median difference.
+
+    arm 이 여러 개면 control 대비 비교가 여러 번이므로 '*' 는 Bonferroni 보정(alpha / 비교 수) 기준.
+    """
+    votes = vote_stats(experiments, **scope)
+    print(f"\n=== Vote rates (Wilson {int((1 - alpha) * 100)}% CI) ===")
+    if not votes:
+        print({"votes": 0})
+    for key, row in votes.items():
+        rated = row["up"] + row["down"]
+        print(key, {**row, "ci_%": _fmt_ci(stats.wilson_interval(row["up"], rated, alpha), 100)})
+    pairs = list(_comparisons(list(votes), control))
+    level = alpha / max(1, len(pairs))
+    for a, b in pairs:
+        va, vb = votes[a], votes[b]
+        t = stats.two_proportion_test(va["up"], va["up"] + va["down"], vb["up"], vb["up"] + vb["down"], alpha)
+        if t["diff"] is None:
             continue
-        if latency_ms is not None:
-            by_variant[variant]["lat"].append(latency_ms)
-        if user_vote in ("up", "down"):
-            by_variant[variant]["vote_total"] += 1
-            if user_vote == "up":
-                by_variant[variant]["vote_up"] += 1
-            else:
-                by_variant[variant]["vote_down"] += 1
-
-    def summarize_lat(xs):
-        if not xs:
-            return None
-        return {
-            "n": len(xs),
-            "mean_ms": round(statistics.mean(xs), 1),
-            "median_ms": round(statistics.median(xs), 1),
-        }
-
-    # latency 평균, 미디언
-    print("=== Latency Summary ===")
-    for v in ["A", "B"]:
-        print(v, summarize_lat(by_variant[v]["lat"]))
-
-    # vote 평균, 미디언
-    print("\n=== Vote Summary (from UI runs only) ===")
-    for v in ["A", "B"]:
-        vt = by_variant[v]["vote_total"]
-        if vt == 0:
-            print(v, {"votes": 0})
-        else:
-            up = by_variant[v]["vote_up"]
-            rate = round(up / vt * 100, 1)
-            print(v, {"votes": vt, "up": up, "down": by_variant[v]["vote_down"], "up_rate_%": rate})
+        print(f"{b} vs {a}: diff={t['diff'] * 100:+.1f}pp ci={_fmt_ci(t['ci'], 100)} "
+              f"z={t['z']:.2f} p={t['p_value']:.4f}{' *' if t['p_value'] < level else ''}")
+
+    hists = histograms(experiments, **scope)
+    print("\n=== Latency (Mann-Whitney U, bootstrap CI of the median difference) ===")
+    for key, (values, counts) in sorted(hists.items()):
+        print(key, summarize_histogram(values, counts))
+    pairs = list(_comparisons(list(hists), control))
+    level = alpha / max(1, len(pairs))
+    for a, b in pairs:
+        mw = stats.mann_whitney(*hists[a], *hists[b])
+        boot = stats.bootstrap_quantile_diff(*hists[a], *hists[b], q=0.5, n_boot=n_boot, alpha=alpha)
+        print(f"{b} vs {a}: median diff={boot['diff']:+.0f}ms ci={_fmt_ci(boot['ci'], digits=0)} "
+              f"P({b} slower)={mw['prob_2_greater']:.3f} z={mw['z']:.2f} "
+              f"p={mw['p_value']:.4f}{' *' if mw['p_value'] < level else ''}")
+    return {k[1] if isinstance(k, tuple) else k for k in list(votes) + list(hists)}
+
+
+def sequential(experiments, scope, variants, control, alpha, bucket_ms, mde_rate, mde_ms):
+    """Always-valid (mSPRT) p-values after each time bucket - safe to check continuously and stop early."""
+    since_ms, until_ms = scope["since_ms"], scope["until_ms"]
+    print(f"\n=== Sequential monitoring (mSPRT, alpha={alpha}) ===")
+    for other in sorted(v for v in variants if v != control):
+        pair = [control, other]
+        # 투표율: 누적 (up, rated) -> 각 시점의 always-valid p-value
+        x1 = n1 = x2 = n2 = 0
+        cum = []
+        for _, row in vote_series(experiments, pair, bucket_ms, since_ms, until_ms):
+            x1 += row.get(control, (0, 0))[0]
+            n1 += row.get(control, (0, 0))[1]
+            x2 += row.get(other, (0, 0))[0]
+            n2 += row.get(other, (0, 0))[1]
+            cum.append((x1, n1, x2, n2))
+        pv = stats.always_valid_pvalues(stats.proportion_steps(cum), mde_rate ** 2)
+        _report_sequence(f"votes   {other} vs {control}", pv, alpha)
+
+        # latency 평균: 누적 (n, sum, sum of squares)
+        acc = [0, 0.0, 0.0, 0, 0.0, 0.0]
+        cum = []
+        for _, row in latency_series(experiments, pair, bucket_ms, since_ms, until_ms):
+            for i, v in ((0, control), (3, other)):
+                n, s, ss = row.get(v, (0, 0.0, 0.0))
+                acc[i] += n
+                acc[i + 1] += s
+                acc[i + 2] += ss
+            cum.append(tuple(acc))
+        pv = stats.always_valid_pvalues(stats.mean_steps(cum), mde_ms ** 2)
+        _report_sequence(f"latency {other} vs {control}", pv, alpha)
+
+
+def _report_sequence(label, pvalues, alpha):
+    if not pvalues:
+        print(label, {"looks": 0})
+        return
+    stop = stats.sequential_decision(pvalues, alpha)
+    decision = f"significant at look {stop + 1}, can stop" if stop is not None else "keep running"
+    print(label, {"looks": len(pvalues), "always_valid_p": round(pvalues[-1], 4), "decision": decision})
+
+
+def report(args):
+    experiments = args.experiment or list(EXPERIMENTS)
+    registry = load_experiments()
+    # control 기본값: 실험 정의의 control arm (여러 실험이면 첫 번째 기준)
+    control = args.control or next((registry[e].control for e in experiments if e in registry), "A")
+    for name in experiments:
+        if name in registry:
+            arms = " | ".join(f"{a.name}: {a.describe()}" for a in registry[name].arms.values())
+            print(f"[{name}] control={registry[name].control} | {arms}")
+
+    # 집계는 모두 SQL 에서 (GROUP BY / latency 히스토그램) - 행을 메모리에 올리지 않음
+    scope = dict(variants=args.variant, since_ms=parse_time(args.since), until_ms=parse_time(args.until),
+                 by_experiment=args.by_experiment)
+
+    print("=== Queries (answer- and retrieval-cache hits are excluded from latency) ===")
+    for key, row in sorted(query_counts(experiments, scope["since_ms"], scope["until_ms"]).items()):
+        print(key, row)
+
+    # 체감 latency: 스트리밍 UI 의 첫 토큰까지 시간
+    print("\n=== Time to first token / generation time (streamed answers) ===")
+    ttft = latency_stats(experiments, metric="ttft_ms", **scope)
+    gen = latency_stats(experiments, metric="generate_ms", **scope)
+    for key in sorted(set(ttft) | set(gen)):
+        print(key, {"ttft": ttft.get(key), "generation": gen.get(key)})
+
+    # 토큰 수: 문맥 예산(CONTEXT_MAX_TOKENS)에 따른 latency / 비용 trade-off
+    print("\n=== Tokens per query (prompt / completion) ===")
+    prompt = latency_stats(experiments, metric="prompt_tokens", **scope)
+    completion = latency_stats(experiments, metric="completion_tokens", **scope)
+    for key in sorted(set(prompt) | set(completion)):
+        print(key, {"prompt": prompt.get(key), "completion": completion.get(key)})
+
+    # 신뢰구간 / 유의성 검정 (control 대비)
+    variants = significance(experiments, scope, control, args.alpha, args.bootstrap)
+    if args.sequential:
+        sequential(experiments, scope, variants, control, args.alpha, BUCKETS[args.bucket],
+                   args.mde_rate, args.mde_ms)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--experiment", action="append", help="Repeatable (default: topk_ab + offline run)")
+    ap.add_argument("--variant", action="append", help="Repeatable (default: every variant found)")
+    ap.add_argument("--since", help="Window start: 7d / 24h / 30m ago, ISO date (UTC) or epoch ms")
+    ap.add_argument("--until", help="Window end, same formats as --since")
+    ap.add_argument("--by-experiment", action="store_true", help="Report each experiment separately")
+    ap.add_argument("--control", help="Variant the others are compared against (default: the experiment's control)")
+    ap.add_argument("--alpha", type=float, default=0.05)
+    ap.add_argument("--bootstrap", type=int, default=2000, help="Bootstrap resamples for the latency CI")
+    ap.add_argument("--sequential", action="store_true", help="Always-valid p-values per time bucket (early stop)")
+    ap.add_argument("--bucket", choices=sorted(BUCKETS), default="1d", help="Look interval for --sequential")
+    ap.add_argument("--mde-rate", type=float, default=0.1, help="Expected vote-rate difference (mSPRT prior scale)")
+    ap.add_argument("--mde-ms", type=float, default=300, help="Expected latency difference in ms (mSPRT prior scale)")
+    ap.add_argument("--watch", type=float, default=0, help="Re-run the report every N seconds")
+    args = ap.parse_args()
+
+    while True:
+        t0 = time.perf_counter()
+        report(args)
+        print(f"\n[OK] report took {(time.perf_counter() - t0) * 1000:.0f} ms")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+        print("\n" + "=" * 60)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
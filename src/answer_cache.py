@@ -0,0 +1,159 @@
+"""Answer cache in front of the RAG pipeline (exact + near-duplicate questions).
+
+- exact: (정규화된 질문, top_k, retriever, index_version) 이 같으면 바로 반환 - 임베딩도 하지 않음
+- near-duplicate: 질문 임베딩의 cosine 유사도가 threshold 이상인 이전 질문의 답을 재사용
+- TTL 이 지나거나 max_items 를 넘으면(LRU) 삭제, index_version 이 바뀌면 전체 비움
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from src.config import ANSWER_CACHE_MAX_ITEMS, ANSWER_CACHE_SIM_THRESHOLD, ANSWER_CACHE_TTL_S
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def _unit(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32)
+    return v / (np.linalg.norm(v) or 1.0)
+
+
+def normalize_question(question: str) -> str:
+    q = _SPACE_RE.sub(" ", (question or "").strip().lower())
+    return q.rstrip("?.! ")
+
+
+class AnswerCache:
+    def __init__(self, max_items: int = ANSWER_CACHE_MAX_ITEMS, ttl_s: float = ANSWER_CACHE_TTL_S,
+                 sim_threshold: float = ANSWER_CACHE_SIM_THRESHOLD):
+        self.max_items = max_items
+        self.ttl_s = ttl_s
+        self.sim_threshold = sim_threshold
+        # key -> (저장 시각, 결과)
+        self.items = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        # near-duplicate 검색용 행렬: 첫 벡터가 들어올 때 (max_items, dim) 으로 한 번 할당하고
+        # 항목 추가 / 삭제 때 그 행만 덮어씀 (put 마다 전체를 다시 쌓지 않도록)
+        self._matrix = None
+        self._reset_rows()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def _reset_rows(self) -> None:
+        self._rows = {}                            # key -> 행 번호
+        self._row_keys = [None] * self.max_items   # 행 번호 -> key (빈 행은 None)
+        self._free = []                            # 비워진 행 (재사용)
+        self._used = 0                             # 한 번이라도 쓴 행 수 - 검색은 [0, _used) 만
+
+    def _set_row(self, key, vec: np.ndarray) -> None:
+        if self._matrix is None or self._matrix.shape[1] != len(vec):
+            # 임베딩 차원이 바뀌면 (모델 변경) 이전 벡터와는 비교할 수 없으므로 행을 전부 버림
+            self._reset_rows()
+            self._matrix = np.zeros((self.max_items, len(vec)), dtype=np.float32)
+        row = self._rows.get(key)
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                row = self._used
+                self._used += 1
+            self._rows[key] = row
+            self._row_keys[row] = key
+        self._matrix[row] = vec
+
+    def _drop_row(self, key) -> None:
+        row = self._rows.pop(key, None)
+        if row is not None:
+            self._row_keys[row] = None
+            self._matrix[row] = 0.0
+            self._free.append(row)
+
+    def _check_version(self, version: int) -> None:
+        # 인덱스가 바뀌면 이전 답변은 근거 문서가 다를 수 있으므로 전부 무효
+        if version != self.version:
+            self.items.clear()
+            self._reset_rows()
+            self.version = version
+
+    def _alive(self, key, now: float) -> bool:
+        entry = self.items.get(key)
+        if entry is None:
+            return False
+        if now - entry[0] > self.ttl_s:
+            del self.items[key]
+            self._drop_row(key)
+            return False
+        return True
+
+    def get_exact(self, question: str, top_k: int, version: int, retriever: str = ""):
+        key = (normalize_question(question), top_k, retriever)
+        with self.lock:
+            self._check_version(version)
+            if self._alive(key, time.time()):
+                self.items.move_to_end(key)
+                self.hits_exact += 1
+                return self.items[key][1]
+        return None
+
+    def get_similar(self, q_vec: List[float], top_k: int, version: int, retriever: str = ""):
+        """Most similar cached question with the same top_k and retriever, if cosine >= threshold."""
+        with self.lock:
+            if not self.sim_threshold:
+                self.misses += 1
+                return None
+            self._check_version(version)
+            best = None
+            if self._rows:
+                # 저장된 벡터는 단위 벡터 -> 내적 = cosine. 빈 행은 0 벡터이고 key 가 None
+                sims = self._matrix[:self._used] @ _unit(q_vec)
+                candidates = np.flatnonzero(sims >= self.sim_threshold)
+                now = time.time()
+                # top_k / retriever 가 다른 항목은 제외
+                for i in candidates[np.argsort(-sims[candidates])]:
+                    key = self._row_keys[i]
+                    if key is not None and key[1:] == (top_k, retriever) and self._alive(key, now):
+                        best = key
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            self.items.move_to_end(best)
+            self.hits_semantic += 1
+            return self.items[best][1]
+
+    def put(self, question: str, top_k: int, version: int, q_vec: Optional[List[float]], result,
+            retriever: str = "") -> None:
+        key = (normalize_question(question), top_k, retriever)
+        with self.lock:
+            self._check_version(version)
+            self.items[key] = (time.time(), result)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                old, _ = self.items.popitem(last=False)
+                self._drop_row(old)
+            # 행은 LRU 삭제로 비운 뒤에 채우므로 max_items 를 넘지 않음
+            if key not in self.items or q_vec is None:
+                self._drop_row(key)
+            else:
+                self._set_row(key, _unit(q_vec))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+            self._reset_rows()
+
+    def stats(self) -> dict:
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        return {
+            "items": len(self.items),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate_%": round((self.hits_exact + self.hits_semantic) / lookups * 100, 1) if lookups else None,
+        }
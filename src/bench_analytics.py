@@ -0,0 +1,104 @@
+"""Benchmark analytics on a large synthetic events DB (time + peak memory).
+
+임시 DB 에 SQL(recursive CTE)로 rows 개의 queries 와 rows/20 개의 votes 를 만든 뒤
+src.analytics 의 집계 시간과 프로세스 최대 메모리(RSS)를 잰다. --verify 면 NumPy 로 전체 컬럼을 읽어서 분위수를 대조.
+
+    python -m src.bench_analytics --rows 10000000
+"""
+import argparse
+import resource
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src import analytics, stats, storage
+
+EXPERIMENTS = ("bench_a", "bench_b")
+
+
+def seed(n_rows: int) -> None:
+    conn = storage.get_conn()
+    t0 = time.perf_counter()
+    with conn:
+        # latency: 300ms + 지수분포 비슷한 꼬리, 1% 는 답변 캐시 hit, 2% 는 검색 결과 캐시 hit
+        conn.execute(
+            f"""
+            INSERT INTO queries (query_id, ts_ms, session_id, experiment, variant, question, top_k, latency_ms, cache_hit,
+                                 retrieval_cache_hit)
+            WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < {n_rows - 1})
+            SELECT 'b' || i, 1700000000000 + i * 250, 's' || (i % 1000),
+                   CASE WHEN i % 2 = 0 THEN '{EXPERIMENTS[0]}' ELSE '{EXPERIMENTS[1]}' END,
+                   CASE WHEN i % 3 = 0 THEN 'B' ELSE 'A' END, 'q', 4,
+                   300 + CAST(-800 * ln((abs(random()) % 1000000 + 1) / 1000001.0) AS INTEGER),
+                   CASE WHEN i % 100 = 0 THEN 'exact' END, CASE WHEN i % 50 = 1 THEN 1 END
+            FROM seq
+            """
+        )
+        conn.execute(
+            """
+            INSERT INTO votes (query_id, ts_ms, session_id, experiment, variant, vote)
+            SELECT query_id, ts_ms + 5000, session_id, experiment, variant,
+                   CASE WHEN abs(random()) % 10 < 7 THEN 'up' ELSE 'down' END
+            FROM queries WHERE rowid % 20 = 0
+            """
+        )
+    conn.close()
+    print(f"[OK] seeded {n_rows} queries in {time.perf_counter() - t0:.1f}s")
+
+
+def timed(label: str, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    print(f"{label:>28}: {(time.perf_counter() - t0) * 1000:8.1f} ms")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--verify", action="store_true", help="Cross-check percentiles against a full NumPy pass")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.DB_PATH = Path(tmp) / "events.db"
+        seed(args.rows)
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        latency = timed("latency_stats (all)", lambda: analytics.latency_stats(EXPERIMENTS))
+        timed("latency_stats (by exp)", lambda: analytics.latency_stats(EXPERIMENTS, by_experiment=True))
+        mid = 1700000000000 + args.rows * 250 // 2
+        timed("latency_stats (2nd half)", lambda: analytics.latency_stats(EXPERIMENTS, since_ms=mid))
+        timed("vote_stats", lambda: analytics.vote_stats(EXPERIMENTS))
+        timed("query_counts", lambda: analytics.query_counts(EXPERIMENTS))
+        # 유의성 검정은 집계값만 쓰므로 행 수와 무관
+        hists = analytics.histograms(EXPERIMENTS)
+        timed("mann_whitney", lambda: stats.mann_whitney(*hists["A"], *hists["B"]))
+        timed("bootstrap median (2000)", lambda: stats.bootstrap_quantile_diff(*hists["A"], *hists["B"]))
+        timed("vote_series (hourly)", lambda: analytics.vote_series(EXPERIMENTS, ["A", "B"], 3_600_000))
+        timed("latency_series (hourly)", lambda: analytics.latency_series(EXPERIMENTS, ["A", "B"], 3_600_000))
+        for key, row in latency.items():
+            print(key, row)
+
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 의 ru_maxrss 단위는 KB
+        print(f"[OK] peak RSS: {rss_before / 1024:.0f} MB after seeding -> {rss_after / 1024:.0f} MB after analytics")
+
+        if args.verify:
+            conn = storage.get_conn()
+            for variant, row in latency.items():
+                col = np.fromiter((r[0] for r in conn.execute(
+                    "SELECT latency_ms FROM queries WHERE variant = ?" + analytics.UNCACHED_SQL, (variant,))),
+                    dtype=np.float64)
+                col.sort()
+                exact = {f"p{q}_ms": float(col[max(0, int(np.ceil(q / 100 * len(col))) - 1)])
+                         for q in analytics.PERCENTILES}
+                ok = all(row[k] == v for k, v in exact.items()) and row["n"] == len(col)
+                print(f"[{'OK' if ok else 'FAIL'}] {variant} numpy: n={len(col)} {exact}")
+            conn.close()
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
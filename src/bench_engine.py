@@ -0,0 +1,105 @@
+"""Micro-benchmark: per-query overhead of rebuilding clients vs. a reused RagEngine.
+
+fake 백엔드(로컬 임베딩/LLM)와 임시 Chroma 디렉토리를 사용하므로 API 키 없이 돌아간다.
+
+    python -m src.bench_engine --queries 50 --client-init-ms 30
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_COLLECTION = "bench_docs"
+
+
+# Chroma / 엔진은 함수 안에서 import - summarize 만 쓰는 다른 벤치(bench_storage 등)가 chromadb 를 불러오지 않게
+def seed_collection(persist_dir: Path, n_docs: int) -> None:
+    from langchain_chroma import Chroma
+
+    from src import fake_backend
+
+    db = Chroma(
+        persist_directory=str(persist_dir),
+        embedding_function=fake_backend.FakeEmbeddings(init_ms=0),
+        collection_name=BENCH_COLLECTION,
+    )
+    texts = [f"chunk {i} about bias variance flexibility model {i % 17} error {i % 5}" for i in range(n_docs)]
+    metadatas = [{"page": i % 40, "source": "bench.pdf"} for i in range(n_docs)]
+    db.add_texts(texts, metadatas=metadatas)
+
+
+def rebuild_per_query(persist_dir: Path, question: str, top_k: int, init_ms: float) -> None:
+    """What answer_question used to do: construct every client for each question."""
+    from langchain_chroma import Chroma
+
+    from src import fake_backend
+    from src.rag import SYSTEM_PROMPT, USER_TEMPLATE, build_context
+
+    embeddings = fake_backend.FakeEmbeddings(init_ms=init_ms)
+    db = Chroma(
+        persist_directory=str(persist_dir),
+        embedding_function=embeddings,
+        collection_name=BENCH_COLLECTION,
+    )
+    docs = db.as_retriever(search_kwargs={"k": top_k}).invoke(question)
+    llm = fake_backend.FakeChatModel(init_ms=init_ms)
+    llm.invoke([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_TEMPLATE.format(context=build_context(docs), question=question)},
+    ])
+
+
+def summarize(name: str, xs) -> dict:
+    xs = sorted(xs)
+    p99 = xs[min(len(xs) - 1, int(len(xs) * 0.99))]
+    row = {
+        "mean_ms": round(statistics.mean(xs), 2),
+        "p50_ms": round(statistics.median(xs), 2),
+        "p99_ms": round(p99, 2),
+    }
+    print(name, row)
+    return row
+
+
+def main():
+    from src.engine import RagEngine
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--docs", type=int, default=500, help="Synthetic chunks in the bench collection")
+    ap.add_argument("--top_k", type=int, default=4)
+    ap.add_argument("--client-init-ms", type=float, default=30.0,
+                    help="Simulated client construction cost (HTTP pool / TLS setup)")
+    args = ap.parse_args()
+
+    questions = [f"What is the bias variance tradeoff for model {i % 17}?" for i in range(args.queries)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_dir = Path(tmp)
+        seed_collection(persist_dir, args.docs)
+
+        before = []
+        for q in questions:
+            t0 = time.perf_counter()
+            rebuild_per_query(persist_dir, q, args.top_k, args.client_init_ms)
+            before.append((time.perf_counter() - t0) * 1000)
+
+        # 생성 비용은 한 번만 - 벤치 루프 밖
+        # 캐시는 끄고 비교 (클라이언트 재사용 효과만 측정)
+        engine = RagEngine(backend="fake", persist_directory=persist_dir, collection_name=BENCH_COLLECTION,
+                           embed_cache=False, answer_cache=False, retrieval_cache=False)
+        after = []
+        for q in questions:
+            t0 = time.perf_counter()
+            engine.answer(q, top_k=args.top_k)
+            after.append((time.perf_counter() - t0) * 1000)
+
+    print(f"=== {args.queries} queries | docs={args.docs} | top_k={args.top_k} | client_init_ms={args.client_init_ms} ===")
+    b = summarize("rebuild per query:", before)
+    a = summarize("shared RagEngine: ", after)
+    print(f"[OK] per-query overhead saved: {b['mean_ms'] - a['mean_ms']:.2f} ms (mean)")
+
+
+if __name__ == "__main__":
+    main()
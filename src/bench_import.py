@@ -0,0 +1,97 @@
+"""Cold-start import time per CLI command (python -X importtime), with budgets for the analysis commands.
+
+명령마다 새 인터프리터에서 모듈을 import 하고 (-X importtime) 누적 import 시간과 가장 느린 하위 모듈을 보여준다.
+인터프리터 자체 시작 시간은 빼고 명령 모듈의 import 시간만 비교한다 (여러 번 중 최솟값).
+분석 명령은 langchain / chromadb / openai / tiktoken / matplotlib / numpy 를 import 하면 안 된다
+(plot 은 그림을 그릴 때만 matplotlib 을, 통계 함수는 계산할 때만 numpy 를 불러옴). --check 면 예산 초과나 무거운 import 가 있을 때 exit 1.
+
+    python -m src bench-import
+    python -m src bench-import --check --repeat 5
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+from src.cli import COMMANDS
+from src.config import PROJECT_ROOT
+
+# 분석 명령: 명령 -> (import 되는 모듈, 예산 ms)
+ANALYSIS_BUDGETS_MS = {
+    "cli": ("src.cli", 10),
+    "votes": ("src.storage", 30),
+    "experiments": ("src.experiments", 40),
+    "variants": ("src.index_variants", 40),
+    "analyze": ("src.analyze", 45),
+    "plot": ("src.plot_results", 40),
+}
+HEAVY = ("langchain", "langchain_core", "langchain_openai", "langchain_chroma", "langchain_community",
+         "langchain_text_splitters", "chromadb", "openai", "tiktoken", "matplotlib", "streamlit", "pypdf",
+         "numpy")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile(module: str) -> dict:
+    """Cumulative import time of `module` in a fresh interpreter, its slowest children and heavy packages."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PROJECT_ROOT,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = [(int(m[2]), len(m[3]), m[4]) for m in map(_LINE.match, proc.stderr.splitlines()) if m]
+    # 하위 모듈은 부모보다 먼저, 더 깊게 들여쓰기되어 출력됨 -> 명령 모듈 줄 위의 연속된 더 깊은 줄이 그 subtree
+    end = next(i for i, (_, _, name) in enumerate(rows) if name == module)
+    total_us, depth = rows[end][0], rows[end][1]
+    start = end
+    while start > 0 and rows[start - 1][1] > depth:
+        start -= 1
+    subtree = rows[start:end]
+    children = sorted(((cum, name) for cum, indent, name in subtree if indent == depth + 2), reverse=True)
+    heavy = sorted({name.split(".")[0] for _, _, name in subtree} & set(HEAVY))
+    return {"ms": total_us / 1000, "slowest": [(name, cum / 1000) for cum, name in children[:3]], "heavy": heavy}
+
+
+def interpreter_ms(repeat: int) -> float:
+    """Wall time of `python -c pass` (interpreter + site startup, the floor under every command)."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        best = min(best, (time.perf_counter() - t0) * 1000)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per module (best is kept)")
+    ap.add_argument("--all", action="store_true", help="Also time every other command (no budget)")
+    ap.add_argument("--check", action="store_true", help="Exit 1 when an analysis command is over budget")
+    args = ap.parse_args()
+
+    targets = {name: (module, budget) for name, (module, budget) in ANALYSIS_BUDGETS_MS.items()}
+    if args.all:
+        for name, (module, _) in COMMANDS.items():
+            if module and name not in targets:
+                targets[name] = (module, None)
+
+    print(f"[OK] interpreter startup (python -c pass): {interpreter_ms(args.repeat):.0f} ms")
+    failures = 0
+    for name, (module, budget) in targets.items():
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r["ms"])
+        over = budget is not None and best["ms"] > budget
+        heavy = budget is not None and best["heavy"]
+        failures += bool(over or heavy)
+        status = "FAIL" if over or heavy else "OK" if budget is not None else "--"
+        slowest = ", ".join(f"{n} {ms:.0f}" for n, ms in best["slowest"])
+        print(f"[{status:>4}] {name:<16} {best['ms']:7.1f} ms" + (f" / {budget} ms" if budget else " " * 8)
+              + f" | {module} | slowest: {slowest}"
+              + (f" | heavy imports: {', '.join(best['heavy'])}" if best["heavy"] else ""))
+    if args.check and failures:
+        print(f"[FAIL] {failures} command(s) over budget or importing heavy packages")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
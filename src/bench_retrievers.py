@@ -0,0 +1,121 @@
+"""Benchmark retriever backends: recall@k against exact search and p50/p99 query latency.
+
+정답(ground truth)은 전체 벡터에 대한 exact cosine top-k. Chroma(HNSW)는 근사 검색이라 recall 이 1 보다 작을 수 있다.
+임시 디렉토리에 fake 임베딩으로 합성 코퍼스를 만들어 측정하므로 API 키가 필요 없다.
+
+    python -m src.bench_retrievers --docs 20000 --queries 200 --k 4
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_chroma import Chroma
+
+from src.bench_engine import summarize
+from src.fake_backend import FakeEmbeddings
+from src.lexical import HybridRetriever, LexicalRetriever
+from src.retrievers import ChromaRetriever, LocalIndexRetriever
+
+BENCH_COLLECTION = "bench_retrievers"
+
+
+def load_questions(path: Path, n: int, vocab):
+    base = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+    base = [q["question"] if isinstance(q, dict) else q for q in base]
+    rng = random.Random(1)
+    # 질문 파일이 작으면 단어를 섞어서 합성 질문 추가
+    while len(base) < n:
+        base.append("What is " + " ".join(rng.choice(vocab) for _ in range(6)) + "?")
+    return base[:n]
+
+
+def seed(persist_dir: Path, n_docs: int, vocab) -> None:
+    rng = random.Random(0)
+    db = Chroma(persist_directory=str(persist_dir), embedding_function=FakeEmbeddings(init_ms=0),
+                collection_name=BENCH_COLLECTION)
+    for start in range(0, n_docs, 2000):
+        texts = [" ".join(rng.choice(vocab) for _ in range(60)) for _ in range(min(2000, n_docs - start))]
+        db.add_texts(texts, metadatas=[{"page": (start + i) % 400} for i in range(len(texts))],
+                     ids=[f"c{start + i}" for i in range(len(texts))])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--questions", default="experiments/test_questions.json")
+    args = ap.parse_args()
+
+    rng = random.Random(2)
+    vocab = [f"term{i}" for i in range(3000)] + "bias variance error model test training flexibility".split()
+    vocab = [rng.choice(vocab) for _ in range(len(vocab))]
+    embeddings = FakeEmbeddings(init_ms=0)
+    questions = load_questions(Path(args.questions), args.queries, vocab)
+    q_vecs = embeddings.embed_documents(questions)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_dir, index_dir = Path(tmp) / "chroma", Path(tmp) / "local_index"
+        t0 = time.perf_counter()
+        seed(persist_dir, args.docs, vocab)
+        print(f"[OK] seeded {args.docs} chunks in {time.perf_counter() - t0:.1f}s")
+
+        db = Chroma(persist_directory=str(persist_dir), embedding_function=embeddings,
+                    collection_name=BENCH_COLLECTION)
+        t0 = time.perf_counter()
+        local = LocalIndexRetriever(BENCH_COLLECTION, persist_dir, index_dir)
+        print(f"[OK] local index build+load: {(time.perf_counter() - t0) * 1000:.0f} ms")
+        backends = [ChromaRetriever(db), local]
+
+        # exact ground truth: 전체 행렬과의 float64 cosine. 점수가 같은(tie) 문서는 모두 정답으로 인정
+        matrix = np.asarray(local.index.vectors, dtype=np.float64)
+        row_of = {r["id"]: i for i, r in enumerate(local.index.rows())}
+        q64 = np.asarray(q_vecs, dtype=np.float64)
+        q64 /= np.linalg.norm(q64, axis=1, keepdims=True)
+        all_scores = q64 @ matrix.T
+        kth = -np.sort(-all_scores, axis=1)[:, args.k - 1]
+
+        print(f"=== docs={args.docs} | queries={len(questions)} | k={args.k} ===")
+        for r in backends:
+            lat, hits = [], 0
+            for qi, q in enumerate(q_vecs):
+                t0 = time.perf_counter()
+                docs = r.search(questions[qi], q, args.k)
+                lat.append((time.perf_counter() - t0) * 1000)
+                hits += sum(all_scores[qi, row_of[d.id]] >= kth[qi] - 1e-6 for d in docs)
+            print(f"{r.name:>6} recall@{args.k}={hits / (len(q_vecs) * args.k):.3f}", end=" ")
+            summarize("", lat)
+
+        t0 = time.perf_counter()
+        local.search_batch(questions, q_vecs, args.k)
+        dt = (time.perf_counter() - t0) * 1000
+        print(f" local batched: {dt:.1f} ms for {len(q_vecs)} queries ({dt / len(q_vecs):.3f} ms/query)")
+
+        # BM25 / hybrid 는 dense exact top-k 와 정답 기준이 다르므로 latency 만 측정
+        t0 = time.perf_counter()
+        lexical = LexicalRetriever(db, BENCH_COLLECTION, persist_dir, Path(tmp) / "lexical_index")
+        print(f"[OK] BM25 index build+load: {(time.perf_counter() - t0) * 1000:.0f} ms")
+        score_lat = []
+        for q in questions:
+            t0 = time.perf_counter()
+            lexical.top_ids(q, args.k)
+            score_lat.append((time.perf_counter() - t0) * 1000)
+        print(f"{'bm25 scoring only':>18}", end=" ")
+        summarize("", score_lat)
+        for r in [lexical, HybridRetriever(ChromaRetriever(db), lexical), HybridRetriever(local, lexical)]:
+            lat = []
+            for qi, q in enumerate(q_vecs):
+                t0 = time.perf_counter()
+                r.search(questions[qi], q, args.k)
+                lat.append((time.perf_counter() - t0) * 1000)
+            label = f"hybrid({r.dense.name})" if isinstance(r, HybridRetriever) else r.name
+            print(f"{label:>18}", end=" ")
+            summarize("", lat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark: query latency as the corpus grows, unfiltered vs. filtered to one document.
+
+문서 수를 늘려가며 (기본 1 / 10 / 100 문서 x 문서당 200 청크) 같은 컬렉션에 추가하고,
+chroma / local / bm25 의 p50/p99 를 전체 검색과 문서 1개 필터(where doc_id) 검색으로 나눠서 잰다.
+필터 검색은 그 문서의 청크만 읽으므로 코퍼스가 커져도 latency 가 거의 일정해야 한다.
+fake 임베딩과 임시 디렉토리를 쓰므로 API 키가 필요 없다.
+
+    python -m src.bench_scaling --docs 1,10,100 --chunks-per-doc 200 --queries 100
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from langchain_chroma import Chroma
+
+from src.bench_engine import summarize
+from src.bench_retrievers import load_questions
+from src.fake_backend import FakeEmbeddings
+from src.lexical import LexicalRetriever
+from src.retrievers import ChromaRetriever, LocalIndexRetriever, doc_filter
+
+BENCH_COLLECTION = "bench_scaling"
+
+
+def add_docs(db, start: int, stop: int, chunks_per_doc: int, vocab) -> None:
+    """Documents doc{start}..doc{stop-1}, each with chunks_per_doc chunks tagged by doc_id."""
+    rng = random.Random(start)
+    for d in range(start, stop):
+        doc_id = f"doc{d:05d}.pdf"
+        texts = [" ".join(rng.choice(vocab) for _ in range(60)) for _ in range(chunks_per_doc)]
+        db.add_texts(texts, metadatas=[{"doc_id": doc_id, "page": i // 4} for i in range(chunks_per_doc)],
+                     ids=[f"{doc_id}:c{i}" for i in range(chunks_per_doc)])
+
+
+def timed(r, questions, q_vecs, k: int, where_for) -> list:
+    lat = []
+    for qi, q in enumerate(q_vecs):
+        where = where_for(qi)
+        t0 = time.perf_counter()
+        r.search(questions[qi], q, k, where)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return lat
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", default="1,10,100", help="Comma-separated corpus sizes (documents)")
+    ap.add_argument("--chunks-per-doc", type=int, default=200)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--questions", default="experiments/test_questions.json")
+    args = ap.parse_args()
+
+    sizes = sorted(int(x) for x in args.docs.split(","))
+    rng = random.Random(2)
+    vocab = [f"term{i}" for i in range(3000)] + "bias variance error model test training flexibility".split()
+    vocab = [rng.choice(vocab) for _ in range(len(vocab))]
+    embeddings = FakeEmbeddings(init_ms=0)
+    questions = load_questions(Path(args.questions), args.queries, vocab)
+    q_vecs = embeddings.embed_documents(questions)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_dir = Path(tmp) / "chroma"
+        db = Chroma(persist_directory=str(persist_dir), embedding_function=embeddings,
+                    collection_name=BENCH_COLLECTION)
+        have = 0
+        for n_docs in sizes:
+            t0 = time.perf_counter()
+            add_docs(db, have, n_docs, args.chunks_per_doc, vocab)
+            have = n_docs
+            seed_s = time.perf_counter() - t0
+            # local / bm25 인덱스는 크기마다 새 디렉토리에 다시 만듦 (bench 컬렉션은 manifest 가 없어서 버전으로 갱신되지 않음)
+            t0 = time.perf_counter()
+            local = LocalIndexRetriever(BENCH_COLLECTION, persist_dir, Path(tmp) / f"local_{n_docs}")
+            lexical = LexicalRetriever(db, BENCH_COLLECTION, persist_dir, Path(tmp) / f"lexical_{n_docs}")
+            build_s = time.perf_counter() - t0
+            print(f"=== docs={n_docs} | chunks={n_docs * args.chunks_per_doc} | seed={seed_s:.1f}s "
+                  f"| local+bm25 build={build_s:.1f}s ===")
+
+            # 필터 대상 문서는 질문마다 무작위로 하나
+            pick = random.Random(n_docs)
+            targets = [doc_filter([f"doc{pick.randrange(n_docs):05d}.pdf"]) for _ in q_vecs]
+            for r in (ChromaRetriever(db), local, lexical):
+                for label, where_for in (("all", lambda qi: None), ("1 doc", lambda qi: targets[qi])):
+                    print(f"{r.name:>6} {label:>5}", end=" ")
+                    row = summarize("", timed(r, questions, q_vecs, args.k, where_for))
+                    rows.append({"docs": n_docs, "retriever": r.name, "filter": label, **row})
+
+    # 크기별 p50 비교표 - 필터 검색 열이 평평하면 성공
+    print(f"\n{'retriever':>9} {'filter':>6} " + " ".join(f"{n:>9}" for n in sizes) + "   (p50 ms by docs)")
+    for name in ("chroma", "local", "bm25"):
+        for label in ("all", "1 doc"):
+            p50 = {r["docs"]: r["p50_ms"] for r in rows if r["retriever"] == name and r["filter"] == label}
+            print(f"{name:>9} {label:>6} " + " ".join(f"{p50[n]:>9.2f}" for n in sizes))
+
+
+if __name__ == "__main__":
+    main()
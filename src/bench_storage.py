@@ -0,0 +1,102 @@
+"""Benchmark event logging throughput (events/s) and per-call latency.
+
+세 가지 방식을 임시 DB 에 대해 비교한다.
+- connect: 예전 log_event - 이벤트마다 connect / CREATE TABLE / INSERT / commit / close
+- sync:    풀링된 WAL 연결 하나로 바로 기록 (log_query(..., sync=True))
+- buffered: 큐 + 백그라운드 writer 의 executemany batch (log_query 기본값), flush 까지 포함해서 측정
+
+    python -m src.bench_storage --events 5000 --threads 8
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from src import storage
+from src.bench_engine import summarize
+
+EVENT = dict(
+    session_id="bench",
+    experiment="bench_storage",
+    variant="A",
+    question="What is the bias-variance tradeoff?",
+    top_k=4,
+    latency_ms=1234,
+    citations="[p.1] [p.2]",
+    source_pages="1,2",
+    answer="x" * 500,
+    timings={"embed_ms": 10.0, "retrieve_ms": 5.0, "generate_ms": 900.0},
+)
+
+
+def log_connect_per_event(**kw) -> None:
+    """What log_event used to do for every event."""
+    conn = sqlite3.connect(storage.DB_PATH, timeout=30)
+    conn.execute(storage.V1_EVENTS_SCHEMA)
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO events (ts, session_id, experiment, variant, question, top_k, latency_ms, citations,
+                                source_pages, answer, user_vote)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (datetime.utcnow().isoformat(), kw["session_id"], kw["experiment"], kw["variant"], kw["question"],
+             kw["top_k"], kw["latency_ms"], kw["citations"], kw["source_pages"], kw["answer"], None),
+        )
+    conn.close()
+
+
+def run(mode: str, n_events: int, threads: int) -> dict:
+    if mode == "connect":
+        fn = log_connect_per_event
+    else:
+        sync = mode == "sync"
+
+        def fn(**kw):
+            storage.log_query(**kw, sync=sync)
+
+    call_ms = []
+
+    def one(_):
+        t0 = time.perf_counter()
+        fn(**EVENT)
+        call_ms.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n_events)))
+    storage.flush()
+    dt = time.perf_counter() - t0
+
+    print(f"{mode:>9} | {n_events / dt:>9.0f} events/s | wall {dt:.2f}s | per call", end=" ")
+    row = summarize("", call_ms)
+    row["events_per_s"] = round(n_events / dt)
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=4, help="Concurrent producers (like a concurrent experiment run)")
+    args = ap.parse_args()
+
+    print(f"=== events={args.events} | threads={args.threads} ===")
+    for mode in ("connect", "sync", "buffered"):
+        with tempfile.TemporaryDirectory() as tmp:
+            storage.DB_PATH = Path(tmp) / "events.db"
+            if mode == "connect":
+                # WAL 은 DB 파일에 남는 설정이라 예전 방식은 기본(rollback journal) DB 로 측정
+                sqlite3.connect(storage.DB_PATH).execute(storage.V1_EVENTS_SCHEMA)
+            run(mode, args.events, args.threads)
+            conn = sqlite3.connect(storage.DB_PATH)
+            count = conn.execute(f"SELECT COUNT(*) FROM {'events' if mode == 'connect' else 'queries'}").fetchone()[0]
+            conn.close()
+            storage.close()
+            assert count == args.events, (mode, count)
+
+
+if __name__ == "__main__":
+    main()
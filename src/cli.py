@@ -0,0 +1,99 @@
+"""Single entry point for every command: python -m src <command> [options].
+
+명령 이름 -> 모듈 표만 갖고 있고, 고른 명령의 모듈만 import 한다.
+그래서 analyze / votes 같은 분석 명령은 langchain, chromadb, matplotlib 을 불러오지 않는다
+(python -m src bench-import 로 확인). 각 명령의 옵션은 python -m src <command> --help.
+
+    python -m src                       # 명령 목록
+    python -m src ask --question "What is overfitting?"
+    python -m src analyze --since 7d
+"""
+import importlib
+import sys
+
+# 명령 -> (모듈, 설명). 모듈은 main() 을 가진 src.* 모듈이고 실행할 때만 import
+COMMANDS = {
+    "ingest": ("src.ingest", "Index PDFs into a Chroma collection"),
+    "ask": ("src.rag", "Answer one question from the CLI"),
+    "ui": (None, "Run the Streamlit A/B app (streamlit run app/ui.py)"),
+    "experiment": ("src.run_experiment", "Run an offline experiment over the question set"),
+    "experiments": ("src.experiments", "List experiments and check the traffic split"),
+    "analyze": ("src.analyze", "Latency / vote / token stats and significance tests"),
+    "plot": ("src.plot_results", "Plot latency and votes per variant"),
+    "votes": (None, "Vote and experiment counts from the event log"),
+    "eval": ("src.eval_retrieval", "Offline retrieval evaluation (recall@k, MRR, latency)"),
+    "variants": ("src.index_variants", "Chunking variant report"),
+    "rerank": ("src.rerank", "Compare retrieval with and without reranking for one question"),
+    "lexical": ("src.lexical", "BM25 search / index build"),
+    "retrievers": ("src.retrievers", "Build the local vector index"),
+    "embed-cache": ("src.embed_cache", "Embedding cache size / clear"),
+    "retrieval-cache": ("src.retrieval_cache", "Retrieval cache file size / clear"),
+    "trace": ("src.tracing", "Per-stage latency report and query profiling"),
+    "loadtest": ("src.loadtest", "Load test with fake or stub backends"),
+    "stub-server": ("src.stub_server", "Local OpenAI-compatible stub server"),
+    "bench-engine": ("src.bench_engine", "Client reuse micro-benchmark"),
+    "bench-retrievers": ("src.bench_retrievers", "Retriever recall / latency benchmark"),
+    "bench-scaling": ("src.bench_scaling", "Filtered search latency vs number of documents"),
+    "bench-storage": ("src.bench_storage", "Event log write benchmark"),
+    "bench-analytics": ("src.bench_analytics", "Analytics query benchmark"),
+    "bench-import": ("src.bench_import", "Cold-start import time per command"),
+}
+
+
+def votes(argv=None) -> None:
+    """Vote totals and per-experiment counts (what check_votes.py prints)."""
+    from src.storage import experiment_counts, vote_counts
+
+    print("=== vote 개수 ===")
+    rows = vote_counts()
+    print((sum(n for *_, n in rows),))
+
+    print("\n=== vote가 있는 행 요약 ===")
+    for row in rows:
+        print(row)
+
+    print("\n=== experiment 목록 (queries, votes) ===")
+    for row in experiment_counts():
+        print(row)
+
+
+def ui(argv) -> None:
+    import subprocess
+
+    from src.config import PROJECT_ROOT
+
+    raise SystemExit(subprocess.call([sys.executable, "-m", "streamlit", "run",
+                                      str(PROJECT_ROOT / "app" / "ui.py"), *argv]))
+
+
+BUILTINS = {"votes": votes, "ui": ui}
+
+
+def usage() -> None:
+    print("usage: python -m src <command> [options]   (python -m src <command> --help)\n\ncommands:")
+    width = max(map(len, COMMANDS))
+    for name, (_, help_text) in COMMANDS.items():
+        print(f"  {name:<{width}}  {help_text}")
+
+
+def main(argv=None) -> None:
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        usage()
+        return
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print(f"unknown command: {name}\n")
+        usage()
+        raise SystemExit(2)
+    if name in BUILTINS:
+        BUILTINS[name](rest)
+        return
+    module = importlib.import_module(COMMANDS[name][0])
+    # 각 모듈의 argparse 가 남은 인자를 읽고, --help 에 "python -m src <command>" 로 나오게
+    sys.argv = [f"python -m src {name}", *rest]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
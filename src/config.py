@@ -1,12 +1,38 @@
 from pathlib import Path
-from dotenv import load_dotenv
 import os
 
-load_dotenv()
+
+def _load_dotenv() -> None:
+    # load_dotenv() 와 같은 위치(이 파일의 디렉토리부터 위로)에서 .env 를 찾고,
+    # 있을 때만 python-dotenv 를 import (logging 까지 끌고 와서 CLI 시작이 ~10ms 느려짐)
+    here = Path(__file__).resolve().parent
+    for d in (here, *here.parents):
+        if (d / ".env").is_file():
+            from dotenv import load_dotenv
+
+            load_dotenv(d / ".env")
+            return
+
+
+_load_dotenv()
 
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 DOCS_DIR = PROJECT_ROOT / "data" / "docs"
 CHROMA_DIR = PROJECT_ROOT / "chroma_db"
+# ingest 체크포인트 등 인덱스 관련 상태 파일
+INGEST_STATE_DIR = CHROMA_DIR / "ingest_state"
+# 임베딩 등 디스크 캐시
+CACHE_DIR = PROJECT_ROOT / "cache"
+# local 검색 백엔드용 memory-mapped 벡터 인덱스
+LOCAL_INDEX_DIR = PROJECT_ROOT / "local_index"
+LEXICAL_INDEX_DIR = PROJECT_ROOT / "lexical_index"
+# 실험 정의 (experiment -> arm 별 top_k / retriever / model / prompt / collection, 트래픽 weight)
+EXPERIMENTS_PATH = PROJECT_ROOT / "experiments" / "experiments.json"
+# 인덱스 variant (청크 크기/겹침/splitter 가 다른 컬렉션). 기본 컬렉션 외의 variant 는 CHROMA_DIR/variants/<이름> 에 따로 저장
+INDEX_VARIANTS_PATH = PROJECT_ROOT / "experiments" / "index_variants.json"
+VARIANTS_DIR = CHROMA_DIR / "variants"
+# UI 가 사용자를 배정하는 실험
+UI_EXPERIMENT = os.getenv("EXPERIMENT", "topk_ab")
 
 # 키가 없으면 빈 문자열을 넣을것
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
@@ -19,3 +45,69 @@ CHUNK_OVERLAP = 120
 # chat 모델 설정
 CHAT_MODEL = "gpt-4o-mini"
 
+# 프롬프트에 넣는 검색 문맥의 최대 토큰 수 (0 이면 제한 없음). 겹치는 청크 제거 / 같은 페이지 이웃 청크 병합 후 적용
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+# 이미 넣은 문맥과 단어 3-gram 이 이 비율 이상 겹치는 청크는 중복으로 보고 제외
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+
+# Chroma 컬렉션 이름 (ingest / rag 공통)
+COLLECTION_NAME = "docs"
+
+# 모델 백엔드: "openai", 네트워크 없이 돌아가는 로컬 테스트용 "fake",
+# 또는 "stub" (실제 OpenAI 클라이언트를 로컬 stub 서버 src/stub_server.py 에 연결 - HTTP 비용까지 포함한 부하 테스트용)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "openai")
+STUB_BASE_URL = os.getenv("STUB_BASE_URL", "http://127.0.0.1:8765/v1")
+
+# fake 백엔드 지연시간 설정(ms) - 벤치마크에서 실제 API 왕복을 흉내내기 위함
+FAKE_CLIENT_INIT_MS = float(os.getenv("FAKE_CLIENT_INIT_MS", "0"))
+FAKE_EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "0"))
+# fake LLM 호출 중 rate limit(429) 에러를 낼 확률 - 재시도 로직 테스트용
+FAKE_RATE_LIMIT_RATE = float(os.getenv("FAKE_RATE_LIMIT_RATE", "0"))
+# 호출마다의 지연시간 분포: fixed (항상 평균값), lognormal (평균 유지, 꼬리 두께는 sigma), exponential
+FAKE_LATENCY_DIST = os.getenv("FAKE_LATENCY_DIST", "fixed")
+FAKE_LATENCY_SIGMA = float(os.getenv("FAKE_LATENCY_SIGMA", "0.5"))
+# 지연시간 난수 seed - 같은 seed 면 같은 지연시간 순서 (실행 간 비교용)
+FAKE_SEED = int(os.getenv("FAKE_SEED", "0"))
+
+# 임베딩 캐시 (model, 텍스트 해시) -> 벡터. ingest 와 질문 임베딩이 같이 사용
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "1") == "1"
+EMBED_CACHE_PATH = CACHE_DIR / "embeddings.db"
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+EMBED_CACHE_MEM_ITEMS = int(os.getenv("EMBED_CACHE_MEM_ITEMS", "10000"))
+
+# 답변 캐시 (UI 에서 같은/비슷한 질문 반복 시 검색+생성 생략). threshold 0 이면 exact 매칭만
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "1000"))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", "3600"))
+ANSWER_CACHE_SIM_THRESHOLD = float(os.getenv("ANSWER_CACHE_SIM_THRESHOLD", "0.95"))
+
+# 검색 결과 캐시 (정규화된 질문, top_k, retriever, 문서 필터, index_version) -> 청크 id + 메타데이터.
+# 프롬프트 / 모델이 다른 arm 끼리도 공유. PERSIST=1 이면 SQLite 파일에도 저장 (재시작 / 프로세스 간 공유)
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE", "1") == "1"
+RETRIEVAL_CACHE_MAX_ITEMS = int(os.getenv("RETRIEVAL_CACHE_MAX_ITEMS", "5000"))
+RETRIEVAL_CACHE_PERSIST = os.getenv("RETRIEVAL_CACHE_PERSIST", "0") == "1"
+RETRIEVAL_CACHE_PATH = CACHE_DIR / "retrieval.db"
+RETRIEVAL_CACHE_DISK_ITEMS = int(os.getenv("RETRIEVAL_CACHE_DISK_ITEMS", "100000"))
+
+# 검색 백엔드: "chroma" (HNSW), "local" (NumPy memory-mapped 행렬), "bm25", "hybrid", "hybrid_local"
+RETRIEVER_BACKEND = os.getenv("RETRIEVER", "chroma")
+
+# 재순위(rerank): retriever 이름 뒤에 "+rerank" (예: "chroma+rerank", "hybrid+rerank:embedding")
+# 후보 RERANK_POOL 개를 가져와서 scorer 로 다시 점수를 매기고 상위 top_k 만 사용. 예산(ms)을 넘으면 원래 순서로
+RERANK_POOL = int(os.getenv("RERANK_POOL", "20"))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "50"))
+RERANK_SCORER = os.getenv("RERANK_SCORER", "lexical")
+# cross_encoder scorer 용 모델 (sentence-transformers 설치 필요)
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+# 단계별 tracing (src/tracing.py): TRACING=1 일 때만 span 기록. 끄면 span() 은 아무것도 하지 않는 객체를 돌려줌
+TRACING_ENABLED = os.getenv("TRACING", "0") == "1"
+# "db" = events.db 의 spans 테이블 (이벤트 로그와 같은 writer), "jsonl" = TRACE_FILE 에 한 줄씩
+TRACE_SINK = os.getenv("TRACE_SINK", "db")
+TRACE_FILE = PROJECT_ROOT / "experiments" / "traces.jsonl"
+
+# 이벤트 로깅: 큐에 모았다가 백그라운드 스레드가 batch 로 기록. EVENT_LOG_BUFFERED=0 이면 호출 시점에 바로 기록
+EVENT_LOG_BUFFERED = os.getenv("EVENT_LOG_BUFFERED", "1") == "1"
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "256"))
+EVENT_LOG_FLUSH_MS = float(os.getenv("EVENT_LOG_FLUSH_MS", "200"))
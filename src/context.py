@@ -0,0 +1,159 @@
+"""Token-budgeted context packing for the RAG prompt.
+
+rag.build_context 는 검색된 청크 전체를 그대로 이어 붙여서 프롬프트 토큰이 top_k 에 비례해 늘어난다.
+pack_context 는 검색 순위대로 청크를 넣으면서
+- 같은 페이지의 이웃 청크(CHUNK_OVERLAP 만큼 겹침)는 겹친 부분을 빼고 하나로 이어 붙이고
+- 이미 넣은 문맥에 거의 다 들어 있는 청크(단어 3-gram 포함 비율 >= threshold)는 버리고
+- 토큰 예산(max_tokens)을 넘으면 마지막 블록을 잘라서 넣고 멈춘다.
+
+    from src.context import pack_context
+    packed = pack_context(docs, max_tokens=1500)
+    packed.text, packed.docs, packed.tokens
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from src.config import CHAT_MODEL, CONTEXT_DEDUP_THRESHOLD, CONTEXT_MAX_TOKENS
+from src.tokens import count_tokens, truncate_tokens
+
+# 이웃 청크 겹침으로 인정하는 최소 길이 (우연히 같은 단어로 끝나는 경우 제외)
+MIN_OVERLAP_CHARS = 20
+# 예산이 이보다 적게 남으면 마지막 블록을 잘라 넣지 않음 (문장 조각만 들어가는 것 방지)
+MIN_BLOCK_TOKENS = 64
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _shingles(text: str) -> set:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 3:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right (0 if shorter than MIN_OVERLAP_CHARS)."""
+    probe = right[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+    pos = left.find(probe, max(0, len(left) - len(right)))
+    while pos != -1:
+        if right.startswith(left[pos:]):
+            return len(left) - pos
+        pos = left.find(probe, pos + 1)
+    return 0
+
+
+@dataclass
+class _Block:
+    source: object
+    page: object
+    text: str
+    docs: list
+    shingles: set
+
+
+@dataclass
+class PackedContext:
+    text: str
+    # 실제로 문맥에 들어간 청크 (검색 순위 순서, 병합된 청크 포함) - 인용 표시에 사용
+    docs: list = field(default_factory=list)
+    tokens: int = 0
+    # 입력 청크 수 / 같은 페이지 병합 수 / 중복으로 제외 / 예산 때문에 제외 / 잘린 블록 수
+    stats: dict = field(default_factory=dict)
+
+
+def _page_display(page):
+    return (page + 1) if isinstance(page, int) else page
+
+
+def _header(i: int, block: _Block) -> str:
+    return f"[source {i} | page {_page_display(block.page)}]\n"
+
+
+def _join(left: str, right: str) -> Optional[str]:
+    """left + right without the shared overlap, in whichever order they connect (None if they don't)."""
+    n = _overlap(left, right)
+    if n:
+        return left + right[n:]
+    n = _overlap(right, left)
+    if n:
+        return right + left[n:]
+    return None
+
+
+def merge_and_dedupe(docs, dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD):
+    """Blocks in retrieval order; returns (blocks, merged, duplicates)."""
+    blocks: List[_Block] = []
+    merged = duplicates = 0
+    for d in docs:
+        md = d.metadata or {}
+        text = (d.page_content or "").strip()
+        if not text:
+            continue
+        source, page = md.get("source"), md.get("page")
+        # 같은 페이지에서 앞/뒤로 이어지는 청크면 겹친 부분을 빼고 이어 붙임
+        target = None
+        for i, b in enumerate(blocks):
+            if b.source == source and b.page == page:
+                joined = _join(b.text, text)
+                if joined is not None:
+                    b.text, target = joined, i
+                    b.docs.append(d)
+                    b.shingles |= _shingles(text)
+                    merged += 1
+                    break
+        if target is not None:
+            # 새 청크가 두 블록 사이를 이어 주면 (예: 1, 3 다음에 2) 블록끼리도 합침 - 앞 순위 블록 자리에 남김
+            j = target + 1
+            while j < len(blocks):
+                a, c = blocks[target], blocks[j]
+                joined = _join(a.text, c.text) if (c.source, c.page) == (a.source, a.page) else None
+                if joined is None:
+                    j += 1
+                    continue
+                a.text = joined
+                a.docs.extend(c.docs)
+                a.shingles |= c.shingles
+                del blocks[j]
+            continue
+        sh = _shingles(text)
+        if sh and any(len(sh & b.shingles) / len(sh) >= dedup_threshold for b in blocks):
+            duplicates += 1
+            continue
+        blocks.append(_Block(source, page, text, [d], sh))
+    return blocks, merged, duplicates
+
+
+def pack_context(docs, max_tokens: Optional[int] = CONTEXT_MAX_TOKENS, model: str = CHAT_MODEL,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD) -> PackedContext:
+    """Merge/dedupe retrieved chunks and fit them into max_tokens (0 or None = no budget)."""
+    blocks, merged, duplicates = merge_and_dedupe(docs, dedup_threshold)
+    parts, used, tokens, truncated = [], [], 0, 0
+    for block in blocks:
+        body = _header(len(parts) + 1, block) + block.text
+        # 블록 사이 구분자 "\n\n" 도 대략 1토큰
+        sep = 1 if parts else 0
+        n = count_tokens(body, model)
+        if max_tokens and tokens + sep + n > max_tokens:
+            left = max_tokens - tokens - sep
+            # 첫 블록은 예산이 작아도 잘라서라도 넣음 (문맥 없는 답변 방지)
+            if left >= MIN_BLOCK_TOKENS or not parts:
+                body = truncate_tokens(body, max(left, 1), model)
+                n = count_tokens(body, model)
+                truncated = 1
+            else:
+                break
+        parts.append(body)
+        used.extend(block.docs)
+        tokens += sep + n
+        if truncated:
+            break
+    return PackedContext(
+        text="\n\n".join(parts),
+        docs=used,
+        tokens=tokens,
+        stats={"chunks": len(docs), "merged": merged, "duplicates": duplicates,
+               "over_budget": len(blocks) - len(parts), "truncated": truncated},
+    )
@@ -0,0 +1,276 @@
+"""Persistent embedding cache keyed by (model, sha256 of text).
+
+구조: 프로세스 내 LRU(dict) -> SQLite 디스크 캐시 -> 실제 임베딩 API
+- 벡터는 float32 바이트로 저장 (1536차원 = 6KB)
+- 디스크 용량이 max_bytes 를 넘으면 가장 오래 안 쓴 항목부터 삭제
+- hit 의 last_used 는 메모리에 모았다가 한꺼번에 기록 (조회마다 쓰기 트랜잭션을 만들지 않도록)
+
+    python -m src.embed_cache          # 모델별 항목 수 / 용량
+    python -m src.embed_cache --clear
+"""
+import argparse
+import atexit
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.config import EMBED_CACHE_MAX_MB, EMBED_CACHE_MEM_ITEMS, EMBED_CACHE_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+  model TEXT NOT NULL,
+  text_sha TEXT NOT NULL,
+  vec BLOB NOT NULL,
+  last_used INTEGER NOT NULL,
+  PRIMARY KEY (model, text_sha)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used);
+"""
+# 모아 둔 last_used 를 기록하는 조건: 이 개수 이상이거나 마지막 기록 후 이 시간(초)이 지났을 때
+TOUCH_BATCH = 500
+TOUCH_INTERVAL_S = 60
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_blob(vec) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _from_blob(blob: bytes) -> List[float]:
+    arr = array("f")
+    arr.frombytes(blob)
+    return arr.tolist()
+
+
+class EmbeddingCache:
+    """Two-level (memory LRU + SQLite) store of embedding vectors."""
+
+    def __init__(self, path=EMBED_CACHE_PATH, max_bytes: int = EMBED_CACHE_MAX_MB * 1024 * 1024,
+                 mem_items: int = EMBED_CACHE_MEM_ITEMS):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # ingest 워커 스레드에서도 사용하므로 커넥션 하나를 lock 으로 보호
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.mem_items = mem_items
+        self.mem = OrderedDict()
+        # (model, sha) -> 마지막 hit 시각. put / 일정 개수 / 일정 시간 / 종료 때 한 번에 UPDATE
+        self.touched = {}
+        self.touched_at = time.time()
+        self._data_version = None
+        self.disk_bytes = 0
+        self._refresh_disk_bytes()
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def _remember(self, key, vec) -> None:
+        self.mem[key] = vec
+        self.mem.move_to_end(key)
+        while len(self.mem) > self.mem_items:
+            self.mem.popitem(last=False)
+
+    def _refresh_disk_bytes(self, force: bool = False) -> None:
+        # data_version 은 다른 커넥션(병렬 ingest_variants 워커 등)이 커밋했을 때만 바뀐다 -
+        # 그때만 실제 합계를 다시 읽고, 아니면 이 프로세스에서 더한 값이 정확함
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if force or version != self._data_version:
+            self.disk_bytes = self.conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+            self._data_version = version
+
+    def _write_touched(self) -> None:
+        # 호출하는 쪽이 트랜잭션(with self.conn)을 연다
+        if self.touched:
+            self.conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_sha = ?",
+                [(int(ts), model, sha) for (model, sha), ts in self.touched.items()],
+            )
+            self.touched.clear()
+        self.touched_at = time.time()
+
+    def flush(self) -> None:
+        """Write the buffered last_used times of cache hits."""
+        with self.lock, self.conn:
+            self._write_touched()
+
+    def get_many(self, model: str, shas: List[str]) -> List[Optional[List[float]]]:
+        out = [None] * len(shas)
+        todo = {}
+        now = time.time()
+        with self.lock:
+            for i, sha in enumerate(shas):
+                vec = self.mem.get((model, sha))
+                if vec is not None:
+                    self.mem.move_to_end((model, sha))
+                    self.touched[(model, sha)] = now
+                    out[i] = vec
+                    self.hits_mem += 1
+                else:
+                    todo.setdefault(sha, []).append(i)
+
+            if todo:
+                found = []
+                keys = list(todo)
+                # SQLite 변수 개수 제한 때문에 나눠서 조회
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    marks = ",".join("?" * len(part))
+                    found += self.conn.execute(
+                        f"SELECT text_sha, vec FROM embeddings WHERE model = ? AND text_sha IN ({marks})",
+                        (model, *part),
+                    ).fetchall()
+                for sha, blob in found:
+                    vec = _from_blob(blob)
+                    self._remember((model, sha), vec)
+                    self.touched[(model, sha)] = now
+                    for i in todo[sha]:
+                        out[i] = vec
+                    self.hits_disk += len(todo[sha])
+            self.misses += sum(1 for v in out if v is None)
+            if len(self.touched) >= TOUCH_BATCH or (self.touched and now - self.touched_at > TOUCH_INTERVAL_S):
+                with self.conn:
+                    self._write_touched()
+        return out
+
+    def put_many(self, model: str, shas: List[str], vecs: List[List[float]]) -> None:
+        now = int(time.time())
+        rows = [(model, sha, _to_blob(vec), now) for sha, vec in zip(shas, vecs)]
+        with self.lock:
+            for sha, vec in zip(shas, vecs):
+                self._remember((model, sha), vec)
+            # 다른 프로세스가 그 사이에 쓴 양을 먼저 반영
+            self._refresh_disk_bytes()
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_sha, vec, last_used) VALUES (?, ?, ?, ?)", rows
+                )
+                # 어차피 쓰기 트랜잭션이므로 모아 둔 last_used 도 같이 기록
+                self._write_touched()
+            self.disk_bytes += sum(len(r[2]) for r in rows)
+            if self.disk_bytes > self.max_bytes:
+                # REPLACE 는 두 번 세므로 실제 합계로 다시 확인한 뒤 삭제
+                self._refresh_disk_bytes(force=True)
+                if self.disk_bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self) -> None:
+        # 한도의 90% 까지 오래된 것부터 삭제 (매번 조금씩 지우지 않도록 여유를 둠)
+        excess = self.disk_bytes - int(self.max_bytes * 0.9)
+        victims = []
+        for model, sha, size in self.conn.execute(
+            "SELECT model, text_sha, LENGTH(vec) FROM embeddings ORDER BY last_used"
+        ):
+            if excess <= 0:
+                break
+            victims.append((model, sha))
+            excess -= size
+            self.disk_bytes -= size
+        with self.conn:
+            self.conn.executemany("DELETE FROM embeddings WHERE model = ? AND text_sha = ?", victims)
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._refresh_disk_bytes()
+        lookups = self.hits_mem + self.hits_disk + self.misses
+        return {
+            "lookups": lookups,
+            "hits_mem": self.hits_mem,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate_%": round((self.hits_mem + self.hits_disk) / lookups * 100, 1) if lookups else None,
+            "disk_mb": round(self.disk_bytes / 1024 / 1024, 2),
+        }
+
+    def clear(self) -> None:
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM embeddings")
+            self.mem.clear()
+            self.touched.clear()
+            self.disk_bytes = 0
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps any Embeddings; only texts missing from the cache reach the inner model."""
+
+    def __init__(self, inner: Embeddings, model: str, cache: EmbeddingCache):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        shas = [text_key(t) for t in texts]
+        out = self.cache.get_many(self.model, shas)
+        missing = {}
+        for i, vec in enumerate(out):
+            if vec is None:
+                missing.setdefault(shas[i], i)
+        if missing:
+            # 캐시에 없는 텍스트만 한 번에 임베딩 (같은 텍스트는 한 번만)
+            idx = list(missing.values())
+            vecs = self.inner.embed_documents([texts[i] for i in idx])
+            self.cache.put_many(self.model, [shas[i] for i in idx], vecs)
+            by_sha = dict(zip((shas[i] for i in idx), vecs))
+            out = [v if v is not None else by_sha[s] for v, s in zip(out, shas)]
+        return out
+
+    def embed_query(self, text: str) -> List[float]:
+        sha = text_key(text)
+        vec = self.cache.get_many(self.model, [sha])[0]
+        if vec is None:
+            vec = self.inner.embed_query(text)
+            self.cache.put_many(self.model, [sha], [vec])
+        return vec
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache:
+    """Process-wide cache shared by ingestion and querying."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+                atexit.register(flush)
+    return _cache
+
+
+def flush() -> None:
+    """Write buffered last_used times (registered with atexit; worker processes call it themselves)."""
+    if _cache is not None:
+        _cache.flush()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clear", action="store_true", help="Delete every cached vector")
+    args = ap.parse_args()
+
+    cache = get_cache()
+    if args.clear:
+        cache.clear()
+        print("[OK] Embedding cache cleared:", EMBED_CACHE_PATH)
+    rows = cache.conn.execute(
+        "SELECT model, COUNT(*), SUM(LENGTH(vec)) FROM embeddings GROUP BY model"
+    ).fetchall()
+    print("[OK] Embedding cache:", EMBED_CACHE_PATH)
+    for model, n, size in rows:
+        print(model, {"entries": n, "mb": round((size or 0) / 1024 / 1024, 2)})
+
+
+if __name__ == "__main__":
+    main()
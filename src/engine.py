@@ -0,0 +1,495 @@
+"""Long-lived RAG engine shared by the Streamlit app and the experiment runner.
+
+예전 answer_question 은 질문마다 OpenAIEmbeddings, Chroma, ChatOpenAI 를 새로 만들었다.
+RagEngine 은 이 클라이언트들을 한 번만 만들고(HTTP 커넥션 풀 재사용) 열린 컬렉션을 계속 사용한다.
+"""
+import itertools
+import json
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_chroma import Chroma
+
+from src.config import (
+    ANSWER_CACHE_ENABLED,
+    CHAT_MODEL,
+    CHROMA_DIR,
+    COLLECTION_NAME,
+    CONTEXT_MAX_TOKENS,
+    EMBED_CACHE_ENABLED,
+    EMBEDDING_MODEL,
+    OPENAI_API_KEY,
+    RAG_BACKEND,
+    RETRIEVAL_CACHE_ENABLED,
+    RETRIEVER_BACKEND,
+    STUB_BASE_URL,
+)
+from src import tracing
+from src.context import PackedContext, pack_context
+from src.index_variants import persist_dir
+from src.manifest import index_version
+from src.retrieval_cache import RetrievalCache, cache_key
+from src.retrievers import make_retriever
+from src.runner import call_with_retry, run_jobs
+from src.tokens import count_tokens
+from src.rag import (
+    PROMPTS,
+    citations_line,
+    format_sources,
+    source_pages_csv,
+)
+
+
+def make_embeddings(backend: str = RAG_BACKEND, cache: bool = EMBED_CACHE_ENABLED):
+    if backend == "fake":
+        from src.fake_backend import FAKE_EMBED_DIM, FakeEmbeddings
+        embeddings, model = FakeEmbeddings(), f"fake-hash-{FAKE_EMBED_DIM}"
+    elif backend == "stub":
+        from langchain_openai import OpenAIEmbeddings
+        # stub 서버는 텍스트를 받아야 하므로 토큰 ID 로 보내지 않음. 캐시 키도 실제 모델과 섞이지 않게 따로
+        embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, base_url=STUB_BASE_URL, api_key="stub",
+                                      check_embedding_ctx_length=False)
+        model = f"stub-{EMBEDDING_MODEL}"
+    else:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings, model = OpenAIEmbeddings(model=EMBEDDING_MODEL), EMBEDDING_MODEL
+    if not cache:
+        return embeddings
+    # 같은 텍스트는 다시 임베딩하지 않도록 디스크 캐시로 감쌈
+    from src.embed_cache import CachedEmbeddings, get_cache
+    return CachedEmbeddings(embeddings, model, get_cache())
+
+
+def make_llm(backend: str = RAG_BACKEND, model: str = CHAT_MODEL):
+    if backend == "fake":
+        from src.fake_backend import FakeChatModel
+        return FakeChatModel()
+    from langchain_openai import ChatOpenAI
+    if backend == "stub":
+        return ChatOpenAI(model=model, temperature=0, base_url=STUB_BASE_URL, api_key="stub")
+    # temperature는 ai가 헛소리 못하게 창의성을 0으로 만듬
+    return ChatOpenAI(model=model, temperature=0)
+
+
+def _usage(packed: PackedContext, prompt_tokens: int, answer: str, model: Optional[str]) -> Dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(answer, model or CHAT_MODEL),
+            "context_tokens": packed.tokens}
+
+
+def _cache_scope(retriever: str, model: Optional[str], prompt: Optional[str], where: Optional[dict] = None) -> str:
+    # 답변 캐시는 retriever / 모델 / 프롬프트 / 문서 필터가 모두 같은 답끼리만 공유
+    where = json.dumps(where, sort_keys=True) if where else None
+    return "|".join([retriever] + [f"{k}={v}" for k, v in (("model", model), ("prompt", prompt), ("where", where))
+                                   if v])
+
+
+def _ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+
+@dataclass
+class RagResult:
+    answer: str
+    citations: str
+    sources: List[dict]
+    elapsed: float
+    source_pages: str
+    # 단계별 소요시간(ms): embed_ms, retrieve_ms, generate_ms
+    timings: Dict[str, float] = field(default_factory=dict)
+    # 답변 캐시에서 나온 결과면 "exact" / "semantic", 아니면 None
+    cache_hit: Optional[str] = None
+    # 검색에 사용한 retriever 이름 (chroma / local / bm25 / hybrid ...)
+    retriever: Optional[str] = None
+    # 토큰 수: prompt_tokens, completion_tokens, context_tokens (답변 캐시 hit 는 LLM 호출이 없으므로 0)
+    usage: Dict[str, int] = field(default_factory=dict)
+
+    def as_tuple(self):
+        """Same 5-tuple answer_question has always returned."""
+        return self.answer, self.citations, self.sources, self.elapsed, self.source_pages
+
+
+class RagEngine:
+    """Owns warm embedding/LLM clients and an opened Chroma collection."""
+
+    def __init__(self, backend: str = RAG_BACKEND, persist_directory=CHROMA_DIR,
+                 collection_name: str = COLLECTION_NAME, embed_cache: bool = EMBED_CACHE_ENABLED,
+                 answer_cache: bool = ANSWER_CACHE_ENABLED, retriever: str = RETRIEVER_BACKEND,
+                 context_tokens: int = CONTEXT_MAX_TOKENS, retrieval_cache: bool = RETRIEVAL_CACHE_ENABLED):
+        if backend == "openai" and not OPENAI_API_KEY:
+            raise RuntimeError("conld not find OPENAI_API_KEY, please set the .env file")
+        self.backend = backend
+        with tracing.span("client_init", client="embeddings"):
+            self.embeddings = make_embeddings(backend, cache=embed_cache)
+        with tracing.span("client_init", client="chroma", collection=collection_name):
+            self.db = Chroma(
+                persist_directory=str(persist_directory),
+                embedding_function=self.embeddings,
+                collection_name=collection_name,
+            )
+        with tracing.span("client_init", client="llm"):
+            self.llm = make_llm(backend)
+        # 기본 모델 외의 chat 모델 (실험 arm 용) - 이름별로 한 번만 만듦
+        self._llms = {CHAT_MODEL: self.llm}
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        # 프롬프트 문맥 토큰 예산 (0 = 제한 없음)
+        self.context_tokens = context_tokens
+        # 검색 백엔드 (chroma / local / bm25 / hybrid) - 이름별로 한 번만 만들어서 재사용
+        self._retrievers = {}
+        self._retrievers_lock = threading.Lock()
+        self.retriever = self.get_retriever(retriever)
+        self.answer_cache = None
+        if answer_cache:
+            from src.answer_cache import AnswerCache
+            self.answer_cache = AnswerCache()
+        # 검색 결과 캐시 - 답변 캐시가 miss 여도 (다른 프롬프트 / 모델 arm) 같은 질문의 검색은 건너뜀
+        self.retrieval_cache = None
+        if retrieval_cache:
+            self.retrieval_cache = RetrievalCache(collection_name)
+
+    def get_retriever(self, name: Optional[str] = None):
+        """Retriever by backend name (None = the engine default), created on first use."""
+        if name is None:
+            return self.retriever
+        if name not in self._retrievers:
+            with self._retrievers_lock:
+                if name not in self._retrievers:
+                    with tracing.span("client_init", client="retriever", retriever=name):
+                        self._retrievers[name] = make_retriever(name, self.db, self.collection_name,
+                                                                self.persist_directory)
+        return self._retrievers[name]
+
+    def get_llm(self, model: Optional[str] = None):
+        """Chat client for a model name (None = CHAT_MODEL), created on first use."""
+        if model is None:
+            return self.llm
+        if model not in self._llms:
+            with self._retrievers_lock:
+                if model not in self._llms:
+                    with tracing.span("client_init", client="llm", model=model):
+                        self._llms[model] = make_llm(self.backend, model)
+        return self._llms[model]
+
+    def embed(self, question: str):
+        t0 = time.perf_counter()
+        with tracing.span("embed_query"):
+            return self.embeddings.embed_query(question), _ms(t0)
+
+    def retrieve(self, question: str, top_k: int, q_vec=None, retriever: Optional[str] = None,
+                 where: Optional[dict] = None, use_cache: bool = True, embed_ms: float = 0.0):
+        """Embed the question (unless q_vec is given) and search; returns (docs, timings).
+
+        where 는 Chroma 메타데이터 필터 (예: retrievers.doc_filter(["a.pdf"])) - 해당 문서 안에서만 검색.
+        검색 결과 캐시 hit 면 임베딩과 검색 없이 저장된 청크를 돌려준다 (timings 에 retrieval_cache_saved_ms).
+        q_vec 를 이미 만들었으면 (답변 캐시의 near-duplicate 조회) 그때 걸린 embed_ms 를 넘긴다 -
+        hit 여도 그 임베딩 시간은 이미 쓴 것이므로 절약한 시간에서 뺀다.
+        """
+        r = self.get_retriever(retriever)
+        cache = self.retrieval_cache if use_cache else None
+        if cache is not None:
+            t0 = time.perf_counter()
+            key, version = cache_key(question, top_k, r.name, where), index_version(self.collection_name)
+            with tracing.span("retrieval_cache", retriever=r.name, k=top_k) as sp:
+                hit = cache.get(key, version, self.db)
+                sp.set(hit=hit is not None)
+            if hit is not None:
+                docs, cost_ms = hit
+                hit_ms = _ms(t0)
+                # cost_ms 는 miss 때의 임베딩 + 검색 시간
+                saved_ms = cost_ms - embed_ms - hit_ms
+                cache.record_hit(saved_ms, hit_ms)
+                return docs, {"embed_ms": embed_ms, "retrieve_ms": hit_ms,
+                              "retrieval_cache_saved_ms": round(saved_ms, 1)}
+
+        if q_vec is None:
+            q_vec, embed_ms = self.embed(question)
+
+        t1 = time.perf_counter()
+        with tracing.span("retrieve", retriever=r.name, k=top_k, filtered=where is not None):
+            docs = r.search(question, q_vec, top_k, where)
+        retrieve_ms = _ms(t1)
+        timings = {"embed_ms": embed_ms, "retrieve_ms": retrieve_ms}
+        # 재순위 retriever 면 retrieve_ms 중 rerank_ms 와 예산 초과 여부(rerank_fallback)도 기록
+        if hasattr(r, "last_timings"):
+            timings.update(r.last_timings())
+        if cache is not None:
+            cache.put(key, version, docs, embed_ms + retrieve_ms)
+        return docs, timings
+
+    def retrieve_batch(self, questions: List[str], top_k: int, retriever: Optional[str] = None,
+                       where: Optional[dict] = None):
+        """One embedding call and one batched search for many questions; returns (docs per question, timings).
+
+        timings 는 배치 전체 시간을 질문 수로 나눈 질문당 평균 (embed_ms, retrieve_ms).
+        """
+        t0 = time.perf_counter()
+        with tracing.span("embed_queries", questions=len(questions)):
+            q_vecs = self.embeddings.embed_documents(questions)
+        embed_ms = _ms(t0)
+        t1 = time.perf_counter()
+        r = self.get_retriever(retriever)
+        with tracing.span("retrieve_batch", retriever=r.name, k=top_k, questions=len(questions)):
+            docs = r.search_batch(questions, q_vecs, top_k, where)
+        retrieve_ms = _ms(t1)
+        n = max(1, len(questions))
+        return docs, {"embed_ms": round(embed_ms / n, 2), "retrieve_ms": round(retrieve_ms / n, 2)}
+
+    def _messages(self, question: str, docs, prompt: Optional[str] = None, model: Optional[str] = None):
+        """Chat messages with a token-budgeted context; returns (messages, packed context, prompt_tokens)."""
+        model = model or CHAT_MODEL
+        with tracing.span("pack_context", chunks=len(docs)) as sp:
+            packed = pack_context(docs, self.context_tokens, model)
+            sp.set(tokens=packed.tokens)
+        system, template = PROMPTS[prompt or "default"]
+        # 문맥 토큰은 pack_context 가 이미 셌으므로 나머지(시스템 프롬프트, 질문, 틀)만 더 셈
+        prompt_tokens = (packed.tokens + count_tokens(system, model)
+                         + count_tokens(template.format(context="", question=question), model))
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": template.format(context=packed.text, question=question)},
+        ]
+        return messages, packed, prompt_tokens
+
+    def generate(self, question: str, docs, model: Optional[str] = None, prompt: Optional[str] = None):
+        """Build the prompt from docs and call the LLM; returns (answer, timings, packed context, usage)."""
+        t0 = time.perf_counter()
+        messages, packed, prompt_tokens = self._messages(question, docs, prompt, model)
+        llm = self.get_llm(model)
+        with tracing.span("llm", model=model or CHAT_MODEL, prompt_tokens=prompt_tokens):
+            resp = llm.invoke(messages)
+        answer = resp.content.strip()
+        return answer, {"generate_ms": _ms(t0)}, packed, _usage(packed, prompt_tokens, answer, model)
+
+    def _result(self, answer: str, packed: PackedContext, elapsed: float, timings: Dict[str, float],
+                retriever: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> RagResult:
+        # 인용/출처는 실제로 프롬프트에 들어간 청크 기준 (중복 제거, 예산 초과로 빠진 청크 제외)
+        docs = packed.docs
+        return RagResult(
+            answer=answer,
+            citations=citations_line(docs),
+            sources=format_sources(docs),
+            elapsed=elapsed,
+            source_pages=source_pages_csv(docs),
+            timings=timings,
+            retriever=self.get_retriever(retriever).name,
+            usage=usage or {},
+        )
+
+    def _cached(self, question: str, top_k: int, t0: float, retriever: Optional[str] = None,
+                model: Optional[str] = None, prompt: Optional[str] = None, where: Optional[dict] = None):
+        """Answer-cache lookup; returns (hit or None, q_vec, embed_ms, version)."""
+        version = index_version(self.collection_name)
+        name = _cache_scope(self.get_retriever(retriever).name, model, prompt, where)
+        q_vec, embed_ms = None, 0.0
+        # 1) exact: 임베딩 전에 확인
+        with tracing.span("answer_cache", kind="exact"):
+            hit = self.answer_cache.get_exact(question, top_k, version, name)
+        # 2) near-duplicate: 어차피 검색에 필요한 질문 임베딩으로 비교
+        if hit is None:
+            q_vec, embed_ms = self.embed(question)
+            with tracing.span("answer_cache", kind="semantic"):
+                hit = self.answer_cache.get_similar(q_vec, top_k, version, name)
+        if hit is not None:
+            kind = "exact" if q_vec is None else "semantic"
+            hit = replace(hit, elapsed=time.perf_counter() - t0,
+                          timings={"embed_ms": embed_ms, "cache_ms": _ms(t0)}, cache_hit=kind,
+                          usage={"prompt_tokens": 0, "completion_tokens": 0, "context_tokens": 0})
+        return hit, q_vec, embed_ms, version
+
+    def answer(self, question: str, top_k: int = 4, use_cache: bool = True,
+               retriever: Optional[str] = None, model: Optional[str] = None,
+               prompt: Optional[str] = None, where: Optional[dict] = None) -> RagResult:
+        """Full RAG call; use_cache=False bypasses the answer and retrieval caches (offline latency runs)."""
+        with tracing.span("answer", top_k=top_k, retriever=retriever, model=model, prompt=prompt) as sp:
+            result = self._answer(question, top_k, use_cache, retriever, model, prompt, where)
+            sp.set(cache_hit=result.cache_hit)
+        return result
+
+    def _answer(self, question, top_k, use_cache, retriever, model, prompt, where) -> RagResult:
+        t0 = time.perf_counter()
+        cache = self.answer_cache if use_cache else None
+        q_vec, embed_ms = None, 0.0
+        if cache is not None:
+            hit, q_vec, embed_ms, version = self._cached(question, top_k, t0, retriever, model, prompt, where)
+            if hit is not None:
+                return hit
+
+        docs, timings = self.retrieve(question, top_k, q_vec=q_vec, retriever=retriever, where=where,
+                                      use_cache=use_cache, embed_ms=embed_ms)
+        answer, gen_timings, packed, usage = self.generate(question, docs, model, prompt)
+        timings.update(gen_timings)
+        result = self._result(answer, packed, time.perf_counter() - t0, timings, retriever, usage)
+        if cache is not None:
+            cache.put(question, top_k, version, q_vec, result, _cache_scope(result.retriever, model, prompt, where))
+        return result
+
+    def answer_batch(self, items: Iterable[Tuple[Any, str]], on_result: Callable, top_k: int = 4,
+                     retriever: Optional[str] = None, model: Optional[str] = None, prompt: Optional[str] = None,
+                     where: Optional[dict] = None, batch_size: int = 64, concurrency: int = 8, qps: float = 0,
+                     retries: int = 5) -> int:
+        """Answer (key, question) pairs; on_result(key, question, RagResult or exception) runs as each finishes.
+
+        batch_size 개씩 읽어서 질문 임베딩 1번 + 배치 검색 1번, 생성은 concurrency 개 스레드에서 동시에
+        (rate limit 은 runner 의 재시도). 입력은 필요할 때만 읽으므로 메모리에는 한 배치의 검색 결과와
+        진행 중인 생성만 있다. 답변 캐시는 쓰지 않는다 (오프라인 일괄 작업용).
+        on_result 는 호출한 스레드에서 완료 순서대로 불린다. Returns the number of failed questions.
+        """
+        retrieval_failed = 0
+
+        def jobs():
+            nonlocal retrieval_failed
+            items_iter = iter(items)
+            while True:
+                chunk = list(itertools.islice(items_iter, batch_size))
+                if not chunk:
+                    return
+                questions = [q for _, q in chunk]
+                try:
+                    docs, timings = call_with_retry(
+                        lambda: self.retrieve_batch(questions, top_k, retriever, where), retries=retries)
+                except Exception as exc:
+                    # 재시도 후에도 실패한 배치는 그 질문들만 실패로 넘기고 다음 배치 계속
+                    retrieval_failed += len(chunk)
+                    for key, question in chunk:
+                        on_result(key, question, exc)
+                    continue
+                for (key, question), question_docs in zip(chunk, docs):
+                    yield key, question, question_docs, timings
+
+        def work(job):
+            _, question, docs, timings = job
+            t0 = time.perf_counter()
+            answer, gen_timings, packed, usage = self.generate(question, docs, model, prompt)
+            # elapsed = 질문당 평균 임베딩/검색 시간 + 자기 생성 시간 (단건 answer() 와 같은 기준)
+            elapsed = (timings["embed_ms"] + timings["retrieve_ms"]) / 1000 + time.perf_counter() - t0
+            return self._result(answer, packed, elapsed, {**timings, **gen_timings}, retriever, usage)
+
+        failed = run_jobs(jobs(), work, lambda job, result: on_result(job[0], job[1], result), concurrency, qps,
+                          retries, on_error=lambda job, exc: on_result(job[0], job[1], exc))
+        return failed + retrieval_failed
+
+    def stream_answer(self, question: str, top_k: int = 4, use_cache: bool = True,
+                      retriever: Optional[str] = None, model: Optional[str] = None,
+                      prompt: Optional[str] = None, where: Optional[dict] = None) -> "AnswerStream":
+        """Like answer(), but tokens can be consumed as the LLM produces them."""
+        return AnswerStream(self, question, top_k, use_cache, retriever, model, prompt, where)
+
+    def answer_variants(self, question: str, topk_by_variant: Dict[str, int],
+                        retriever: Optional[str] = None,
+                        generation: Optional[Dict[str, dict]] = None,
+                        where: Optional[dict] = None, use_cache: bool = True) -> Dict[str, RagResult]:
+        """Retrieve once at max(top_k) and generate per variant from a prefix of the result.
+
+        similarity 검색 결과는 점수 순으로 정렬되어 있으므로 top 2 는 top 4 의 앞부분이다.
+        앞부분이 같다는 보장이 없는 retriever (hybrid: 후보 수가 k 에 비례, +rerank: k > pool) 는
+        서로 다른 top_k 마다 따로 검색하고, 같은 top_k 인 variant 끼리만 공유한다.
+        각 variant 의 elapsed 는 공유 검색 시간 + 자기 생성 시간으로, 단독 실행과 같은 기준이다.
+        공유된 검색 시간은 timings["shared_retrieval_ms"] 로 따로 기록한다.
+        generation 은 variant 별 generate() 인자 ({"model": ..., "prompt": ...}).
+        use_cache=False 면 검색 결과 캐시를 쓰지 않는다 (오프라인 latency 측정).
+        """
+        with tracing.span("answer_variants", variants=len(topk_by_variant), retriever=retriever):
+            return self._answer_variants(question, topk_by_variant, retriever, generation or {}, where, use_cache)
+
+    def _answer_variants(self, question, topk_by_variant, retriever, generation, where,
+                         use_cache) -> Dict[str, RagResult]:
+        k_max = max(topk_by_variant.values())
+        exact = self.get_retriever(retriever).prefix_exact(k_max)
+        retrieved = {}
+        for k in ([k_max] if exact else sorted(set(topk_by_variant.values()))):
+            t0 = time.perf_counter()
+            docs, shared = self.retrieve(question, k, retriever=retriever, where=where, use_cache=use_cache)
+            shared_s = time.perf_counter() - t0
+            shared["shared_retrieval_ms"] = round(shared_s * 1000, 1)
+            retrieved[k] = (docs, shared, shared_s)
+
+        results = {}
+        for variant, top_k in topk_by_variant.items():
+            docs, shared, shared_s = retrieved[k_max if exact else top_k]
+            t1 = time.perf_counter()
+            variant_docs = docs[:top_k]
+            answer, gen_timings, packed, usage = self.generate(question, variant_docs, **generation.get(variant, {}))
+            elapsed = shared_s + (time.perf_counter() - t1)
+            results[variant] = self._result(answer, packed, elapsed, {**shared, **gen_timings}, retriever, usage)
+        return results
+
+
+class AnswerStream:
+    """Iterate to receive answer tokens; `.result` holds the RagResult once the stream is exhausted.
+
+    timings 에 ttft_ms(질문 시작 ~ 첫 토큰)와 generate_ms(LLM 호출 ~ 마지막 토큰)가 들어간다.
+    """
+
+    def __init__(self, engine: RagEngine, question: str, top_k: int, use_cache: bool,
+                 retriever: Optional[str] = None, model: Optional[str] = None, prompt: Optional[str] = None,
+                 where: Optional[dict] = None):
+        self.engine = engine
+        self.question = question
+        self.top_k = top_k
+        self.use_cache = use_cache
+        self.retriever = retriever
+        self.model = model
+        self.prompt = prompt
+        self.where = where
+        self.result: Optional[RagResult] = None
+
+    def __iter__(self):
+        engine = self.engine
+        t0 = time.perf_counter()
+        cache = engine.answer_cache if self.use_cache else None
+        q_vec, embed_ms, hit = None, 0.0, None
+        # generator 안에서는 with span 이 yield 를 넘어가면 안 되므로 (소비자가 중간에 멈출 수 있음)
+        # 첫 토큰 전까지만 span 으로 감싸고, LLM 스트리밍 구간은 끝난 뒤 record() 로 남긴다
+        with tracing.span("stream_prepare", top_k=self.top_k, retriever=self.retriever) as prep:
+            if cache is not None:
+                hit, q_vec, embed_ms, version = engine._cached(self.question, self.top_k, t0, self.retriever,
+                                                               self.model, self.prompt, self.where)
+            if hit is None:
+                docs, timings = engine.retrieve(self.question, self.top_k, q_vec=q_vec, retriever=self.retriever,
+                                                where=self.where, use_cache=self.use_cache, embed_ms=embed_ms)
+                t1 = time.perf_counter()
+                messages, packed, prompt_tokens = engine._messages(self.question, docs, self.prompt, self.model)
+            prep.set(cache_hit=hit is not None)
+        if hit is not None:
+            hit.timings["ttft_ms"] = _ms(t0)
+            self.result = hit
+            yield hit.answer
+            return
+
+        parts = []
+        # .stream() 은 답변을 GPT처럼 조각(토큰) 단위로 실시간으로 받아온다
+        for chunk in engine.get_llm(self.model).stream(messages):
+            token = chunk.content
+            if not token:
+                continue
+            if not parts:
+                timings["ttft_ms"] = _ms(t0)
+            parts.append(token)
+            yield token
+        timings["generate_ms"] = _ms(t1)
+        tracing.record("llm_stream", t1, parent=prep, model=self.model or CHAT_MODEL, ttft_ms=timings.get("ttft_ms"))
+
+        answer = "".join(parts).strip()
+        result = engine._result(answer, packed, time.perf_counter() - t0, timings, self.retriever,
+                                _usage(packed, prompt_tokens, answer, self.model))
+        if cache is not None:
+            cache.put(self.question, self.top_k, version, q_vec, result,
+                      _cache_scope(result.retriever, self.model, self.prompt, self.where))
+        self.result = result
+
+
+_engines: Dict[str, RagEngine] = {}
+_engine_lock = threading.Lock()
+
+
+def get_engine(collection_name: Optional[str] = None) -> RagEngine:
+    """Process-wide engine per Chroma collection (None = COLLECTION_NAME), created on first use."""
+    name = collection_name or COLLECTION_NAME
+    if name not in _engines:
+        with _engine_lock:
+            if name not in _engines:
+                # 인덱스 variant 는 자기 Chroma 디렉토리에 있음 (src.index_variants)
+                _engines[name] = RagEngine(collection_name=name, persist_directory=persist_dir(name))
+    return _engines[name]
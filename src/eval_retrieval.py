@@ -0,0 +1,170 @@
+"""Offline retrieval evaluation: recall@k / hit@k / MRR and search latency, without any LLM call.
+
+질문 파일은 run_experiment 와 같은 experiments/test_questions.json 을 쓰고, 항목을 문자열 대신
+{"question": "...", "gold_pages": [12, 13], "doc_id": "islp_ch1-3.pdf"} 로 바꾸면 정답 페이지(1부터)가 붙는다.
+doc_id 는 선택 (없으면 어느 문서든 그 페이지면 정답). gold_pages 가 없는 질문은 latency 만 잰다.
+
+설정 조합 (collection x retriever x k) 마다 질문 전체를 search_batch 로 한 번에 검색하고,
+질문 임베딩은 한 번만 (embed_documents 배치 + 임베딩 캐시) 계산해서 모든 설정에 재사용한다.
+
+    python -m src.eval_retrieval --retriever chroma,local,bm25,hybrid --k 2,4,8
+    python -m src.eval_retrieval --collection docs,docs_c400 --retriever local --out experiments/bench/retrieval.json
+    python -m src.eval_retrieval --export-template experiments/test_questions_gold.json   # 라벨링용 후보 페이지
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from src.config import COLLECTION_NAME
+from src.engine import get_engine
+from src.manifest import load_manifest
+
+
+def load_eval_set(path: Path) -> List[dict]:
+    """Questions as dicts: {"question", "gold_pages" (set of 1-based pages or None), "doc_id"}."""
+    items = []
+    for q in json.loads(Path(path).read_text(encoding="utf-8")):
+        if isinstance(q, str):
+            q = {"question": q}
+        gold = q.get("gold_pages")
+        items.append({"question": q["question"], "gold_pages": set(gold) if gold else None,
+                      "doc_id": q.get("doc_id")})
+    return items
+
+
+def _page(doc) -> Optional[int]:
+    page = (doc.metadata or {}).get("page")
+    return (page + 1) if isinstance(page, int) else None
+
+
+def score_query(item: dict, docs) -> dict:
+    """recall = gold pages covered by the results, hit = any of them, rr = 1 / rank of the first relevant chunk."""
+    gold, doc_id = item["gold_pages"], item["doc_id"]
+    found, rr = set(), 0.0
+    for rank, d in enumerate(docs, 1):
+        if doc_id and (d.metadata or {}).get("doc_id") != doc_id:
+            continue
+        page = _page(d)
+        if page in gold:
+            found.add(page)
+            if not rr:
+                rr = 1.0 / rank
+    return {"recall": len(found) / len(gold), "hit": float(bool(found)), "rr": rr}
+
+
+def chunk_params(collection: str) -> str:
+    """Chunk size/overlap the collection was indexed with (from its manifest)."""
+    for entry in load_manifest(collection)["files"].values():
+        cfg = entry.get("config") or {}
+        if cfg:
+            return f"{cfg.get('chunk_size')}/{cfg.get('chunk_overlap')}"
+    return "?"
+
+
+def evaluate(engine, retriever: str, k: int, items: List[dict], q_vecs) -> dict:
+    r = engine.get_retriever(retriever)
+    questions = [it["question"] for it in items]
+    # 1) 배치 검색으로 정확도 계산
+    t0 = time.perf_counter()
+    results = r.search_batch(questions, q_vecs, k)
+    batch_ms = (time.perf_counter() - t0) * 1000
+    labeled = [score_query(it, docs) for it, docs in zip(items, results) if it["gold_pages"]]
+    # 2) 질문 하나씩 검색해서 latency 분포 (UI 요청 1건 기준)
+    lat = []
+    for q, v in zip(questions, q_vecs):
+        t1 = time.perf_counter()
+        r.search(q, v, k)
+        lat.append((time.perf_counter() - t1) * 1000)
+    row = {
+        "collection": engine.collection_name,
+        "chunks": chunk_params(engine.collection_name),
+        "retriever": r.name,
+        "k": k,
+        "labeled": len(labeled),
+    }
+    for m in ("recall", "hit", "rr"):
+        row[m] = round(sum(s[m] for s in labeled) / len(labeled), 3) if labeled else None
+    lat.sort()
+    row.update({
+        "p50_ms": round(lat[len(lat) // 2], 2),
+        "p95_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.95))], 2),
+        "p99_ms": round(lat[min(len(lat) - 1, int(len(lat) * 0.99))], 2),
+        "batch_ms_per_query": round(batch_ms / len(questions), 3),
+    })
+    return row
+
+
+def export_template(engine, retriever: str, items: List[dict], q_vecs, out: Path, k: int = 8) -> None:
+    """Write the question file as dicts with empty gold_pages and the retrieved candidate pages as a hint."""
+    results = engine.get_retriever(retriever).search_batch([it["question"] for it in items], q_vecs, k)
+    rows = []
+    for it, docs in zip(items, results):
+        candidates = []
+        for d in docs:
+            c = {"doc_id": (d.metadata or {}).get("doc_id"), "page": _page(d)}
+            if c not in candidates:
+                candidates.append(c)
+        rows.append({"question": it["question"], "gold_pages": sorted(it["gold_pages"] or []),
+                     **({"doc_id": it["doc_id"]} if it["doc_id"] else {}), "candidates": candidates})
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(rows, indent=1, ensure_ascii=False), encoding="utf-8")
+    print(f"[OK] wrote {len(rows)} questions to {out} - fill in gold_pages, then drop candidates")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--questions", default="experiments/test_questions.json")
+    ap.add_argument("--collection", default=COLLECTION_NAME, help="Comma-separated collections (chunking variants)")
+    ap.add_argument("--retriever", default="chroma,local,bm25,hybrid", help="Comma-separated retriever names")
+    ap.add_argument("--k", default="1,2,4,8", help="Comma-separated k values")
+    ap.add_argument("--out", help="Also write the rows as JSON")
+    ap.add_argument("--export-template", metavar="PATH", help="Write a labeling template instead of evaluating")
+    args = ap.parse_args()
+
+    items = load_eval_set(Path(args.questions))
+    n_labeled = sum(1 for it in items if it["gold_pages"])
+    print(f"[OK] questions={len(items)} | with gold_pages={n_labeled}")
+    if not n_labeled and not args.export_template:
+        print("[WARN] no gold_pages in the question file - only latency is reported (see --export-template)")
+
+    collections = args.collection.split(",")
+    retrievers = args.retriever.split(",")
+    ks = [int(k) for k in args.k.split(",")]
+
+    rows = []
+    for collection in collections:
+        engine = get_engine(collection)
+        # 질문 임베딩은 컬렉션마다 한 번 (같은 임베딩 모델이면 두 번째부터는 임베딩 캐시)
+        t0 = time.perf_counter()
+        q_vecs = engine.embeddings.embed_documents([it["question"] for it in items])
+        print(f"[OK] {collection}: embedded {len(items)} questions in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        if args.export_template:
+            export_template(engine, retrievers[0], items, q_vecs, Path(args.export_template))
+            return
+        for retriever in retrievers:
+            for k in ks:
+                rows.append(evaluate(engine, retriever, k, items, q_vecs))
+
+    cols = ["collection", "chunks", "retriever", "k", "recall", "hit", "rr", "p50_ms", "p95_ms", "p99_ms",
+            "batch_ms_per_query"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    print("  ".join(c.rjust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r[c]).rjust(widths[c]) for c in cols))
+    print("(recall = gold pages in top-k, hit = any gold page in top-k, rr = MRR@k; "
+          f"averaged over {n_labeled} labeled questions)")
+    if getattr(engine.embeddings, "cache", None) is not None:
+        print("[OK] Embedding cache:", engine.embeddings.cache.stats())
+
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps({"questions": str(args.questions), "labeled": n_labeled, "rows": rows}, indent=1),
+                       encoding="utf-8")
+        print("[OK] wrote", out)
+
+
+if __name__ == "__main__":
+    main()
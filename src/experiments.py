@@ -0,0 +1,127 @@
+"""Experiment registry (experiments/experiments.json) and deterministic arm assignment.
+
+arm 하나가 top_k / retriever / model / prompt / collection(청킹 설정이 다른 인덱스) / 답변 캐시 사용 여부를
+정할 수 있고, 지정하지 않은 항목은 엔진 기본값을 쓴다. weight 는 UI 트래픽 비율.
+
+배정은 random.choice 대신 hash(experiment, session_id) -> [0, 1) 구간을 weight 누적합으로 나눠서 고른다.
+같은 세션은 항상 같은 arm (새로고침/재시작해도 동일), 실험마다 독립적으로 섞인다.
+
+    python -m src.experiments                         # 등록된 실험 목록
+    python -m src.experiments --experiment latency_arms --sessions 10000   # 배정 비율 확인
+"""
+import argparse
+import hashlib
+import json
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Optional
+
+from src.config import EXPERIMENTS_PATH
+
+ARM_FIELDS = ("top_k", "retriever", "model", "prompt", "collection", "use_cache", "weight")
+
+
+@dataclass(frozen=True)
+class Arm:
+    name: str
+    top_k: int = 4
+    # None 이면 엔진 기본값 (RETRIEVER / CHAT_MODEL / "default" 프롬프트 / COLLECTION_NAME)
+    retriever: Optional[str] = None
+    model: Optional[str] = None
+    prompt: Optional[str] = None
+    collection: Optional[str] = None
+    use_cache: bool = True
+    weight: float = 1.0
+
+    def answer_kwargs(self) -> dict:
+        """Keyword arguments for RagEngine.answer / stream_answer."""
+        return {"top_k": self.top_k, "use_cache": self.use_cache, "retriever": self.retriever,
+                "model": self.model, "prompt": self.prompt}
+
+    def describe(self) -> str:
+        parts = [f"top_k={self.top_k}"]
+        parts += [f"{k}={getattr(self, k)}" for k in ("retriever", "model", "prompt", "collection")
+                  if getattr(self, k) is not None]
+        if not self.use_cache:
+            parts.append("no_cache")
+        return " ".join(parts)
+
+
+@dataclass(frozen=True)
+class Experiment:
+    name: str
+    arms: Dict[str, Arm]
+    control: str
+    description: str = ""
+    # 누적 weight 경계 (assign 용), arms 순서대로
+    _bounds: tuple = field(default=(), repr=False, compare=False)
+
+    def assign(self, session_id: str) -> Arm:
+        """Arm for a session: same session -> same arm, split by weight."""
+        digest = hashlib.sha256(f"{self.name}:{session_id}".encode("utf-8")).digest()
+        # 상위 8바이트 -> [0, 1) 균등분포
+        u = int.from_bytes(digest[:8], "big") / 2 ** 64
+        for name, bound in self._bounds:
+            if u < bound:
+                return self.arms[name]
+        return self.arms[self._bounds[-1][0]]
+
+
+def _parse(name: str, spec: dict) -> Experiment:
+    arms = {}
+    for arm_name, arm in spec.get("arms", {}).items():
+        unknown = set(arm) - set(ARM_FIELDS)
+        if unknown:
+            raise ValueError(f"{name}/{arm_name}: unknown arm field(s) {sorted(unknown)} (expected {ARM_FIELDS})")
+        arms[arm_name] = Arm(name=arm_name, **arm)
+    if not arms:
+        raise ValueError(f"{name}: no arms defined")
+    total = sum(a.weight for a in arms.values())
+    if total <= 0 or any(a.weight < 0 for a in arms.values()):
+        raise ValueError(f"{name}: arm weights must be >= 0 and not all zero")
+    control = spec.get("control", next(iter(arms)))
+    if control not in arms:
+        raise ValueError(f"{name}: control arm {control!r} is not defined")
+    bounds, acc = [], 0.0
+    for arm in arms.values():
+        acc += arm.weight / total
+        bounds.append((arm.name, acc))
+    return Experiment(name=name, arms=arms, control=control, description=spec.get("description", ""),
+                      _bounds=tuple(bounds))
+
+
+def load_experiments(path: Path = EXPERIMENTS_PATH) -> Dict[str, Experiment]:
+    spec = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {name: _parse(name, exp) for name, exp in spec.items()}
+
+
+def get_experiment(name: str, path: Path = EXPERIMENTS_PATH) -> Experiment:
+    experiments = load_experiments(path)
+    if name not in experiments:
+        raise KeyError(f"Unknown experiment {name!r} (registered: {', '.join(experiments)})")
+    return experiments[name]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--experiment", help="Show one experiment (default: list all)")
+    ap.add_argument("--sessions", type=int, default=0, help="Simulate assignment for N random sessions")
+    args = ap.parse_args()
+
+    experiments = load_experiments()
+    for name, exp in experiments.items():
+        if args.experiment and name != args.experiment:
+            continue
+        print(f"{name} (control={exp.control}) {exp.description}")
+        for arm in exp.arms.values():
+            print(f"  {arm.name}: weight={arm.weight:g} {arm.describe()}")
+        if args.sessions:
+            counts = {a: 0 for a in exp.arms}
+            for _ in range(args.sessions):
+                counts[exp.assign(str(uuid.uuid4())).name] += 1
+            print("  assigned:", {a: f"{n / args.sessions * 100:.1f}%" for a, n in counts.items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Deterministic local stand-ins for OpenAIEmbeddings / ChatOpenAI.
+
+네트워크나 API 키 없이 파이프라인 전체를 돌려보기 위한 가짜 백엔드.
+벤치마크와 로컬 테스트에서 RAG_BACKEND=fake 로 사용한다.
+"""
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from src.config import (
+    FAKE_CLIENT_INIT_MS,
+    FAKE_EMBED_LATENCY_MS,
+    FAKE_LATENCY_DIST,
+    FAKE_LATENCY_SIGMA,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_RATE_LIMIT_RATE,
+    FAKE_SEED,
+)
+
+FAKE_EMBED_DIM = 256
+LATENCY_DISTS = ("fixed", "lognormal", "exponential")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class FakeRateLimitError(RuntimeError):
+    """Stands in for openai.RateLimitError (HTTP 429)."""
+
+    status_code = 429
+
+
+def _sleep_ms(ms: float) -> None:
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+class Latency:
+    """Per-call latency (ms) with a given mean: fixed, lognormal or exponential; seeded so runs repeat."""
+
+    def __init__(self, mean_ms: float, dist: str = FAKE_LATENCY_DIST, sigma: float = FAKE_LATENCY_SIGMA,
+                 seed: int = FAKE_SEED):
+        if dist not in LATENCY_DISTS:
+            raise ValueError(f"Unknown latency distribution: {dist!r} (expected one of {LATENCY_DISTS})")
+        self.mean_ms = mean_ms
+        self.dist = dist
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        # 여러 스레드가 같은 클라이언트를 씀 - 난수 순서가 섞여도 분포는 같지만 상태는 보호
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        if self.mean_ms <= 0 or self.dist == "fixed":
+            return self.mean_ms
+        with self._lock:
+            if self.dist == "lognormal":
+                # mu = -sigma^2 / 2 로 두면 평균이 mean_ms 로 유지됨
+                return self.mean_ms * self._rng.lognormvariate(-self.sigma ** 2 / 2, self.sigma)
+            return self._rng.expovariate(1 / self.mean_ms)
+
+
+def hash_embed(text: str, dim: int = FAKE_EMBED_DIM) -> List[float]:
+    """Feature-hashing bag of words: 같은 단어를 공유하는 텍스트는 가까운 벡터가 된다."""
+    vec = [0.0] * dim
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return [x / norm for x in vec]
+
+
+class FakeEmbeddings(Embeddings):
+    """Drop-in for OpenAIEmbeddings with configurable per-call latency."""
+
+    def __init__(self, dim: int = FAKE_EMBED_DIM, latency_ms: float = FAKE_EMBED_LATENCY_MS,
+                 init_ms: float = FAKE_CLIENT_INIT_MS, dist: str = FAKE_LATENCY_DIST, seed: int = FAKE_SEED):
+        # 실제 클라이언트 생성 비용(HTTP 커넥션 풀, TLS 설정 등)을 흉내
+        _sleep_ms(init_ms)
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.latency = Latency(latency_ms, dist, seed=seed)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        _sleep_ms(self.latency.sample())
+        return [hash_embed(t, self.dim) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        _sleep_ms(self.latency.sample())
+        return hash_embed(text, self.dim)
+
+
+class FakeChatModel:
+    """Drop-in for ChatOpenAI: answers with the first lines of the provided context."""
+
+    def __init__(self, latency_ms: float = FAKE_LLM_LATENCY_MS, init_ms: float = FAKE_CLIENT_INIT_MS,
+                 rate_limit_rate: float = FAKE_RATE_LIMIT_RATE, dist: str = FAKE_LATENCY_DIST,
+                 seed: int = FAKE_SEED + 1):
+        _sleep_ms(init_ms)
+        self.latency_ms = latency_ms
+        self.latency = Latency(latency_ms, dist, seed=seed)
+        self.rate_limit_rate = rate_limit_rate
+
+    def _reply(self, messages) -> str:
+        user = messages[-1]["content"] if messages else ""
+        body = user.split("Context:", 1)[-1].split("Question:", 1)[0]
+        lines = [ln.strip() for ln in body.splitlines() if ln.strip() and not ln.startswith("[source")]
+        if not lines:
+            return "I don't know based on the provided document."
+        return " ".join(lines[:2])[:400]
+
+    def invoke(self, messages) -> AIMessage:
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            raise FakeRateLimitError("Rate limit reached (fake backend)")
+        _sleep_ms(self.latency.sample())
+        return AIMessage(content=self._reply(messages))
+
+    def stream(self, messages):
+        """Yield word-sized chunks: half the latency before the first one, the rest spread out."""
+        if self.rate_limit_rate and random.random() < self.rate_limit_rate:
+            raise FakeRateLimitError("Rate limit reached (fake backend)")
+        words = re.findall(r"\S+\s*", self._reply(messages))
+        latency_ms = self.latency.sample()
+        _sleep_ms(latency_ms / 2)
+        for word in words:
+            yield AIMessageChunk(content=word)
+            _sleep_ms(latency_ms / 2 / max(1, len(words)))
@@ -0,0 +1,157 @@
+"""Named index variants (chunk size / overlap / splitter) built side by side.
+
+experiments/index_variants.json 에 variant 를 정의하고, variant 이름이 곧 Chroma 컬렉션 이름이다.
+실험 arm 의 "collection", rag/eval 의 --collection 으로 고른다.
+기본 컬렉션(COLLECTION_NAME)은 예전처럼 CHROMA_DIR 에, 나머지 variant 는 CHROMA_DIR/variants/<이름> 에
+따로 저장한다. Chroma PersistentClient 는 여러 프로세스가 같은 디렉토리에 동시에 쓰는 것을 지원하지 않으므로
+variant 를 병렬 프로세스로 빌드하려면 디렉토리를 나눠야 한다. 임베딩 캐시(SQLite WAL)는 모든 프로세스가 같이 쓴다.
+
+    python -m src.ingest --dir data/docs --all-variants       # 모든 variant 를 병렬로 빌드 + 리포트
+    python -m src.index_variants                              # 크기 / 빌드 시간 / 검색 latency 리포트
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from src.config import (
+    CHROMA_DIR,
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
+    COLLECTION_NAME,
+    EMBEDDING_MODEL,
+    INDEX_VARIANTS_PATH,
+    VARIANTS_DIR,
+)
+
+SPLITTERS = ("recursive", "token")
+VARIANT_FIELDS = ("chunk_size", "chunk_overlap", "splitter", "description")
+
+
+@dataclass(frozen=True)
+class IndexVariant:
+    name: str
+    chunk_size: int = CHUNK_SIZE
+    chunk_overlap: int = CHUNK_OVERLAP
+    # recursive: 글자 수 기준 / token: tiktoken 토큰 수 기준
+    splitter: str = "recursive"
+    description: str = ""
+
+    def chunk_config(self) -> dict:
+        """What the manifest compares to decide whether a file must be re-chunked."""
+        config = {"chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap,
+                  "embedding_model": EMBEDDING_MODEL}
+        # 기존 manifest 와 호환되도록 기본 splitter 는 기록하지 않음
+        if self.splitter != "recursive":
+            config["splitter"] = self.splitter
+        return config
+
+    def make_splitter(self):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        if self.splitter == "token":
+            from src.tokens import count_tokens
+
+            return RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap,
+                                                  length_function=count_tokens)
+        return RecursiveCharacterTextSplitter(chunk_size=self.chunk_size, chunk_overlap=self.chunk_overlap)
+
+    @property
+    def persist_directory(self) -> Path:
+        return persist_dir(self.name)
+
+    def describe(self) -> str:
+        return f"{self.splitter} {self.chunk_size}/{self.chunk_overlap}"
+
+
+def load_variants(path: Path = INDEX_VARIANTS_PATH) -> Dict[str, IndexVariant]:
+    path = Path(path)
+    spec = json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    variants = {}
+    for name, fields in spec.items():
+        unknown = set(fields) - set(VARIANT_FIELDS)
+        if unknown:
+            raise ValueError(f"{name}: unknown variant field(s) {sorted(unknown)} (expected {VARIANT_FIELDS})")
+        variant = IndexVariant(name=name, **fields)
+        if variant.splitter not in SPLITTERS:
+            raise ValueError(f"{name}: unknown splitter {variant.splitter!r} (expected one of {SPLITTERS})")
+        if not 0 <= variant.chunk_overlap < variant.chunk_size:
+            raise ValueError(f"{name}: chunk_overlap must be >= 0 and smaller than chunk_size")
+        variants[name] = variant
+    return variants
+
+
+def get_variant(name: Optional[str] = None) -> IndexVariant:
+    """Registered variant, or the default chunking for any other collection name."""
+    name = name or COLLECTION_NAME
+    return load_variants().get(name) or IndexVariant(name=name)
+
+
+def persist_dir(name: Optional[str] = None) -> Path:
+    """Chroma directory of a collection: CHROMA_DIR, or VARIANTS_DIR/<name> for registered variants."""
+    name = name or COLLECTION_NAME
+    if name != COLLECTION_NAME and name in load_variants():
+        return VARIANTS_DIR / name
+    return CHROMA_DIR
+
+
+def dir_size(path: Path, exclude: Optional[Path] = None) -> int:
+    if not path.exists():
+        return 0
+    return sum(p.stat().st_size for p in path.rglob("*")
+               if p.is_file() and not (exclude and exclude in p.parents))
+
+
+def report(names: List[str], questions: Path, retriever: str = "chroma", k: int = 4) -> List[dict]:
+    """Chunks, index size, last build time and search latency per variant."""
+    from src.engine import get_engine
+    from src.eval_retrieval import evaluate, load_eval_set
+    from src.manifest import load_manifest
+
+    items = load_eval_set(questions)
+    rows = []
+    for name in names:
+        variant = get_variant(name)
+        manifest = load_manifest(name)
+        build = manifest.get("build", {})
+        # 기본 Chroma 디렉토리는 variants/ 와 ingest_state/ 를 빼고 계산 (같은 디렉토리의 다른 컬렉션은 포함됨)
+        path = variant.persist_directory
+        size = dir_size(path, VARIANTS_DIR if path == CHROMA_DIR else None) - (
+            dir_size(CHROMA_DIR / "ingest_state") if path == CHROMA_DIR else 0)
+        row = {"variant": name, "chunking": variant.describe(),
+               "chunks": sum(e.get("chunks", 0) for e in manifest["files"].values()),
+               "size_mb": round(size / 1024 / 1024, 2), "build_s": build.get("seconds")}
+        if row["chunks"]:
+            engine = get_engine(name)
+            q_vecs = engine.embeddings.embed_documents([it["question"] for it in items])
+            ev = evaluate(engine, retriever, k, items, q_vecs)
+            row.update({"retriever": ev["retriever"], "k": k, "p50_ms": ev["p50_ms"], "p99_ms": ev["p99_ms"],
+                        "recall": ev["recall"], "rr": ev["rr"]})
+        rows.append(row)
+
+    cols = ["variant", "chunking", "chunks", "size_mb", "build_s", "retriever", "k", "p50_ms", "p99_ms", "recall",
+            "rr"]
+    widths = {c: max(len(c), *(len(str(r.get(c, "-"))) for r in rows)) for c in cols}
+    print("  ".join(c.rjust(widths[c]) for c in cols))
+    for r in rows:
+        print("  ".join(str(r.get(c, "-")).rjust(widths[c]) for c in cols))
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--variant", action="append", help="Report only these variants (default: all registered)")
+    ap.add_argument("--questions", default="experiments/test_questions.json")
+    ap.add_argument("--retriever", default="chroma")
+    ap.add_argument("--k", type=int, default=4)
+    args = ap.parse_args()
+
+    variants = load_variants()
+    for v in variants.values():
+        print(f"{v.name}: {v.describe()} -> {v.persist_directory} {v.description}")
+    report(args.variant or list(variants), Path(args.questions), args.retriever, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,391 @@
 import argparse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+import json
 from pathlib import Path
 import time
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import chromadb
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-# langchain-chroma로 변경 예정
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
 
-from src.config import CHROMA_DIR, EMBEDDING_MODEL, CHUNK_OVERLAP, CHUNK_SIZE, OPENAI_API_KEY
+from src import embed_cache, tracing
+from src.config import (
+    COLLECTION_NAME,
+    DOCS_DIR,
+    EMBEDDING_MODEL,
+    OPENAI_API_KEY,
+    RAG_BACKEND,
+)
+from src.engine import make_embeddings
+from src.index_variants import IndexVariant, get_variant, load_variants, report
+from src.lexical import build_lexical_index, index_path
+from src.manifest import chunk_hash, file_sha256, load_manifest, save_manifest
+from src.tokens import count_tokens
 
-def ingest_pdf(pdf_path: Path) -> None:
-    if not OPENAI_API_KEY:
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WORKERS = 4
+DEFAULT_FILE_WORKERS = 4
+
+
+def doc_metadata(pdf_path: Path) -> dict:
+    """Per-document metadata from an optional sidecar file next to the PDF (<name>.meta.json).
+
+    예: {"title": "ISLP ch.1-3", "lang": "en", "tags": "stats"} - 모든 청크의 메타데이터에 들어가서 where 필터로 검색 가능.
+    """
+    sidecar = pdf_path.with_name(pdf_path.stem + ".meta.json")
+    if not sidecar.exists():
+        return {}
+    return clean_metadata(json.loads(sidecar.read_text(encoding="utf-8")))
+
+
+def iter_chunks(pdf_path: Path, splitter, doc_id: Optional[str] = None, doc_meta: Optional[dict] = None):
+    """Yield (chunk_id, text, metadata) page by page - PDF 전체를 메모리에 올리지 않는다.
+
+    chunk_id = 문서 ID + 페이지 + 내용 해시 라서 내용이 같으면 항상 같은 ID가 나온다.
+    """
+    doc_id = doc_id or pdf_path.name
+    # lazy_load 는 페이지를 하나씩 읽어서 넘겨줌
+    for page_doc in PyPDFLoader(str(pdf_path)).lazy_load():
+        page = page_doc.metadata.get("page")
+        seen = {}
+        for chunk in splitter.split_documents([page_doc]):
+            h = chunk_hash(chunk.page_content)
+            # 같은 페이지에 똑같은 청크가 두 번 나오는 경우 대비
+            n = seen[h] = seen.get(h, -1) + 1
+            md = {**chunk.metadata, **(doc_meta or {}), "doc_id": doc_id}
+            yield f"{doc_id}:p{page}:{h}" + (f":{n}" if n else ""), chunk.page_content, clean_metadata(md)
+
+
+def chunk_file(pdf_path: Path, doc_id: str, doc_meta: dict, variant: IndexVariant) -> list:
+    """Process-pool worker: every chunk of one PDF (PDF 파싱/분할은 CPU 작업이라 파일별로 프로세스에서)."""
+    with tracing.span("parse_file", doc_id=doc_id) as sp:
+        chunks = list(iter_chunks(pdf_path, variant.make_splitter(), doc_id, doc_meta))
+        sp.set(chunks=len(chunks))
+    tracing.flush()
+    return chunks
+
+
+def find_pdfs(root: Path) -> List[Tuple[str, Path]]:
+    """(doc_id, path) for every PDF under root; doc_id is the path relative to root."""
+    return [(p.relative_to(root).as_posix(), p) for p in sorted(root.rglob("*.pdf"))]
+
+
+def iter_batches(items, size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def clean_metadata(md: dict) -> dict:
+    # Chroma 메타데이터는 str/int/float/bool 만 허용
+    return {k: v for k, v in (md or {}).items() if isinstance(v, (str, int, float, bool))}
+
+
+def embed_batch(embeddings, batch):
+    """Worker: embed one batch of chunks and count its tokens."""
+    texts = [text for _, text, _ in batch]
+    with tracing.span("embed_batch", chunks=len(texts)):
+        vectors = embeddings.embed_documents(texts)
+    tokens = sum(count_tokens(t) for t in texts)
+    return batch, vectors, tokens
+
+
+def _index_file(collection, embeddings, pool, doc_id: str, chunks, reusable: set, batch_size: int,
+                workers: int, counts: dict, t0: float) -> Tuple[set, set]:
+    """Embed/upsert the new or changed chunks of one document; returns (chunk ids seen, pages)."""
+    pages, seen = set(), set()
+
+    def changed_chunks():
+        for cid, text, md in chunks:
+            pages.add(md.get("page"))
+            seen.add(cid)
+            if cid in reusable:
+                counts["unchanged"] += 1
+                continue
+            yield cid, text, md
+
+    def commit(fut):
+        batch, vectors, n_tokens = fut.result()
+        with tracing.span("upsert", chunks=len(batch)):
+            collection.upsert(
+                ids=[cid for cid, _, _ in batch],
+                embeddings=vectors,
+                documents=[text for _, text, _ in batch],
+                metadatas=[md for _, _, md in batch],
+            )
+        counts["new"] += len(batch)
+        counts["tokens"] += n_tokens
+        dt = time.time() - t0
+        print(f"[..] {doc_id} pages={len(pages)} | new_chunks={counts['new']} | {counts['new'] / dt:.1f} chunks/s")
+
+    # 새로 생기거나 바뀐 청크만 배치 임베딩 (워커 스레드에서 병렬), upsert 는 이 스레드에서
+    in_flight = deque()
+    for batch in iter_batches(changed_chunks(), batch_size):
+        # bind: 워커 스레드의 embed_batch span 이 이 문서의 span 아래에 붙도록
+        in_flight.append(pool.submit(tracing.bind(embed_batch), embeddings, batch))
+        if len(in_flight) >= 2 * workers:
+            commit(in_flight.popleft())
+    while in_flight:
+        commit(in_flight.popleft())
+    return seen, pages
+
+
+def _chunk_sources(todo, file_workers: int, variant: IndexVariant):
+    """(doc_id, path, chunks) per file, in completion order when parsed by a process pool."""
+    if file_workers <= 1 or len(todo) <= 1:
+        splitter = variant.make_splitter()
+        for doc_id, path, _, meta in todo:
+            yield doc_id, path, iter_chunks(path, splitter, doc_id, meta)
+        return
+    # 파일 단위로 프로세스 병렬 파싱. 결과(청크 리스트)가 메모리에 쌓이지 않도록 동시에 2 * file_workers 개까지만
+    pending = deque(todo)
+    with ProcessPoolExecutor(max_workers=file_workers) as procs:
+        running = {}
+        while pending or running:
+            while pending and len(running) < 2 * file_workers:
+                doc_id, path, _, meta = pending.popleft()
+                running[procs.submit(chunk_file, path, doc_id, meta, variant)] = (doc_id, path)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                doc_id, path = running.pop(fut)
+                # 파싱 실패는 예외 객체로 넘겨서 그 파일만 건너뛰게
+                exc = fut.exception()
+                yield doc_id, path, exc if exc is not None else fut.result()
+
+
+def ingest_files(files: Sequence[Tuple[str, Path]], collection_name: str = COLLECTION_NAME,
+                 batch_size: int = DEFAULT_BATCH_SIZE, workers: int = DEFAULT_WORKERS,
+                 file_workers: int = DEFAULT_FILE_WORKERS, force: bool = False, prune: bool = False) -> dict:
+    """Index (doc_id, path) PDFs into one collection; unchanged files are skipped.
+
+    prune=True 면 manifest 에 있지만 files 에 없는 문서(디렉토리에서 지워진 파일)의 청크를 삭제한다.
+    index_version 증가와 BM25 재생성은 파일마다가 아니라 실행 끝에 한 번만.
+    컬렉션을 고치기 전에 manifest 에 dirty 를 기록하고 버전을 올린 뒤 지우므로, 중간에 죽은 실행이
+    저장한 청크도 다음 실행에서 버전에 반영된다.
+    청크 설정과 저장 위치는 collection_name 의 index variant 를 따른다 (src.index_variants).
+    """
+    with tracing.span("ingest", collection=collection_name, files=len(files)) as sp:
+        counts = _ingest_files(files, collection_name, batch_size, workers, file_workers, force, prune)
+        sp.set(new_chunks=counts["new"], deleted=counts["deleted"])
+    # variant 빌드 워커 프로세스는 atexit 없이 끝나므로 여기서 기록
+    tracing.flush()
+    embed_cache.flush()
+    return counts
+
+
+def _ingest_files(files, collection_name, batch_size, workers, file_workers, force, prune) -> dict:
+    if RAG_BACKEND == "openai" and not OPENAI_API_KEY:
         # return 과 다른점은 raise는 발생즉시 작업 종료
         raise RuntimeError(
             "There's no API kye please check a .env file"
         )
-    
 
     t0 = time.time()
+    variant = get_variant(collection_name)
+    chroma_dir = variant.persist_directory
+    config = variant.chunk_config()
+    # 파일 해시와 청크 설정이 manifest 와 같으면 인덱싱할 것이 없음
+    manifest = load_manifest(collection_name)
+    with tracing.span("hash_files", files=len(files)), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        shas = list(pool.map(lambda f: file_sha256(f[1]), files))
+    todo, skipped = [], 0
+    for (doc_id, path), sha in zip(files, shas):
+        entry = manifest["files"].get(doc_id, {})
+        if not force and entry.get("complete") and entry.get("sha256") == sha and entry.get("config") == config:
+            skipped += 1
+            continue
+        todo.append((doc_id, path, sha, doc_metadata(path)))
+    removed = sorted(set(manifest["files"]) - {doc_id for doc_id, _ in files}) if prune else []
+    print(f"[OK] collection={collection_name} | files={len(files)} | to index={len(todo)} | unchanged={skipped}"
+          f" | removed={len(removed)}")
 
-    # PDF load 
-    loader = PyPDFLoader(str(pdf_path))
-    docs = loader.load()
+    counts = {"new": 0, "unchanged": 0, "deleted": 0, "tokens": 0, "pages": 0, "chunks": 0, "failed": 0}
+    failed = []
+    if todo or removed:
+        # embedding: vector 변환
+        embeddings = make_embeddings()
+        # save to Chroma - 임베딩은 직접 계산해서 벡터와 함께 upsert
+        client = chromadb.PersistentClient(path=str(chroma_dir))
+        collection = client.get_or_create_collection(collection_name, embedding_function=None)
+        # 이제부터 컬렉션이 바뀔 수 있음 - 실행이 중간에 죽어도 다음 실행이 index_version 을 올리도록
+        manifest["dirty"] = True
+        save_manifest(manifest, collection_name)
+        todo_by_id = {doc_id: (sha, meta) for doc_id, _, sha, meta in todo}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for doc_id, path, chunks in _chunk_sources(todo, file_workers, variant):
+                sha, meta = todo_by_id[doc_id]
+                # 이 문서로 이미 저장된 청크 ID들. 중간에 죽은 실행에서 저장된 배치도 여기 포함되므로 자연스럽게 이어서 진행
+                existing = set(collection.get(where={"doc_id": doc_id}, include=[])["ids"])
+                entry = manifest["files"].setdefault(doc_id, {})
+                entry.update({"sha256": sha, "config": config, "complete": False})
+                save_manifest(manifest, collection_name)
 
-    # chunking
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-    )
-    chunks = splitter.split_documents(docs)
+                # 읽을 수 없는 PDF 하나 때문에 디렉토리 전체가 멈추지 않도록 파일 단위로 실패 처리.
+                # 실패한 문서는 complete=False 로 남아서 다음 실행에서 다시 시도된다
+                try:
+                    if isinstance(chunks, Exception):
+                        raise chunks
+                    # 파일을 한 프로세스에서 파싱할 때는 파싱/분할 시간도 이 span 안에 포함됨 (청크 generator)
+                    with tracing.span("index_document", doc_id=doc_id):
+                        seen, pages = _index_file(collection, embeddings, pool, doc_id, chunks,
+                                                  set() if force else existing, batch_size, workers, counts, t0)
+                        # 문서에서 사라진(수정 전) 청크 삭제
+                        stale = sorted(existing - seen)
+                        with tracing.span("delete_stale", chunks=len(stale)):
+                            for batch in iter_batches(stale, 5000):
+                                collection.delete(ids=batch)
+                except Exception as exc:
+                    counts["failed"] += 1
+                    failed.append(doc_id)
+                    print(f"[FAIL] {doc_id}: {type(exc).__name__}: {exc}")
+                    continue
+                counts["deleted"] += len(stale)
+                counts["pages"] += len(pages)
+                counts["chunks"] += len(seen)
+                entry.update({"complete": True, "chunks": len(seen), "pages": len(pages), "path": str(path),
+                              "title": meta.get("title", path.stem), "metadata": meta})
+                save_manifest(manifest, collection_name)
+                print(f"[OK] {doc_id}: pages={len(pages)} chunks={len(seen)} stale={len(stale)}")
 
-    # embedding: vector 변환
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        # 디렉토리에서 지워진 문서
+        for doc_id in removed:
+            ids = collection.get(where={"doc_id": doc_id}, include=[])["ids"]
+            for batch in iter_batches(ids, 5000):
+                collection.delete(ids=batch)
+            counts["deleted"] += len(ids)
+            del manifest["files"][doc_id]
+            print(f"[OK] removed {doc_id}: {len(ids)} chunks")
 
-    # save to Chroma
-    db = Chroma(
-        persist_directory=str(CHROMA_DIR),
-        embedding_function=embeddings,
-        collection_name="docs",
-    )
+    # 이번 실행이 바꾼 것이 없어도 이전 실행이 저장만 하고 죽었으면 (dirty) 버전을 올림
+    changed = bool(counts["new"] or counts["deleted"] or manifest.get("dirty"))
+    if changed:
+        manifest["index_version"] += 1
+        manifest["dirty"] = False
+        # variant 리포트용: 마지막으로 내용이 바뀐 빌드의 소요 시간
+        manifest["build"] = {"seconds": round(time.time() - t0, 2), "files": len(todo), "new_chunks": counts["new"]}
+        save_manifest(manifest, collection_name)
 
-    # vector 변환 시작
-    db.add_documents(chunks)
-    # 하드(chroma DB)에 저장 확정 명령 / 현재는 persist를 사용하지 않아도 자동으로 저장
-    db.persist()
+    # BM25 역색인도 같이 갱신 (hybrid 검색용). 이번 실행의 변경 여부가 아니라 manifest 에 기록된
+    # 역색인의 버전으로 판단 - 이전 실행이 역색인 전에 죽었어도 다음 실행이 다시 만든다
+    t1 = time.time()
+    lexical_built = (manifest.get("lexical_version") != manifest["index_version"]
+                     or not index_path(collection_name).exists())
+    if lexical_built:
+        with tracing.span("bm25_build", collection=collection_name):
+            build_lexical_index(collection_name, chroma_dir)
+        manifest["lexical_version"] = manifest["index_version"]
+        save_manifest(manifest, collection_name)
+    lexical_s = time.time() - t1
 
     dt = time.time() - t0
+    print("[OK] Chunks:", {"total": counts["chunks"], "new": counts["new"], "unchanged": counts["unchanged"],
+                           "deleted": counts["deleted"]})
+    print("[OK] Chunk params:", {"chunk_size": variant.chunk_size, "overlap": variant.chunk_overlap,
+                                 "splitter": variant.splitter})
+    print("[OK] Embedding model:", EMBEDDING_MODEL, "| batch_size:", batch_size, "| workers:", workers,
+          "| file_workers:", file_workers)
+    print("[OK] Saved Chroma DB to:", chroma_dir, "| collection:", collection_name,
+          "| index_version:", manifest["index_version"])
+    if lexical_built:
+        print(f"[OK] BM25 index: {index_path(collection_name)} ({lexical_s:.2f}s)")
+    if todo and getattr(embeddings, "cache", None) is not None:
+        print("[OK] Embedding cache:", embeddings.cache.stats())
+    print(f"[OK] Throughput: {len(todo) / dt:.2f} files/s | {counts['pages'] / dt:.1f} pages/s | "
+          f"{counts['new'] / dt:.1f} chunks/s | {counts['tokens'] / dt:.0f} tokens/s")
+    print(f"[OK] Elapsed: {dt:.2f}s")
+    if failed:
+        print(f"[FAIL] {len(failed)} file(s) not indexed (retried on the next run): {', '.join(failed)}")
+    return counts
 
 
-    print("[OK] PDF:", pdf_path)
-    print("[OK] Pages loaded:", len(docs))
-    print("[OK] Chunks created:", len(chunks))
-    print("[OK] Chunk params:", {"chunk_size": CHUNK_SIZE, "overlap": CHUNK_OVERLAP})
-    print("[OK] Embedding model:", EMBEDDING_MODEL)
-    print("[OK] Saved Chroma DB to:", CHROMA_DIR)
-    print(f"[OK] Elapsed: {dt:.2f}s")
+def ingest_pdf(pdf_path: Path, batch_size: int = DEFAULT_BATCH_SIZE, workers: int = DEFAULT_WORKERS,
+               force: bool = False, collection_name: str = COLLECTION_NAME) -> dict:
+    """Index a single PDF (doc_id = file name)."""
+    return ingest_files([(pdf_path.name, pdf_path)], collection_name, batch_size, workers, 1, force)
+
+
+def ingest_variants(names: Sequence[str], files, variant_workers: int, **kwargs) -> Dict[str, dict]:
+    """Build several index variants in parallel processes (one variant per process).
+
+    variant 마다 Chroma 디렉토리가 달라서 동시에 써도 되고, 임베딩 캐시는 같은 SQLite 파일을 공유한다.
+    프로세스 안에서는 파일 파싱을 다시 프로세스로 나누지 않음 (file_workers=1).
+    """
+    kwargs = {**kwargs, "file_workers": 1}
+    results = {}
+    if variant_workers <= 1 or len(names) <= 1:
+        for name in names:
+            results[name] = ingest_files(files, name, **kwargs)
+        return results
+    with ProcessPoolExecutor(max_workers=variant_workers) as procs:
+        futures = {procs.submit(ingest_files, files, name, **kwargs): name for name in names}
+        for fut in as_completed(futures):
+            results[futures[fut]] = fut.result()
+    return results
+
 
 def main():
     # 터미널에서 사용자가 입력하는 옵션을 해석하는 툴
     ap = argparse.ArgumentParser()
-    # --pdf 를 파일경로의 라벨로 사용할 것이고, required=True이기 때문에 사용하지 않으면 에러 표시, 
+    # --pdf 를 파일경로의 라벨로 사용 (여러 번 지정 가능), 없으면 --dir (기본 data/docs) 아래 PDF 전체
     # 그리고 개발 협업을 위해 help를 입력하면 이것에 대한 설명을 볼 수 있게 함
-    ap.add_argument("--pdf", required=True, help="Path to a PDF file")
+    ap.add_argument("--pdf", action="append", help="Path to a PDF file (repeatable)")
+    ap.add_argument("--dir", help=f"Index every PDF under a directory (default without --pdf: {DOCS_DIR})")
+    ap.add_argument("--collection", default=COLLECTION_NAME, help="Chroma collection to index into")
+    ap.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Chunks per embedding request")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel embedding requests")
+    ap.add_argument("--file-workers", type=int, default=DEFAULT_FILE_WORKERS,
+                    help="Processes parsing/chunking PDFs in parallel (one file each)")
+    ap.add_argument("--force", action="store_true", help="Re-embed every chunk even if the file is unchanged")
+    ap.add_argument("--prune", action="store_true", help="With --dir: delete documents no longer in the directory")
+    # 청크 설정이 다른 인덱스 variant (experiments/index_variants.json) 를 여러 개 나란히 빌드
+    ap.add_argument("--variant", action="append", help="Build this index variant (repeatable, see src.index_variants)")
+    ap.add_argument("--all-variants", action="store_true", help="Build every registered index variant")
+    ap.add_argument("--variant-workers", type=int, default=DEFAULT_FILE_WORKERS,
+                    help="Variants built in parallel processes")
+    ap.add_argument("--questions", default="experiments/test_questions.json",
+                    help="Questions for the per-variant latency report")
     # 실제 입력값 추출
     args = ap.parse_args()
     # 입력값을 파이썬 객체로 변환
-    pdf_path = Path(args.pdf)
-    if not pdf_path.exists():
-        raise FileNotFoundError(f"PDF not found {pdf_path}")
-    
+    if args.pdf:
+        files = []
+        for pdf in args.pdf:
+            pdf_path = Path(pdf)
+            if not pdf_path.exists():
+                raise FileNotFoundError(f"PDF not found {pdf_path}")
+            files.append((pdf_path.name, pdf_path))
+    else:
+        root = Path(args.dir) if args.dir else DOCS_DIR
+        if not root.is_dir():
+            raise FileNotFoundError(f"Directory not found {root}")
+        files = find_pdfs(root)
+        if not files and not args.prune:
+            raise FileNotFoundError(f"No PDFs under {root}")
+
     # 변환 함수 실행
-    ingest_pdf(pdf_path)
+    prune = args.prune and not args.pdf
+    names = list(load_variants()) if args.all_variants else args.variant
+    if names:
+        unknown = set(names) - set(load_variants())
+        if unknown:
+            raise KeyError(f"Unknown index variant(s) {sorted(unknown)} (registered: {', '.join(load_variants())})")
+        t0 = time.time()
+        ingest_variants(names, files, args.variant_workers, batch_size=args.batch_size, workers=args.workers,
+                        force=args.force, prune=prune)
+        print(f"\n[OK] Built {len(names)} variants in {time.time() - t0:.2f}s (variant_workers={args.variant_workers})")
+        report(names, Path(args.questions))
+        return
+    counts = ingest_files(files, args.collection, batch_size=args.batch_size, workers=args.workers,
+                          file_workers=args.file_workers, force=args.force, prune=prune)
+    # 일부 파일이 실패했으면 나머지는 인덱싱하되 종료 코드로 알림
+    if counts["failed"]:
+        raise SystemExit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,292 @@
+"""BM25 lexical index over a Chroma collection (for hybrid retrieval).
+
+함수 이름, 데이터셋 이름처럼 정확한 단어가 중요한 질문은 dense 검색이 놓치는 경우가 있어서
+ingest 때 역색인(inverted index)을 함께 만든다.
+
+저장 형식 (lexical_index/<collection>.npz, CSR 형태):
+- terms:   단어 목록 (정렬)
+- indptr:  단어 i 의 posting 은 [indptr[i], indptr[i+1])
+- doc_idx: posting 의 문서 번호 (int32)
+- weights: BM25 가중치 (float32) - k1, b, idf 까지 미리 계산해 두어서 질의 시에는 더하기만 한다
+- ids:     문서 번호 -> Chroma chunk id
+- doc_names / doc_ptr: 문서 번호는 doc_id 순서라서 doc_names[j] 의 청크는 [doc_ptr[j], doc_ptr[j+1])
+  posting 안의 문서 번호도 정렬되어 있으므로 doc_id 필터는 posting 마다 이진 탐색으로 그 구간만 읽는다
+
+    python -m src.lexical --build
+    python -m src.lexical --query "cross_val_score"
+"""
+import argparse
+import math
+import re
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import CHROMA_DIR, COLLECTION_NAME, LEXICAL_INDEX_DIR
+from src.manifest import index_version
+from src.retrievers import doc_ranges, filter_doc_ids, ids_by_doc
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 식별자(train_test_split, Auto.csv 등)가 쪼개지지 않도록 _ 와 . 도 단어에 포함
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9_.]*[a-z0-9]|[a-z0-9]")
+STOPWORDS = set(
+    "a an and are as at be by can do does for from how in is it of on or that the this to was what when "
+    "where which who why with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def index_path(collection_name: str = COLLECTION_NAME, index_dir: Path = LEXICAL_INDEX_DIR) -> Path:
+    return Path(index_dir) / f"{collection_name}.npz"
+
+
+def build_lexical_index(collection_name: str = COLLECTION_NAME, persist_directory=CHROMA_DIR,
+                        index_dir: Path = LEXICAL_INDEX_DIR, page_size: int = 5000) -> Path:
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=str(persist_directory)).get_collection(collection_name)
+    # 문서 번호를 doc_id 순서로 매김 -> 문서마다 연속 구간, posting 도 문서 번호 순
+    sorted_ids, doc_ids = ids_by_doc(collection, page_size)
+    n = len(sorted_ids)
+    ids: List[str] = []
+    doc_len: List[int] = []
+    postings: Dict[str, List[tuple]] = {}
+    for offset in range(0, n, page_size):
+        batch = sorted_ids[offset:offset + page_size]
+        part = collection.get(ids=batch, include=["documents"])
+        texts = dict(zip(part["ids"], part["documents"]))
+        for cid in batch:
+            tf = Counter(tokenize(texts[cid]))
+            d = len(ids)
+            ids.append(cid)
+            doc_len.append(sum(tf.values()))
+            for term, count in tf.items():
+                postings.setdefault(term, []).append((d, count))
+
+    avg_len = (sum(doc_len) / len(doc_len)) if doc_len else 1.0
+    lens = np.asarray(doc_len, dtype=np.float32)
+    terms = sorted(postings)
+    indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    doc_idx, weights = [], []
+    for i, term in enumerate(terms):
+        plist = postings[term]
+        idf = math.log(1 + (len(ids) - len(plist) + 0.5) / (len(plist) + 0.5))
+        d = np.fromiter((p[0] for p in plist), dtype=np.int32, count=len(plist))
+        tf = np.fromiter((p[1] for p in plist), dtype=np.float32, count=len(plist))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lens[d] / avg_len)
+        doc_idx.append(d)
+        weights.append((idf * tf * (BM25_K1 + 1) / (tf + norm)).astype(np.float32))
+        indptr[i + 1] = indptr[i] + len(plist)
+
+    ranges = doc_ranges(doc_ids)
+    path = index_path(collection_name, index_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.stem + ".tmp.npz")
+    np.savez(
+        tmp,
+        terms=np.asarray(terms, dtype=str),
+        indptr=indptr,
+        doc_idx=np.concatenate(doc_idx) if doc_idx else np.zeros(0, np.int32),
+        weights=np.concatenate(weights) if weights else np.zeros(0, np.float32),
+        ids=np.asarray(ids, dtype=str),
+        doc_names=np.asarray(list(ranges), dtype=str),
+        doc_ptr=np.asarray([lo for lo, _ in ranges.values()] + [n], dtype=np.int64),
+        index_version=np.asarray(index_version(collection_name)),
+    )
+    tmp.replace(path)
+    return path
+
+
+class LexicalRetriever:
+    """BM25 top-k; documents are fetched from Chroma by id."""
+
+    name = "bm25"
+
+    def __init__(self, db, collection_name: str = COLLECTION_NAME, persist_directory=CHROMA_DIR,
+                 index_dir: Path = LEXICAL_INDEX_DIR):
+        self.db = db
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.index_dir = index_dir
+        self.lock = threading.Lock()
+        self.version = None
+        self._load()
+
+    def _load(self) -> None:
+        current = index_version(self.collection_name)
+        path = index_path(self.collection_name, self.index_dir)
+        # 없거나, 컬렉션이 바뀌었거나, doc_id 구간이 없는 예전 형식이면 다시 만듦
+        stale = not path.exists()
+        if not stale:
+            with np.load(path) as data:
+                stale = int(data["index_version"]) != current or "doc_ptr" not in data.files
+        if stale:
+            build_lexical_index(self.collection_name, self.persist_directory, self.index_dir)
+        data = np.load(path)
+        self.term_ids = {t: i for i, t in enumerate(data["terms"].tolist())}
+        self.indptr = data["indptr"]
+        self.doc_idx = data["doc_idx"]
+        self.weights = data["weights"]
+        self.ids = data["ids"].tolist()
+        doc_ptr = data["doc_ptr"]
+        self.doc_ranges = {d: (int(doc_ptr[j]), int(doc_ptr[j + 1])) for j, d in enumerate(data["doc_names"].tolist())}
+        self._row_of = None
+        self.version = current
+
+    def _refresh(self) -> None:
+        if index_version(self.collection_name) != self.version:
+            with self.lock:
+                if index_version(self.collection_name) != self.version:
+                    self._load()
+
+    def scores(self, question: str) -> np.ndarray:
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term, qtf in Counter(tokenize(question)).items():
+            i = self.term_ids.get(term)
+            if i is None:
+                continue
+            s, e = self.indptr[i], self.indptr[i + 1]
+            # 한 단어의 posting 안에서는 문서 번호가 겹치지 않으므로 fancy-index += 가 안전
+            scores[self.doc_idx[s:e]] += qtf * self.weights[s:e]
+        return scores
+
+    def scores_in(self, question: str, ranges) -> np.ndarray:
+        """Scores for rows inside [lo, hi) ranges only (concatenated in range order)."""
+        offsets = np.cumsum([0] + [hi - lo for lo, hi in ranges])
+        scores = np.zeros(int(offsets[-1]), dtype=np.float32)
+        for term, qtf in Counter(tokenize(question)).items():
+            i = self.term_ids.get(term)
+            if i is None:
+                continue
+            s, e = self.indptr[i], self.indptr[i + 1]
+            postings = self.doc_idx[s:e]
+            for (lo, hi), off in zip(ranges, offsets):
+                # posting 은 문서 번호 순 -> 이 문서 구간에 해당하는 부분만 이진 탐색으로 잘라냄
+                a, b = s + np.searchsorted(postings, lo), s + np.searchsorted(postings, hi)
+                scores[off + self.doc_idx[a:b] - lo] += qtf * self.weights[a:b]
+        return scores
+
+    def _rows(self, where: dict) -> np.ndarray:
+        """Rows matching a general metadata filter - Chroma resolves it to chunk ids."""
+        if self._row_of is None:
+            self._row_of = {cid: i for i, cid in enumerate(self.ids)}
+        hits = self.db.get(where=where, include=[])["ids"]
+        return np.asarray(sorted(self._row_of[c] for c in hits if c in self._row_of), dtype=np.int64)
+
+    def top_ids(self, question: str, k: int, where: Optional[dict] = None) -> List[str]:
+        self._refresh()
+        if not self.ids or k <= 0:
+            return []
+        docs = filter_doc_ids(where)
+        if where is None:
+            rows, scores = None, self.scores(question)
+        elif docs is not None:
+            ranges = [self.doc_ranges[d] for d in docs if d in self.doc_ranges]
+            rows = np.concatenate([np.arange(lo, hi) for lo, hi in ranges]) if ranges else np.zeros(0, np.int64)
+            scores = self.scores_in(question, ranges)
+        else:
+            # doc_id 외의 조건 (예: 사용자 메타데이터 태그)
+            rows = self._rows(where)
+            scores = self.scores(question)[rows]
+        if not len(scores):
+            return []
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.ids[i if rows is None else rows[i]] for i in top if scores[i] > 0]
+
+    def fetch(self, ids: List[str]) -> List[Document]:
+        if not ids:
+            return []
+        by_id = {d.id: d for d in self.db.get_by_ids(ids)}
+        return [by_id[i] for i in ids if i in by_id]
+
+    def search(self, question: str, q_vec, k: int, where: Optional[dict] = None) -> List[Document]:
+        return self.fetch(self.top_ids(question, k, where))
+
+    def search_batch(self, questions, q_vecs, k: int, where: Optional[dict] = None) -> List[List[Document]]:
+        return [self.search(q, v, k, where) for q, v in zip(questions, q_vecs)]
+
+    def prefix_exact(self, k: int) -> bool:
+        # BM25 점수 순 top-k
+        return True
+
+
+class HybridRetriever:
+    """Reciprocal rank fusion of a dense retriever and BM25.
+
+    score(d) = sum over retrievers of 1 / (rrf_k + rank). 두 검색기의 점수 척도가 달라도 순위만 쓰므로 바로 합칠 수 있다.
+    """
+
+    name = "hybrid"
+
+    def __init__(self, dense, lexical: LexicalRetriever, rrf_k: int = 60, pool: int = 4):
+        self.dense = dense
+        self.lexical = lexical
+        self.rrf_k = rrf_k
+        # 각 검색기에서 k * pool 개 후보를 가져와서 융합
+        self.pool = pool
+
+    def search(self, question: str, q_vec, k: int, where: Optional[dict] = None) -> List[Document]:
+        n = k * self.pool
+        dense_docs = self.dense.search(question, q_vec, n, where)
+        lex_ids = self.lexical.top_ids(question, n, where)
+
+        fused: Dict[str, float] = {}
+        for rank, d in enumerate(dense_docs):
+            fused[d.id] = fused.get(d.id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, cid in enumerate(lex_ids):
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:k]
+
+        known = {d.id: d for d in dense_docs}
+        missing = [cid for cid in best if cid not in known]
+        known.update({d.id: d for d in self.lexical.fetch(missing)})
+        return [known[cid] for cid in best if cid in known]
+
+    def search_batch(self, questions, q_vecs, k: int, where: Optional[dict] = None) -> List[List[Document]]:
+        return [self.search(q, v, k, where) for q, v in zip(questions, q_vecs)]
+
+    def prefix_exact(self, k: int) -> bool:
+        # 후보 수가 k * pool 이라 k 가 크면 융합 결과의 순서도 달라질 수 있음
+        return False
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--build", action="store_true", help="(Re)build the BM25 index from Chroma")
+    ap.add_argument("--query", help="Print the top BM25 chunk ids for a query")
+    ap.add_argument("--collection", default=COLLECTION_NAME)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+    from src.index_variants import persist_dir
+
+    if args.build:
+        t0 = time.perf_counter()
+        path = build_lexical_index(args.collection, persist_dir(args.collection))
+        print(f"[OK] BM25 index written to: {path} ({path.stat().st_size / 1024:.0f} KB, "
+              f"{time.perf_counter() - t0:.2f}s)")
+    if args.query:
+        from langchain_chroma import Chroma
+
+        db = Chroma(persist_directory=str(persist_dir(args.collection)), collection_name=args.collection)
+        lex = LexicalRetriever(db, args.collection, persist_dir(args.collection))
+        t0 = time.perf_counter()
+        ids = lex.top_ids(args.query, args.k)
+        print(f"[OK] {len(ids)} hits in {(time.perf_counter() - t0) * 1000:.2f} ms")
+        for cid in ids:
+            print(cid)
+
+
+if __name__ == "__main__":
+    main()
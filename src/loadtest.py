@@ -0,0 +1,388 @@
+"""Load test: answer / stream_answer at a target concurrency or QPS, with latency histograms and memory use.
+
+fake(프로세스 안) 또는 stub(src.stub_server - 실제 OpenAI 클라이언트 + 로컬 HTTP) 백엔드로
+API 변동 없이 같은 조건을 반복 측정한다. 지연시간 분포는 FAKE_EMBED_LATENCY_MS / FAKE_LLM_LATENCY_MS /
+FAKE_LATENCY_DIST / FAKE_LATENCY_SIGMA / FAKE_SEED 로 정한다 (--start-stub 으로 띄운 stub 서버도 같은 설정).
+
+- --qps 가 없으면 closed loop: --concurrency 개 요청을 동시에, 끝나는 대로 다음 요청 (최대 처리량)
+- --qps 가 있으면 open loop: poisson 도착 시각에 요청 시작 (동시 요청은 --concurrency 까지).
+  latency 는 예정 시각부터 재므로 밀린 대기 시간도 포함된다 (coordinated omission 방지). service_ms 는 실행 시간만
+- answer 모드는 answer_question 이 부르는 RagEngine.answer, stream 모드는 UI 의 stream_answer (ttft 도 기록)
+- 단계별 시간(embed / retrieve / generate)의 p50, 수준별 RSS(시작 / 최대 / 끝)
+
+기본은 임시 디렉토리의 합성 컬렉션(--docs 개 청크, fake/stub 임베딩)이고 --collection 으로 ingest 된 인덱스를 쓸 수 있다.
+결과는 experiments/bench/loadtest_<시각>.json 에 저장되고 --compare 로 이전 결과와 비교한다 (회귀면 exit 1).
+
+    python -m src.loadtest --backend fake --concurrency 1,4,16 --requests 200
+    FAKE_LLM_LATENCY_MS=800 FAKE_LATENCY_DIST=lognormal python -m src.loadtest --backend stub --start-stub \\
+        --mode stream --qps 2,5,10 --duration 30
+    python -m src.loadtest --concurrency 8 --compare experiments/bench/loadtest_20261018-120000.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from src.bench_engine import BENCH_COLLECTION, seed_collection
+from src.config import (
+    FAKE_EMBED_LATENCY_MS,
+    FAKE_LATENCY_DIST,
+    FAKE_LATENCY_SIGMA,
+    FAKE_LLM_LATENCY_MS,
+    FAKE_SEED,
+    PROJECT_ROOT,
+    RAG_BACKEND,
+    RETRIEVER_BACKEND,
+    STUB_BASE_URL,
+)
+
+BENCH_DIR = PROJECT_ROOT / "experiments" / "bench"
+# 히스토그램 구간 하한(ms) - 마지막 구간은 위로 열려 있음
+HIST_EDGES_MS = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+STAGES = ("embed_ms", "retrieve_ms", "generate_ms")
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc; peak RSS from getrusage elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 는 bytes, Linux 는 KB
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class MemorySampler:
+    """Samples RSS every interval_s in a background thread; start / peak / end in MB."""
+
+    def __init__(self, interval_s: float = 0.05):
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.peak = max(self.peak, rss_mb())
+
+    def __enter__(self):
+        self.start = self.peak = rss_mb()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.end = rss_mb()
+        self.peak = max(self.peak, self.end)
+        return False
+
+    def row(self) -> dict:
+        return {"start": round(self.start, 1), "peak": round(self.peak, 1), "end": round(self.end, 1)}
+
+
+def percentiles(xs) -> dict:
+    if not xs:
+        return {}
+    a = np.asarray(xs, dtype=np.float64)
+    p50, p90, p95, p99 = np.percentile(a, [50, 90, 95, 99])
+    return {"mean": round(a.mean(), 2), "p50": round(p50, 2), "p90": round(p90, 2), "p95": round(p95, 2),
+            "p99": round(p99, 2), "max": round(a.max(), 2)}
+
+
+def histogram(xs) -> dict:
+    counts, _ = np.histogram(xs, bins=HIST_EDGES_MS + [np.inf])
+    return {"edges_ms": HIST_EDGES_MS, "counts": counts.tolist()}
+
+
+def print_histogram(label: str, hist: dict, width: int = 40) -> None:
+    edges, counts = hist["edges_ms"], hist["counts"]
+    used = [i for i, c in enumerate(counts) if c]
+    if not used:
+        return
+    print(label)
+    top = max(counts)
+    for i in range(used[0], used[-1] + 1):
+        hi = f"{edges[i + 1]}" if i + 1 < len(edges) else "inf"
+        bar = "#" * round(counts[i] / top * width)
+        print(f"  {edges[i]:>6}-{hi:<6} ms | {bar} {counts[i]}")
+
+
+def make_request(engine, mode: str, top_k: int, retriever: Optional[str], use_cache: bool) -> Callable:
+    """question -> RagResult through the same engine call the CLI (answer) or the UI (stream) makes."""
+    def run(question: str):
+        if mode == "stream":
+            stream = engine.stream_answer(question, top_k=top_k, use_cache=use_cache, retriever=retriever)
+            for _ in stream:
+                pass
+            return stream.result
+        return engine.answer(question, top_k=top_k, use_cache=use_cache, retriever=retriever)
+    return run
+
+
+def run_level(run: Callable, questions: List[str], concurrency: int, qps: float, requests: int,
+              duration: float, seed: int = 0) -> dict:
+    """Drive run(question) closed-loop (qps=0) or open-loop at qps; stops after `requests` or `duration` s."""
+    latencies, service, ttft, stages, errors = [], [], [], {}, Counter()
+    lock = threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + duration if duration else None
+
+    def more(i: int, now: float) -> bool:
+        return now < deadline if deadline else i < requests
+
+    def one(i: int, scheduled: float) -> None:
+        start = time.perf_counter()
+        try:
+            result = run(questions[i % len(questions)])
+        except Exception as exc:
+            with lock:
+                errors[type(exc).__name__] += 1
+            return
+        end = time.perf_counter()
+        wait_ms = (start - scheduled) * 1000
+        with lock:
+            latencies.append((end - scheduled) * 1000)
+            service.append((end - start) * 1000)
+            if "ttft_ms" in result.timings:
+                ttft.append(result.timings["ttft_ms"] + wait_ms)
+            for s in STAGES:
+                if s in result.timings:
+                    stages.setdefault(s, []).append(result.timings[s])
+
+    if not qps:
+        counter = itertools.count()
+
+        def worker() -> None:
+            while True:
+                i, now = next(counter), time.perf_counter()
+                if not more(i, now):
+                    return
+                one(i, now)
+
+        threads = [threading.Thread(target=worker, name=f"load-{n}") for n in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    else:
+        # 도착 시각은 seed 고정 poisson - 실행마다 같은 부하 패턴
+        rng = random.Random(seed)
+        scheduled = t0
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="load") as pool:
+            for i in itertools.count():
+                if not more(i, scheduled):
+                    break
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(one, i, scheduled)
+                scheduled += rng.expovariate(qps)
+    wall = time.perf_counter() - t0
+
+    row = {
+        "concurrency": concurrency,
+        "qps_target": qps or None,
+        "requests": len(latencies) + sum(errors.values()),
+        "errors": sum(errors.values()),
+        "error_types": dict(errors),
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "latency_ms": percentiles(latencies),
+        "histogram": histogram(latencies),
+    }
+    if qps:
+        row["service_ms"] = percentiles(service)
+    if ttft:
+        row["ttft_ms"] = percentiles(ttft)
+    row["stages_p50_ms"] = {s: round(float(np.median(v)), 2) for s, v in stages.items()}
+    return row
+
+
+def start_stub() -> subprocess.Popen:
+    """Run src.stub_server in its own process (so it doesn't share the GIL with the load generator)."""
+    url = urllib.parse.urlparse(STUB_BASE_URL)
+    proc = subprocess.Popen([sys.executable, "-m", "src.stub_server", "--port", str(url.port or 80)],
+                            cwd=PROJECT_ROOT)
+    for _ in range(100):
+        if stub_alive():
+            return proc
+        if proc.poll() is not None:
+            raise RuntimeError(f"stub server exited with code {proc.returncode}")
+        time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"stub server did not answer on {STUB_BASE_URL}")
+
+
+def stub_alive() -> bool:
+    try:
+        with urllib.request.urlopen(STUB_BASE_URL.rstrip("/") + "/health", timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+def git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def level_key(row: dict) -> tuple:
+    return row["mode"], row["concurrency"], row["qps_target"]
+
+
+def compare(base: dict, config: dict, rows: List[dict], tolerance: float) -> int:
+    """Print p50 / p99 / throughput deltas against a previous result file; returns the number of regressions."""
+    changed = {k: f"{base['config'].get(k)} -> {v}" for k, v in config.items() if base["config"].get(k) != v}
+    if changed:
+        print("[WARN] config differs from the baseline:", changed)
+    old = {level_key(r): r for r in base["levels"]}
+    regressions = 0
+    print(f"=== vs {base.get('created')} (git {base.get('git_rev')}) | tolerance {tolerance:.0%} ===")
+    for r in rows:
+        b = old.get(level_key(r))
+        if b is None:
+            continue
+        cells = []
+        for metric, new, prev, higher_is_worse in (
+            ("p50", r["latency_ms"].get("p50"), b["latency_ms"].get("p50"), True),
+            ("p99", r["latency_ms"].get("p99"), b["latency_ms"].get("p99"), True),
+            ("rps", r["throughput_rps"], b["throughput_rps"], False),
+        ):
+            if not prev or new is None:
+                continue
+            delta = (new - prev) / prev
+            bad = delta > tolerance if higher_is_worse else delta < -tolerance
+            regressions += bad
+            cells.append(f"{metric} {prev} -> {new} ({delta:+.0%}){' REGRESSION' if bad else ''}")
+        print(f"{r['mode']} c={r['concurrency']} qps={r['qps_target']}: " + " | ".join(cells))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", default=RAG_BACKEND, choices=("fake", "stub", "openai"))
+    ap.add_argument("--start-stub", action="store_true", help="Launch src.stub_server for --backend stub")
+    ap.add_argument("--mode", default="answer", choices=("answer", "stream"))
+    ap.add_argument("--concurrency", help="Comma list; in-flight requests (cap for --qps). Default 1,4,16 / 64")
+    ap.add_argument("--qps", default="", help="Comma list of target arrival rates (open loop); empty = closed loop")
+    ap.add_argument("--requests", type=int, default=100, help="Requests per level")
+    ap.add_argument("--duration", type=float, default=0, help="Seconds per level instead of --requests")
+    ap.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before the first level")
+    ap.add_argument("--collection", help="Ingested collection to query (default: a temporary synthetic one)")
+    ap.add_argument("--docs", type=int, default=2000, help="Chunks in the synthetic collection")
+    ap.add_argument("--questions", default="experiments/test_questions.json")
+    ap.add_argument("--top_k", type=int, default=4)
+    ap.add_argument("--retriever", default=RETRIEVER_BACKEND)
+    ap.add_argument("--embed-cache", action="store_true", help="Keep the embedding cache on (off by default)")
+    ap.add_argument("--answer-cache", action="store_true", help="Keep the answer cache on (off by default)")
+    ap.add_argument("--retrieval-cache", action="store_true", help="Keep the retrieval cache on (off by default)")
+    ap.add_argument("--out", help=f"Result JSON (default: {BENCH_DIR.relative_to(PROJECT_ROOT)}/loadtest_<time>.json)")
+    ap.add_argument("--compare", metavar="PATH", help="Previous result JSON to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative slowdown before flagging")
+    args = ap.parse_args()
+
+    from src.engine import RagEngine
+    from src.index_variants import persist_dir
+
+    qps_levels = [float(q) for q in args.qps.split(",") if q]
+    conc_levels = [int(c) for c in (args.concurrency or ("64" if qps_levels else "1,4,16")).split(",")]
+    if args.backend == "openai" and not args.collection:
+        raise SystemExit("--backend openai needs --collection (the synthetic collection uses fake embeddings)")
+
+    questions = json.loads(Path(args.questions).read_text(encoding="utf-8"))
+    questions = [q["question"] if isinstance(q, dict) else q for q in questions]
+
+    stub = None
+    if args.backend == "stub":
+        if args.start_stub:
+            stub = start_stub()
+        elif not stub_alive():
+            raise SystemExit(f"no stub server on {STUB_BASE_URL} (run python -m src.stub_server or add --start-stub)")
+
+    config = {
+        "backend": args.backend, "collection": args.collection or f"synthetic:{args.docs}", "top_k": args.top_k,
+        "retriever": args.retriever, "embed_cache": args.embed_cache, "answer_cache": args.answer_cache,
+        "retrieval_cache": args.retrieval_cache,
+        "fake_embed_ms": FAKE_EMBED_LATENCY_MS, "fake_llm_ms": FAKE_LLM_LATENCY_MS, "latency_dist": FAKE_LATENCY_DIST,
+        "latency_sigma": FAKE_LATENCY_SIGMA, "seed": FAKE_SEED, "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+    }
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            if args.collection:
+                persist, collection = persist_dir(args.collection), args.collection
+            else:
+                persist, collection = Path(tmp), BENCH_COLLECTION
+                seed_collection(persist, args.docs)
+            engine = RagEngine(backend=args.backend, persist_directory=persist, collection_name=collection,
+                               embed_cache=args.embed_cache, answer_cache=args.answer_cache,
+                               retrieval_cache=args.retrieval_cache,
+                               retriever=args.retriever)
+            run = make_request(engine, args.mode, args.top_k, args.retriever,
+                               args.answer_cache or args.retrieval_cache)
+            # 클라이언트 연결, 인덱스 로딩 같은 첫 요청 비용은 측정에서 뺌
+            for q in questions[:args.warmup]:
+                run(q)
+            print(f"=== backend={args.backend} | mode={args.mode} | {config['collection']} | "
+                  f"retriever={args.retriever} | top_k={args.top_k} ===")
+
+            for conc, qps in itertools.product(conc_levels, qps_levels or [0]):
+                with MemorySampler() as mem:
+                    row = run_level(run, questions, conc, qps, args.requests, args.duration, FAKE_SEED)
+                rows.append({"mode": args.mode, **row, "rss_mb": mem.row()})
+                lat = row["latency_ms"]
+                print(f"c={conc:<3} qps={qps or '-':<5} n={row['requests']:<5} err={row['errors']:<3} "
+                      f"rps={row['throughput_rps']:<7} p50={lat.get('p50')} p95={lat.get('p95')} "
+                      f"p99={lat.get('p99')} max={lat.get('max')}"
+                      + (f" ttft_p50={row['ttft_ms']['p50']}" if "ttft_ms" in row else "")
+                      + f" | rss peak={mem.peak:.0f} MB | stages p50 {row['stages_p50_ms']}")
+            if engine.retrieval_cache is not None:
+                print("[OK] Retrieval cache:", engine.retrieval_cache.stats())
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+
+    for r in rows:
+        print_histogram(f"--- latency histogram c={r['concurrency']} qps={r['qps_target'] or '-'} ---", r["histogram"])
+
+    out = Path(args.out) if args.out else BENCH_DIR / f"loadtest_{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    result = {"created": datetime.now().isoformat(timespec="seconds"), "git_rev": git_rev(),
+              "argv": sys.argv[1:], "config": config, "levels": rows}
+    out.write_text(json.dumps(result, indent=1), encoding="utf-8")
+    print("[OK] wrote", out)
+
+    if args.compare:
+        base = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(base, config, rows, args.tolerance)
+        if regressions:
+            print(f"[FAIL] {regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
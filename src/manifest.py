@@ -0,0 +1,67 @@
+"""Manifest of indexed content per Chroma collection.
+
+파일별 sha256 과 청크 설정을 기록해서 변경되지 않은 파일은 다시 인덱싱하지 않는다.
+index_version 은 컬렉션 내용이 바뀔 때마다 1씩 증가 - 캐시 무효화 기준으로 사용한다.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from src.config import COLLECTION_NAME, INGEST_STATE_DIR
+
+
+def manifest_path(collection_name: str = COLLECTION_NAME) -> Path:
+    return INGEST_STATE_DIR / f"{collection_name}.manifest.json"
+
+
+def load_manifest(collection_name: str = COLLECTION_NAME) -> dict:
+    path = manifest_path(collection_name)
+    if not path.exists():
+        return {"index_version": 0, "files": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest: dict, collection_name: str = COLLECTION_NAME) -> None:
+    path = manifest_path(collection_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 중간에 죽어도 파일이 깨지지 않도록 임시파일에 쓰고 교체
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1), encoding="utf-8")
+    tmp.replace(path)
+
+
+_version_cache = {}
+
+
+def index_version(collection_name: str = COLLECTION_NAME) -> int:
+    """Current index_version; the manifest is only re-read when its mtime changes."""
+    path = manifest_path(collection_name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+    cached = _version_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _version_cache[path] = (mtime, int(load_manifest(collection_name).get("index_version", 0)))
+    return cached[1]
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def list_documents(collection_name: str = COLLECTION_NAME) -> list:
+    """Indexed documents of a collection: [{"doc_id", "title", "pages", "chunks", ...}] sorted by doc_id."""
+    files = load_manifest(collection_name)["files"]
+    return [{"doc_id": doc_id, "title": entry.get("title", doc_id), "pages": entry.get("pages"),
+             "chunks": entry.get("chunks"), **entry.get("metadata", {})}
+            for doc_id, entry in sorted(files.items()) if entry.get("complete")]
@@ -1,91 +1,87 @@
-import sqlite3
+import argparse
 from pathlib import Path
 import math
-import matplotlib.pyplot as plt
 
-DB_PATH = Path("experiments") / "events.db"
+from src.analytics import histograms, percentile, vote_stats
+from src.stats import wilson_interval
+
 OUT_PATH = Path("experiments") / "ab_results.png"
 
 #  DB 기준 실험명
 UI_EXPERIMENT = "topk_ab"
 OFFLINE_EXPERIMENT = "topk_ab_offline_k2_k4"
 
-def fetch_rows():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    # Latency는 UI + offline 둘 다 포함(분리 가능)
-    cur.execute(
-        """
-        SELECT experiment, variant, latency_ms, user_vote
-        FROM events
-        WHERE experiment IN (?, ?)
-        """,
-        (UI_EXPERIMENT, OFFLINE_EXPERIMENT),
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+def box_stats(label, values, counts):
+    """Boxplot stats (matplotlib bxp format) from a latency histogram - raw rows are never loaded."""
+    q1, med, q3 = (percentile(values, counts, q) for q in (25, 50, 75))
+    iqr = q3 - q1
+    # 수염: 1.5 IQR 안에 있는 가장 바깥 값
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {"label": label, "med": med, "q1": q1, "q3": q3,
+            "whislo": float(inside.min()), "whishi": float(inside.max()), "fliers": []}
+
 
 def main():
-    rows = fetch_rows()
-
-    # latency: variant별 모든 latency
-    lat = {"A": [], "B": []}
-
-    # votes: UI experiment에서만 집계
-    votes = {"A": {"up": 0, "down": 0}, "B": {"up": 0, "down": 0}}
-
-    for experiment, variant, latency_ms, user_vote in rows:
-        if variant in lat and latency_ms is not None:
-            lat[variant].append(latency_ms)
-
-        if experiment == UI_EXPERIMENT and variant in votes:
-            if user_vote == "up":
-                votes[variant]["up"] += 1
-            elif user_vote == "down":
-                votes[variant]["down"] += 1
-
-    # Up rate 계산
-    up_rate = {}
-    vote_n = {}
-    for v in ["A", "B"]:
-        up = votes[v]["up"]
-        down = votes[v]["down"]
-        total = up + down
-        vote_n[v] = total
-        up_rate[v] = (up / total) if total > 0 else math.nan
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--experiment", action="append",
+                    help="Repeatable (default: UI + offline top_k runs); votes come from whichever ones have them")
+    ap.add_argument("--out", default=str(OUT_PATH))
+    args = ap.parse_args()
+    # matplotlib 은 import 만 수백 ms - 실제로 그릴 때만
+    import matplotlib.pyplot as plt
+
+    experiments = args.experiment or [UI_EXPERIMENT, OFFLINE_EXPERIMENT]
+    out_path = Path(args.out)
+
+    # latency: variant별 히스토그램, 모든 실험 포함 (답변 캐시 hit 는 제외)
+    lat = histograms(experiments)
+
+    # votes: 투표는 UI 실험에만 있음 (offline 은 0건)
+    votes = vote_stats(experiments)
+
+    # arm 개수만큼 (A, B, C, ...) - 데이터에 있는 variant 전부
+    labels = sorted(set(lat) | set(votes))
+
+    # Up rate 계산 + Wilson 95% 신뢰구간
+    up_rate, vote_n, err = [], [], [[], []]
+    for v in labels:
+        up = votes.get(v, {}).get("up", 0)
+        total = up + votes.get(v, {}).get("down", 0)
+        vote_n.append(total)
+        rate = (up / total) if total > 0 else math.nan
+        up_rate.append(rate)
+        lo, hi = wilson_interval(up, total) if total > 0 else (math.nan, math.nan)
+        err[0].append(rate - lo if total > 0 else 0)
+        err[1].append(hi - rate if total > 0 else 0)
 
     # ----- Plot -----
-    # 한 이미지(2개 차트)로 저장하기 위해 figsize 크게
-    fig = plt.figure(figsize=(10, 6))
+    # 한 이미지(2개 차트)로 저장하기 위해 figsize 크게, arm 이 많으면 가로로 늘림
+    fig = plt.figure(figsize=(max(10, 2.5 * len(labels)), 6))
 
     # (1) Vote up rate bar
     ax1 = fig.add_axes([0.08, 0.55, 0.84, 0.38])  # [left, bottom, width, height]
-    labels = ["A", "B"]
-    rates = [up_rate["A"], up_rate["B"]]
-    ax1.bar(labels, rates)
-    ax1.set_ylim(0, 1)
-    ax1.set_title("Thumbs-up rate (UI only)")
+    ax1.bar(labels, up_rate, yerr=err, capsize=6)
+    ax1.set_ylim(0, 1.1)
+    ax1.set_title("Thumbs-up rate (95% Wilson CI)")
     ax1.set_ylabel("Up rate")
 
     # 막대 위에 n 표시
-    for i, v in enumerate(labels):
-        ax1.text(i, rates[i] + 0.02, f"n={vote_n[v]}", ha="center")
+    for i, n in enumerate(vote_n):
+        y = up_rate[i] if not math.isnan(up_rate[i]) else 0
+        ax1.text(i, min(y + 0.02, 1.02), f"n={n}", ha="center")
 
     # (2) Latency boxplot
     ax2 = fig.add_axes([0.08, 0.08, 0.84, 0.38])
-    data = [lat["A"], lat["B"]]
-    ax2.boxplot(data, labels=labels)
-    ax2.set_title(f"Latency (ms) - UI + Offline ({UI_EXPERIMENT} + {OFFLINE_EXPERIMENT})")
+    ax2.bxp([box_stats(v, *lat[v]) for v in labels if v in lat], showfliers=False)
+    ax2.set_title(f"Latency (ms) - {' + '.join(experiments)}")
     ax2.set_ylabel("ms")
 
     # 저장
-    OUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    fig.savefig(OUT_PATH, dpi=200)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(out_path, dpi=200)
     plt.close(fig)
 
-    print(f"[OK] Saved plot to: {OUT_PATH}")
+    print(f"[OK] Saved plot to: {out_path}")
 
 if __name__ == "__main__":
     main()
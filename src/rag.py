@@ -1,10 +1,10 @@
 import argparse
+import json
+import sys
 import time
-from typing import List, Tuple
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
 
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_chroma import Chroma
-from src.config import CHROMA_DIR, EMBEDDING_MODEL, CHAT_MODEL, OPENAI_API_KEY
 
 
 
@@ -20,6 +20,16 @@ USER_TEMPLATE = """Context:
 Question: {question}
 """
 
+# 실험 arm 에서 이름으로 고르는 프롬프트: 이름 -> (system, user template)
+PROMPTS = {
+    "default": (SYSTEM_PROMPT, USER_TEMPLATE),
+    # 짧은 답변 -> 생성 토큰/시간 절감
+    "concise": (
+        SYSTEM_PROMPT + "Answer in at most three sentences.\n",
+        USER_TEMPLATE,
+    ),
+}
+
 
 
 def format_sources(docs) -> List[dict]:
@@ -41,6 +51,7 @@ def format_sources(docs) -> List[dict]:
             {
                 "page": page_display,
                 "source": md.get("source"),
+                "doc_id": md.get("doc_id"),
                 "snippet": snippet,
             }
         )
@@ -66,58 +77,51 @@ def citations_line(docs) -> str:
     """Citations are generated from retrieved docs (not by the model)."""
     pages = []
     for d in docs:
-        page = (d.metadata or {}).get("page")
+        md = d.metadata or {}
+        page = md.get("page")
         if isinstance(page, int):
-            pages.append(page + 1)  # 0-based → 1-based
+            pages.append((md.get("doc_id") or "", page + 1))  # 0-based → 1-based
     pages = sorted(set(pages))
     if not pages:
         return "Citations: (none)"
-    return "Citations: " + ", ".join([f"p.{p}" for p in pages])
+    # 여러 문서에서 나온 경우에만 문서 이름을 붙임 (단일 문서는 기존 형식 그대로)
+    if len({doc for doc, _ in pages}) == 1:
+        return "Citations: " + ", ".join([f"p.{p}" for _, p in pages])
+    return "Citations: " + ", ".join([f"{doc} p.{p}" for doc, p in pages])
 
 
 
 # RAG 프로세스의 본체, 질문을 받아 검색->조립->생성
-# top_k는 가장 관련있는 문서 조각의 수 설정 / 이것을 답변, 출처리스트, 걸린시간 형태로 돌려주겠다는 표시
-def answer_question(question: str, top_k: int =4) -> Tuple[str, List[dict], float]:
-    if not OPENAI_API_KEY:
-        raise RuntimeError("conld not find OPENAI_API_KEY, please set the .env file")
-    
-    t0 = time.time()
-
-    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+# top_k는 가장 관련있는 문서 조각의 수 설정 / 이것을 답변, 인용, 출처리스트, 걸린시간, 페이지 형태로 돌려주겠다는 표시
+# 클라이언트와 컬렉션은 src.engine 의 공유 엔진이 한 번만 만들어서 재사용한다
+# doc_ids 를 주면 그 문서들 안에서만 검색, collection 은 다른 인덱스(컬렉션)
+def answer_question(question: str, top_k: int =4, doc_ids: Optional[List[str]] = None,
+                    collection: Optional[str] = None) -> Tuple[str, str, List[dict], float, str]:
+    from src.engine import get_engine
+    from src.retrievers import doc_filter
 
-    db = Chroma(
-        persist_directory=str(CHROMA_DIR),
-        embedding_function=embeddings,
-        collection_name="docs",
-    )
+    return get_engine(collection).answer(question, top_k=top_k, where=doc_filter(doc_ids)).as_tuple()
 
-    # DB를 검색기 모드로 변경
-    retriever = db.as_retriever(search_kwargs={"k":top_k})
-    # 짊문과 좌표가 가장 가까운 4조각 가져옴
-    docs = retriever.invoke(question)
 
+# 여러 질문을 한 번에: 질문 임베딩은 배치 한 번, 검색도 배치로, 답변 생성은 동시에 (RagEngine.answer_batch)
+# 결과는 질문 순서대로 RagResult 리스트 (실패한 질문은 None). 아주 큰 입력은 --questions-file 처럼
+# engine.answer_batch 에 on_result 를 넘겨서 끝나는 대로 처리해야 메모리가 일정하다
+def answer_questions(batch: List[str], top_k: int = 4, doc_ids: Optional[List[str]] = None,
+                     collection: Optional[str] = None, concurrency: int = 8, batch_size: int = 64) -> list:
+    from src.engine import get_engine
+    from src.retrievers import doc_filter
 
-    # 참고서 만들기(Augmentation)
-    context = build_context(docs)
+    results = [None] * len(batch)
 
-    # 질의, temperature는 ai가 헛소리 못하게 창의성을 0으로 만듬
-    llm = ChatOpenAI(model=CHAT_MODEL, temperature=0)
+    def on_result(i, question, result):
+        if isinstance(result, Exception):
+            print(f"[FAIL] {question[:60]!r}: {type(result).__name__}: {result}")
+        else:
+            results[i] = result
 
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": USER_TEMPLATE.format(context=context, question=question)},
-    ]
-
-    # invoke는 입력을 넣고 결과가 나올 때까지 기다리는 동기식 호출 
-    # .stream() 은 답변을 GPT처럼 한글짜씩 실시간으로 받아온다
-    resp = llm.invoke(messages)
-    answer = resp.content.strip()
-
-    citations = citations_line(docs)
-    dt = time.time() - t0
-    source_pages = source_pages_csv(docs)
-    return answer, citations, format_sources(docs), dt, source_pages
+    get_engine(collection).answer_batch(enumerate(batch), on_result, top_k=top_k, where=doc_filter(doc_ids),
+                                        batch_size=batch_size, concurrency=concurrency)
+    return results
 
 # 문서들이 몇 페이지에서 왔는지 찾아내어 문자열로 변환
 def source_pages_csv(docs) -> str:
@@ -132,25 +136,119 @@ def source_pages_csv(docs) -> str:
     return ",".join(str(p) for p in pages)
 
 
+def read_questions(path: Path, skip: set) -> Iterator[Tuple[int, dict]]:
+    """(line number, row) per JSONL line; a line is {"question": ..., ...} or just a JSON string."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or n in skip:
+                continue
+            row = json.loads(line)
+            yield n, row if isinstance(row, dict) else {"question": row}
+
+
+def answer_file(path: Path, out: Path, top_k: int = 4, doc_ids: Optional[List[str]] = None,
+                collection: Optional[str] = None, concurrency: int = 8, batch_size: int = 64, qps: float = 0,
+                resume: bool = False) -> int:
+    """Answer every question of a JSONL file, appending one JSON line per answer to `out` as each finishes.
+
+    출력 줄에는 입력 줄 번호(line)와 입력 행의 다른 필드(id 등)가 그대로 붙는다 (완료 순서라 line 으로 맞춤).
+    resume=True 면 out 에 이미 있는 line 은 건너뛰고 이어서 쓴다. Returns the number of failed questions.
+    """
+    from src.engine import get_engine
+    from src.retrievers import doc_filter
+
+    done = set()
+    if resume and out.exists():
+        with open(out, encoding="utf-8") as f:
+            previous = [json.loads(line) for line in f if line.strip()]
+        # 실패했던 질문은 다시 시도 (실패 줄은 그대로 두고 새 줄이 뒤에 붙음)
+        done = {row["line"] for row in previous if "error" not in row}
+    rows = {}
+
+    def items():
+        # 입력 행은 답이 나올 때까지만 들고 있음 (진행 중인 질문 수만큼)
+        for n, row in read_questions(path, done):
+            rows[n] = row
+            yield n, row["question"]
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    count = 0
+    with open(out, "a" if resume else "w", encoding="utf-8") as f:
+        def on_result(n, question, result):
+            nonlocal count
+            row = rows.pop(n)
+            if isinstance(result, Exception):
+                rec = {"line": n, **row, "error": f"{type(result).__name__}: {result}"}
+            else:
+                rec = {"line": n, **row, "answer": result.answer, "citations": result.citations,
+                       "source_pages": result.source_pages, "sources": result.sources,
+                       "elapsed": round(result.elapsed, 3), "timings": result.timings, "usage": result.usage,
+                       "retriever": result.retriever}
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            count += 1
+            if count % 100 == 0:
+                f.flush()
+                print(f"[..] {count} answered | {count / (time.perf_counter() - t0):.1f} q/s", file=sys.stderr)
+
+        failed = get_engine(collection).answer_batch(items(), on_result, top_k=top_k, where=doc_filter(doc_ids),
+                                                     batch_size=batch_size, concurrency=concurrency, qps=qps)
+    dt = time.perf_counter() - t0
+    print(f"[OK] {count} questions ({len(done)} already done, {failed} failed) in {dt:.1f}s "
+          f"| {count / dt if dt else 0:.1f} q/s -> {out}")
+    return failed
+
+
 def main():
     # CLI 인터페이스 작성, 터미널에서 명령어로 실행할 수 있게 함
     ap = argparse.ArgumentParser()
-    ap.add_argument("--question", required=True, help="Question to ask")
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument("--question", help="Question to ask")
+    group.add_argument("--questions-file", help="JSONL of questions ({\"question\": ...} or strings) - batch mode")
     ap.add_argument("--top_k", type=int, default=4, help="Number of retrieved chunks")
+    ap.add_argument("--no-stream", action="store_true", help="Wait for the full answer instead of streaming tokens")
+    ap.add_argument("--doc", action="append", help="Search only this document (doc_id, repeatable)")
+    ap.add_argument("--collection", help="Chroma collection to search (default: COLLECTION_NAME)")
+    ap.add_argument("--out", help="Batch mode output JSONL (default: <questions-file>.answers.jsonl)")
+    ap.add_argument("--concurrency", type=int, default=8, help="Batch mode: LLM calls in flight")
+    ap.add_argument("--batch-size", type=int, default=64, help="Batch mode: questions per embedding/search batch")
+    ap.add_argument("--qps", type=float, default=0, help="Batch mode: max LLM calls started per second (0 = no cap)")
+    ap.add_argument("--resume", action="store_true", help="Batch mode: skip questions already answered in --out")
     args = ap.parse_args()
 
-    answer, citations, sources, elapsed = answer_question(args.question, args.top_k)
-
+    if args.questions_file:
+        path = Path(args.questions_file)
+        out = Path(args.out) if args.out else path.with_suffix(".answers.jsonl")
+        failed = answer_file(path, out, args.top_k, args.doc, args.collection, args.concurrency, args.batch_size,
+                             args.qps, args.resume)
+        raise SystemExit(1 if failed else 0)
 
     print("\n=== Answer ===")
-    print(answer)
+    if args.no_stream:
+        answer, citations, sources, elapsed, source_pages = answer_question(args.question, args.top_k, args.doc,
+                                                                            args.collection)
+        print(answer)
+        timings = {}
+    else:
+        from src.engine import get_engine
+        from src.retrievers import doc_filter
+
+        # 토큰이 도착하는 대로 바로 출력
+        stream = get_engine(args.collection).stream_answer(args.question, top_k=args.top_k,
+                                                           where=doc_filter(args.doc))
+        for token in stream:
+            print(token, end="", flush=True)
+        print()
+        answer, citations, sources, elapsed, source_pages = stream.result.as_tuple()
+        timings = stream.result.timings
     print(citations)
 
     print("\n=== Sources ===")
     for i, s in enumerate(sources, 1):
         print(f"{i}, page={s.get('page')} | {s.get('snippet')}")
 
-    print(f"\n[OK] elapsed={elapsed:.2f}s | top_k={args.top_k}")
+    print(f"\n[OK] elapsed={elapsed:.2f}s | top_k={args.top_k} | {timings}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,186 @@
+"""Two-stage retrieval: a larger candidate pool from any retriever, reranked by a pluggable scorer.
+
+top_k 를 키우면 프롬프트가 길어져서 느려지므로, 검색은 RERANK_POOL 개를 싸게 가져오고
+scorer 가 질문과 다시 비교해서 상위 top_k 만 문맥에 넣는다.
+
+scorer:
+- lexical (기본): 후보 풀 안에서 계산한 BM25 - dense 검색이 놓친 정확한 단어 일치를 반영
+- embedding: 질문 벡터와 후보 청크 벡터의 cosine (청크 임베딩은 ingest 때 임베딩 캐시에 들어가 있음)
+- cross_encoder: sentence-transformers CrossEncoder (RERANK_MODEL, 설치되어 있을 때만)
+
+재순위는 질문마다 RERANK_BUDGET_MS 안에 끝나야 한다. 넘으면 기다리지 않고 원래 검색 순서의 상위 top_k 를 쓴다
+(timings 의 rerank_fallback=1). 후보 검색 시간은 예산에 포함하지 않는다.
+
+    RETRIEVER=chroma+rerank python -m src.rag --question "..."
+    python -m src.rerank --question "What is cross-validation?" --retriever chroma --scorer lexical
+"""
+import argparse
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src import tracing
+from src.config import RERANK_BUDGET_MS, RERANK_MODEL, RERANK_POOL, RERANK_SCORER
+from src.lexical import BM25_B, BM25_K1, tokenize
+
+SCORERS = ("lexical", "embedding", "cross_encoder")
+
+# 예산을 넘긴 scorer 호출은 멈출 수 없으므로 워커 수를 제한해서 밀린 작업이 끝없이 쌓이지 않게 함
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rerank")
+
+
+class LexicalScorer:
+    """BM25 of the question against the candidate pool (idf from the pool itself)."""
+
+    name = "lexical"
+
+    def score(self, question: str, q_vec, docs: List[Document]) -> List[float]:
+        terms = set(tokenize(question))
+        tfs = [Counter(tokenize(d.page_content)) for d in docs]
+        lens = [sum(tf.values()) for tf in tfs]
+        avg_len = (sum(lens) / len(lens)) or 1.0
+        n = len(docs)
+        idf = {t: math.log(1 + (n - df + 0.5) / (df + 0.5))
+               for t in terms for df in [sum(1 for tf in tfs if t in tf)]}
+        scores = []
+        for tf, dl in zip(tfs, lens):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * dl / avg_len)
+            scores.append(sum(idf[t] * tf[t] * (BM25_K1 + 1) / (tf[t] + norm) for t in terms if t in tf))
+        return scores
+
+
+class EmbeddingScorer:
+    """Cosine between the question vector and each candidate's embedding."""
+
+    name = "embedding"
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def score(self, question: str, q_vec, docs: List[Document]) -> List[float]:
+        m = np.asarray(self.embeddings.embed_documents([d.page_content for d in docs]), dtype=np.float32)
+        q = np.asarray(q_vec, dtype=np.float32)
+        norms = np.linalg.norm(m, axis=1) * (np.linalg.norm(q) or 1.0)
+        norms[norms == 0] = 1.0
+        return list(m @ q / norms)
+
+
+class CrossEncoderScorer:
+    """Model-based relevance (question, chunk) pairs; needs sentence-transformers."""
+
+    name = "cross_encoder"
+
+    def __init__(self, model: str = RERANK_MODEL):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("cross_encoder scorer needs sentence-transformers (pip install sentence-transformers)") from e
+        self.model = CrossEncoder(model)
+
+    def score(self, question: str, q_vec, docs: List[Document]) -> List[float]:
+        return [float(s) for s in self.model.predict([(question, d.page_content) for d in docs])]
+
+
+def make_scorer(name: str, db=None):
+    if name == "lexical":
+        return LexicalScorer()
+    if name == "embedding":
+        return EmbeddingScorer(db.embeddings)
+    if name == "cross_encoder":
+        return CrossEncoderScorer()
+    raise ValueError(f"Unknown rerank scorer: {name!r} (expected one of {', '.join(SCORERS)})")
+
+
+class RerankingRetriever:
+    """Fetch `pool` candidates from a base retriever, rerank within a time budget, keep the top k."""
+
+    def __init__(self, base, scorer, pool: int = RERANK_POOL, budget_ms: float = RERANK_BUDGET_MS):
+        self.base = base
+        self.scorer = scorer
+        self.pool = pool
+        self.budget_ms = budget_ms
+        self.name = f"{base.name}+rerank:{scorer.name}"
+        # 마지막 검색의 rerank_ms / rerank_fallback (스레드별 - 동시 요청이 섞이지 않게)
+        self._local = threading.local()
+
+    def last_timings(self) -> Dict[str, float]:
+        return getattr(self._local, "timings", {})
+
+    def rerank(self, question: str, q_vec, docs: List[Document], k: int) -> List[Document]:
+        with tracing.span("rerank", scorer=self.scorer.name, candidates=len(docs)) as sp:
+            docs = self._rerank(question, q_vec, docs)
+            sp.set(fallback=self._local.timings["rerank_fallback"])
+        return docs[:k]
+
+    def _rerank(self, question: str, q_vec, docs: List[Document]) -> List[Document]:
+        t0 = time.perf_counter()
+        fallback = 0
+        if len(docs) > 1:
+            fut = _pool.submit(self.scorer.score, question, q_vec, docs)
+            budget = self.budget_ms / 1000 if self.budget_ms > 0 else None
+            try:
+                scores = fut.result(timeout=budget)
+                # 순수 파이썬 scorer 는 GIL 때문에 timeout 이 switch interval(5ms) 단위로 늦게 깰 수 있음 -> 시간으로 한 번 더 확인
+                if budget is not None and time.perf_counter() - t0 > budget:
+                    raise TimeoutError
+                # 점수가 같으면 원래 검색 순위 유지 (sorted 는 stable)
+                docs = [docs[i] for i in sorted(range(len(docs)), key=lambda i: -scores[i])]
+            except TimeoutError:
+                fut.cancel()
+                fallback = 1
+        self._local.timings = {"rerank_ms": round((time.perf_counter() - t0) * 1000, 1), "rerank_fallback": fallback}
+        return docs
+
+    def search(self, question: str, q_vec, k: int, where: Optional[dict] = None) -> List[Document]:
+        docs = self.base.search(question, q_vec, max(k, self.pool), where)
+        return self.rerank(question, q_vec, docs, k)
+
+    def search_batch(self, questions, q_vecs, k: int, where: Optional[dict] = None) -> List[List[Document]]:
+        # 후보 검색은 base 의 batch 경로 (local 은 행렬곱 1번), 재순위는 질문마다 자기 예산으로
+        pools = self.base.search_batch(questions, q_vecs, max(k, self.pool), where)
+        return [self.rerank(q, v, docs, k) for q, v, docs in zip(questions, q_vecs, pools)]
+
+    def prefix_exact(self, k: int) -> bool:
+        # k <= pool 이면 후보 pool 개가 k 와 상관없이 같으므로 재순위 결과의 앞부분도 같음
+        return k <= self.pool
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--question", required=True)
+    ap.add_argument("--retriever", default=None, help="Base retriever (default: RETRIEVER)")
+    ap.add_argument("--scorer", default=RERANK_SCORER, choices=SCORERS)
+    ap.add_argument("--top_k", type=int, default=4)
+    ap.add_argument("--pool", type=int, default=RERANK_POOL)
+    ap.add_argument("--budget-ms", type=float, default=RERANK_BUDGET_MS)
+    args = ap.parse_args()
+
+    from src.engine import get_engine
+
+    engine = get_engine()
+    base = engine.get_retriever(args.retriever)
+    reranker = RerankingRetriever(base, make_scorer(args.scorer, engine.db), args.pool, args.budget_ms)
+    q_vec, _ = engine.embed(args.question)
+    t0 = time.perf_counter()
+    candidates = base.search(args.question, q_vec, max(args.top_k, args.pool))
+    search_ms = (time.perf_counter() - t0) * 1000
+    ranked = reranker.rerank(args.question, q_vec, candidates, args.top_k)
+
+    def label(d):
+        md = d.metadata or {}
+        page = md.get("page")
+        return f"{md.get('doc_id', '')} p.{(page + 1) if isinstance(page, int) else page}"
+
+    print(f"[OK] {base.name} pool={len(candidates)} ({search_ms:.1f} ms) -> {reranker.name} {reranker.last_timings()}")
+    print("before:", ", ".join(label(d) for d in candidates[:args.top_k]))
+    print("after: ", ", ".join(label(d) for d in ranked))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Retrieval cache: (normalized question, top_k, retriever, filter) -> retrieved chunk ids + metadata.
+
+답변 캐시와 달리 프롬프트 / 모델이 다른 arm 끼리도 공유한다 - 답변은 새로 생성해도 임베딩과 검색은 건너뜀.
+- index_version 이 바뀌면(ingest) 그 컬렉션의 이전 항목은 전부 무효 (다음 조회 때 비움)
+- 프로세스 내 LRU 는 엔진(컬렉션)마다 하나라서 Streamlit 세션끼리 공유된다
+- persist=True 면 SQLite 파일에도 저장 -> 재시작 후나 다른 프로세스(실험 러너 등)와도 공유
+- hit 는 저장된 청크 id 로 Chroma 에서 본문만 다시 읽는다 (get_by_ids, 벡터 검색 없음)
+
+    python -m src.retrieval_cache          # 컬렉션별 항목 수
+    python -m src.retrieval_cache --clear
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from src.answer_cache import normalize_question
+from src.config import (
+    RETRIEVAL_CACHE_DISK_ITEMS,
+    RETRIEVAL_CACHE_MAX_ITEMS,
+    RETRIEVAL_CACHE_PATH,
+    RETRIEVAL_CACHE_PERSIST,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS retrievals (
+  collection TEXT NOT NULL,
+  key TEXT NOT NULL,
+  index_version INTEGER NOT NULL,
+  chunks TEXT NOT NULL,
+  cost_ms REAL NOT NULL,
+  last_used INTEGER NOT NULL,
+  PRIMARY KEY (collection, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_retrievals_last_used ON retrievals (last_used);
+"""
+
+
+def cache_key(question: str, top_k: int, retriever: str, where: Optional[dict] = None) -> str:
+    where = json.dumps(where, sort_keys=True) if where else ""
+    return f"{normalize_question(question)}|{top_k}|{retriever}|{where}"
+
+
+class RetrievalCache:
+    """Memory LRU (+ optional SQLite file) of search results for one collection.
+
+    항목 = ([(chunk_id, metadata), ...], cost_ms). cost_ms 는 miss 때 임베딩 + 검색에 걸린 시간으로,
+    hit 마다 cost_ms - (이미 쓴 임베딩 시간) - hit 시간을 절약한 시간(saved_ms)으로 더한다
+    (hit 가 더 느렸으면 음수).
+    """
+
+    def __init__(self, collection: str, max_items: int = RETRIEVAL_CACHE_MAX_ITEMS,
+                 persist: bool = RETRIEVAL_CACHE_PERSIST, path=RETRIEVAL_CACHE_PATH,
+                 disk_items: int = RETRIEVAL_CACHE_DISK_ITEMS):
+        self.collection = collection
+        self.max_items = max_items
+        self.disk_items = disk_items
+        self.items = OrderedDict()
+        self.version = None
+        self.lock = threading.Lock()
+        self.conn = None
+        if persist:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+        # 디스크 항목 수 추정치 (put 마다 +1, REPLACE 도 세므로 실제보다 크거나 같음).
+        # 한도를 넘었을 때만 실제로 COUNT 해서 put 마다 전체 스캔하지 않도록
+        self._disk_estimate = self.conn.execute("SELECT COUNT(*) FROM retrievals").fetchone()[0] if persist else 0
+        self.hits_mem = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.hit_ms = 0.0
+
+    def _check_version(self, version: int) -> None:
+        # 컬렉션 내용이 바뀌면 저장된 청크 id 가 없어졌거나 더 나은 청크가 생겼을 수 있음
+        if version == self.version:
+            return
+        self.items.clear()
+        self.version = version
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM retrievals WHERE collection = ? AND index_version != ?",
+                                  (self.collection, version))
+
+    def _remember(self, key: str, entry) -> None:
+        self.items[key] = entry
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_items:
+            self.items.popitem(last=False)
+
+    def _lookup(self, key: str, version: int):
+        with self.lock:
+            self._check_version(version)
+            entry = self.items.get(key)
+            if entry is not None:
+                self.items.move_to_end(key)
+                self.hits_mem += 1
+                return entry
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT chunks, cost_ms FROM retrievals WHERE collection = ? AND key = ? AND index_version = ?",
+                    (self.collection, key, version),
+                ).fetchone()
+                if row is not None:
+                    entry = ([tuple(c) for c in json.loads(row[0])], row[1])
+                    self._remember(key, entry)
+                    with self.conn:
+                        self.conn.execute("UPDATE retrievals SET last_used = ? WHERE collection = ? AND key = ?",
+                                          (int(time.time()), self.collection, key))
+                    self.hits_disk += 1
+                    return entry
+            self.misses += 1
+        return None
+
+    def get(self, key: str, version: int, db) -> Optional[Tuple[List[Document], float]]:
+        """Cached docs (texts re-read from Chroma by id) and the retrieval time they originally cost."""
+        entry = self._lookup(key, version)
+        if entry is None:
+            return None
+        chunks, cost_ms = entry
+        by_id = {d.id: d for d in db.get_by_ids([cid for cid, _ in chunks])}
+        if len(by_id) < len(chunks):
+            # 같은 index_version 인데 청크가 없음 (컬렉션을 직접 고친 경우 등) -> miss 로 처리
+            self.invalidate(key)
+            return None
+        docs = [Document(page_content=by_id[cid].page_content, metadata=md, id=cid) for cid, md in chunks]
+        return docs, cost_ms
+
+    def put(self, key: str, version: int, docs: List[Document], cost_ms: float) -> None:
+        # id 가 없는 문서는 다시 읽어올 수 없으므로 캐시하지 않음
+        if any(d.id is None for d in docs):
+            return
+        entry = ([(d.id, d.metadata or {}) for d in docs], round(cost_ms, 2))
+        with self.lock:
+            self._check_version(version)
+            self._remember(key, entry)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO retrievals (collection, key, index_version, chunks, cost_ms, last_used)"
+                        " VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.collection, key, version, json.dumps(entry[0], default=str), entry[1],
+                         int(time.time())),
+                    )
+                self._evict()
+
+    def _evict(self) -> None:
+        self._disk_estimate += 1
+        if self._disk_estimate <= self.disk_items:
+            return
+        n = self._disk_estimate = self.conn.execute("SELECT COUNT(*) FROM retrievals").fetchone()[0]
+        if n <= self.disk_items:
+            return
+        # 한도의 90% 까지 오래 안 쓴 것부터 삭제
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM retrievals WHERE (collection, key) IN "
+                "(SELECT collection, key FROM retrievals ORDER BY last_used LIMIT ?)",
+                (n - int(self.disk_items * 0.9),),
+            )
+        self._disk_estimate = int(self.disk_items * 0.9)
+
+    def record_hit(self, saved_ms: float, hit_ms: float) -> None:
+        with self.lock:
+            # hit 이 원래 검색보다 느릴 수도 있음 (get_by_ids 로 본문을 다시 읽으므로) - 음수도 그대로 합산
+            self.saved_ms += saved_ms
+            self.hit_ms += hit_ms
+
+    def invalidate(self, key: str) -> None:
+        with self.lock:
+            self.items.pop(key, None)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM retrievals WHERE collection = ? AND key = ?",
+                                      (self.collection, key))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM retrievals WHERE collection = ?", (self.collection,))
+
+    def stats(self) -> dict:
+        hits = self.hits_mem + self.hits_disk
+        lookups = hits + self.misses
+        return {
+            "items": len(self.items),
+            "hits_mem": self.hits_mem,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate_%": round(hits / lookups * 100, 1) if lookups else None,
+            "saved_ms": round(self.saved_ms, 1),
+            "avg_hit_ms": round(self.hit_ms / hits, 2) if hits else None,
+        }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clear", action="store_true", help="Delete every cached retrieval")
+    args = ap.parse_args()
+
+    if not RETRIEVAL_CACHE_PATH.exists():
+        print("[OK] No retrieval cache file (set RETRIEVAL_CACHE_PERSIST=1 to keep results on disk):",
+              RETRIEVAL_CACHE_PATH)
+        return
+    conn = sqlite3.connect(RETRIEVAL_CACHE_PATH)
+    if args.clear:
+        with conn:
+            conn.execute("DELETE FROM retrievals")
+        print("[OK] Retrieval cache cleared:", RETRIEVAL_CACHE_PATH)
+    rows = conn.execute(
+        "SELECT collection, index_version, COUNT(*), ROUND(AVG(cost_ms), 1) FROM retrievals "
+        "GROUP BY collection, index_version"
+    ).fetchall()
+    print("[OK] Retrieval cache:", RETRIEVAL_CACHE_PATH)
+    for collection, version, n, cost in rows:
+        print(collection, {"index_version": version, "entries": n, "avg_cost_ms": cost})
+
+
+if __name__ == "__main__":
+    main()
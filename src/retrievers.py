@@ -0,0 +1,357 @@
+"""Pluggable retriever backends used by RagEngine.
+
+- "chroma": 기존 Chroma HNSW 검색
+- "local":  Chroma 컬렉션을 float32 행렬(.npy, memory-mapped)로 내보내서 NumPy 내적으로 검색
+            문서 하나 정도의 작은 코퍼스에서는 시작/질의 오버헤드가 훨씬 작다
+- "bm25":   단어 기반 BM25 역색인 (src/lexical.py)
+- "hybrid": chroma + bm25 를 reciprocal rank fusion 으로 합침 ("hybrid_local" 은 local + bm25)
+
+백엔드는 config.RETRIEVER_BACKEND (env RETRIEVER) 로 선택한다.
+
+모든 백엔드의 search 는 where (Chroma 메타데이터 필터, 예: {"doc_id": {"$in": ["a.pdf", "b.pdf"]}}) 를 받는다.
+local / bm25 인덱스는 행을 doc_id 순서로 저장해서 문서마다 연속된 행 구간 [lo, hi) 을 가진다 -
+doc_id 필터는 그 구간만 읽으므로 코퍼스 전체 크기와 상관없이 해당 문서 크기에만 비례한다.
+
+    python -m src.retrievers --build      # local 인덱스를 Chroma 에서 다시 생성
+"""
+import argparse
+import json
+import shutil
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.config import CHROMA_DIR, COLLECTION_NAME, LOCAL_INDEX_DIR, RETRIEVER_BACKEND
+from src.manifest import index_version
+
+
+def doc_filter(doc_ids: Optional[Sequence[str]]) -> Optional[dict]:
+    """Chroma where-clause restricting search to some documents (None = no filter)."""
+    if not doc_ids:
+        return None
+    doc_ids = list(doc_ids)
+    return {"doc_id": doc_ids[0]} if len(doc_ids) == 1 else {"doc_id": {"$in": doc_ids}}
+
+
+def filter_doc_ids(where: Optional[dict]) -> Optional[List[str]]:
+    """doc_ids of a doc_id-only filter (equality / $eq / $in), else None."""
+    if not where or list(where) != ["doc_id"]:
+        return None
+    cond = where["doc_id"]
+    if isinstance(cond, str):
+        return [cond]
+    if isinstance(cond, dict) and len(cond) == 1:
+        op, value = next(iter(cond.items()))
+        if op == "$eq":
+            return [value]
+        if op == "$in":
+            return list(value)
+    return None
+
+
+_OPS = {
+    "$eq": lambda v, x: v == x,
+    "$ne": lambda v, x: v != x,
+    "$in": lambda v, x: v in x,
+    "$nin": lambda v, x: v not in x,
+    "$gt": lambda v, x: v is not None and v > x,
+    "$gte": lambda v, x: v is not None and v >= x,
+    "$lt": lambda v, x: v is not None and v < x,
+    "$lte": lambda v, x: v is not None and v <= x,
+}
+
+
+def matches(metadata: dict, where: dict) -> bool:
+    """Evaluate a Chroma-style where-clause against one metadata dict."""
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not all(_OPS[op](metadata.get(key), x) for op, x in cond.items()):
+                return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
+
+
+def doc_ranges(doc_ids: Sequence[str]) -> Dict[str, List[int]]:
+    """{doc_id: [lo, hi)} for rows already sorted by doc_id."""
+    ranges: Dict[str, List[int]] = {}
+    for i, d in enumerate(doc_ids):
+        if d in ranges:
+            ranges[d][1] = i + 1
+        else:
+            ranges[d] = [i, i + 1]
+    return ranges
+
+
+def ids_by_doc(collection, page_size: int = 5000):
+    """All (chunk id, doc_id) of a Chroma collection, sorted by (doc_id, id) - metadata only, no vectors."""
+    rows = []
+    for offset in range(0, collection.count(), page_size):
+        part = collection.get(limit=page_size, offset=offset, include=["metadatas"])
+        rows.extend((str((md or {}).get("doc_id", "")), cid) for cid, md in zip(part["ids"], part["metadatas"]))
+    rows.sort()
+    return [cid for _, cid in rows], [d for d, _ in rows]
+
+
+class ChromaRetriever:
+    name = "chroma"
+
+    def __init__(self, db):
+        self.db = db
+
+    def search(self, question: str, q_vec, k: int, where: Optional[dict] = None) -> List[Document]:
+        # Chroma 가 메타데이터 인덱스로 먼저 거른 뒤 그 안에서만 벡터 검색
+        return self.db.similarity_search_by_vector(q_vec, k=k, filter=where)
+
+    def search_batch(self, questions, q_vecs, k: int, where: Optional[dict] = None) -> List[List[Document]]:
+        return [self.search(q, v, k, where) for q, v in zip(questions, q_vecs)]
+
+    def prefix_exact(self, k: int) -> bool:
+        """True when the first j results of search(k) equal search(j) for every j <= k."""
+        # 점수 순 top-k 라서 top 2 는 top 4 의 앞부분
+        return True
+
+
+def _unit_rows(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return m / norms
+
+
+def build_local_index(collection_name: str = COLLECTION_NAME, persist_directory=CHROMA_DIR,
+                      out_dir: Path = LOCAL_INDEX_DIR, page_size: int = 5000) -> Path:
+    """Export a Chroma collection to vectors.npy (unit-normalized float32) + meta.jsonl (+ line offsets).
+
+    Rows are sorted by doc_id.
+    """
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=str(persist_directory)).get_collection(collection_name)
+    ids, doc_ids = ids_by_doc(collection, page_size)
+    n = len(ids)
+    target = Path(out_dir) / collection_name
+    tmp = target.with_name(target.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+
+    vectors = None
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    with open(tmp / "meta.jsonl", "wb") as meta:
+        # 한 번에 다 읽지 않고 page_size 씩 나눠서 내보냄 (doc_id 순서대로 id 로 가져옴)
+        for offset in range(0, n, page_size):
+            batch = ids[offset:offset + page_size]
+            part = collection.get(ids=batch, include=["embeddings", "documents", "metadatas"])
+            pos = {cid: i for i, cid in enumerate(part["ids"])}
+            order = [pos[cid] for cid in batch]
+            emb = np.asarray(part["embeddings"], dtype=np.float32)[order]
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(tmp / "vectors.npy", mode="w+", dtype=np.float32,
+                                                    shape=(n, emb.shape[1]))
+            vectors[offset:offset + len(emb)] = _unit_rows(emb)
+            for row, i in enumerate(order, start=offset):
+                line = (json.dumps({"id": part["ids"][i], "text": part["documents"][i],
+                                    "metadata": part["metadatas"][i] or {}}, ensure_ascii=False) + "\n").encode("utf-8")
+                meta.write(line)
+                offsets[row + 1] = offsets[row] + len(line)
+    if vectors is not None:
+        vectors.flush()
+        del vectors
+    # 행 i 의 meta 줄 = meta.jsonl 의 [offsets[i], offsets[i + 1]) 바이트 - 본문은 검색 결과 행만 읽는다
+    np.save(tmp / "offsets.npy", offsets)
+
+    (tmp / "info.json").write_text(json.dumps({
+        "count": n,
+        "index_version": index_version(collection_name),
+        "doc_ranges": doc_ranges(doc_ids),
+    }), encoding="utf-8")
+    # 다 만든 뒤에 교체 - 읽는 쪽이 반쯤 만들어진 인덱스를 보지 않도록
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+    return target
+
+
+@dataclass
+class LocalIndex:
+    """One loaded version of a local index. Never modified after loading (except the filter cache)."""
+
+    version: int
+    vectors: np.ndarray      # (n, dim) float32 memmap
+    meta: np.ndarray         # meta.jsonl 바이트 (uint8 memmap)
+    offsets: np.ndarray      # (n + 1,) 행 i 의 줄 = meta[offsets[i]:offsets[i + 1]]
+    doc_ranges: Dict[str, List[int]]
+    selections: dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def row(self, i: int) -> dict:
+        """{"id", "text", "metadata"} of row i, parsed from its meta.jsonl line."""
+        return json.loads(bytes(self.meta[self.offsets[i]:self.offsets[i + 1]]))
+
+    def rows(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def docs(self, idx) -> List[Document]:
+        rows = [self.row(i) for i in idx]
+        return [Document(page_content=r["text"], metadata=r["metadata"], id=r["id"]) for r in rows]
+
+
+class LocalIndexRetriever:
+    """Brute-force top-k over a memory-mapped float32 matrix (cosine = dot of unit vectors)."""
+
+    name = "local"
+
+    def __init__(self, collection_name: str = COLLECTION_NAME, persist_directory=CHROMA_DIR,
+                 index_dir: Path = LOCAL_INDEX_DIR):
+        self.collection_name = collection_name
+        self.persist_directory = persist_directory
+        self.path = Path(index_dir) / collection_name
+        self.lock = threading.Lock()
+        self.index = self._load()
+
+    def _load(self) -> LocalIndex:
+        current = index_version(self.collection_name)
+        info_path = self.path / "info.json"
+        info = json.loads(info_path.read_text(encoding="utf-8")) if info_path.exists() else {}
+        # 인덱스가 없거나 ingest 로 컬렉션이 바뀌었으면 Chroma 에서 다시 내보냄 (doc_ranges / offsets 가 없는 예전 형식도)
+        if (info.get("index_version") != current or "doc_ranges" not in info
+                or not (self.path / "offsets.npy").exists()):
+            build_local_index(self.collection_name, self.persist_directory, self.path.parent)
+            info = json.loads(info_path.read_text(encoding="utf-8"))
+        offsets = np.load(self.path / "offsets.npy")
+        vec_path = self.path / "vectors.npy"
+        # 본문은 메모리에 올리지 않고 memmap - 검색 결과 행의 줄만 읽어서 파싱
+        meta = (np.memmap(self.path / "meta.jsonl", dtype=np.uint8, mode="r") if offsets[-1]
+                else np.zeros(0, np.uint8))
+        return LocalIndex(
+            version=current,
+            vectors=np.load(vec_path, mmap_mode="r") if vec_path.exists() else np.zeros((0, 1), np.float32),
+            meta=meta,
+            offsets=offsets,
+            doc_ranges=info["doc_ranges"],
+        )
+
+    def current(self) -> LocalIndex:
+        """The loaded index, reloaded first if ingest changed the collection."""
+        index = self.index
+        if index_version(self.collection_name) != index.version:
+            with self.lock:
+                if index_version(self.collection_name) != self.index.version:
+                    # 새 LocalIndex 를 다 만든 뒤 속성 하나만 바꿈 - 검색 중인 스레드는 이전 것을 끝까지 씀
+                    self.index = self._load()
+                index = self.index
+        return index
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        # 전체 정렬 대신 argpartition 으로 k 개만 고른 뒤 그 안에서 정렬
+        if k >= scores.shape[-1]:
+            return np.argsort(-scores, axis=-1)
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+        order = np.take_along_axis(scores, part, axis=-1).argsort(axis=-1)[..., ::-1]
+        return np.take_along_axis(part, order, axis=-1)
+
+    @staticmethod
+    def _selection(index: LocalIndex, where: dict):
+        """(row ids, vectors) matching a filter; a single document is a zero-copy slice of the memmap."""
+        key = json.dumps(where, sort_keys=True)
+        sel = index.selections.get(key)
+        if sel is None:
+            docs = filter_doc_ids(where)
+            if docs is not None:
+                ranges = [index.doc_ranges[d] for d in docs if d in index.doc_ranges]
+                rows = np.concatenate([np.arange(lo, hi) for lo, hi in ranges]) if ranges else np.zeros(0, np.int64)
+            else:
+                # doc_id 외의 조건은 meta.jsonl 을 한 번 훑어서 행 번호를 구함 (같은 필터는 캐시)
+                ranges = None
+                rows = np.fromiter((i for i, r in enumerate(index.rows()) if matches(r["metadata"], where)),
+                                   dtype=np.int64)
+            sel = index.selections[key] = (rows, ranges)
+        rows, ranges = sel
+        if ranges is not None and len(ranges) == 1:
+            lo, hi = ranges[0]
+            return rows, index.vectors[lo:hi]
+        return rows, index.vectors[rows]
+
+    def search(self, question: str, q_vec, k: int, where: Optional[dict] = None) -> List[Document]:
+        return self.search_batch([question], [q_vec], k, where)[0]
+
+    def search_batch(self, questions, q_vecs, k: int, where: Optional[dict] = None) -> List[List[Document]]:
+        """Score many queries with one matrix product (only over the filtered rows if where is set)."""
+        index = self.current()
+        if not len(index) or k <= 0:
+            return [[] for _ in q_vecs]
+        q = _unit_rows(np.asarray(q_vecs, dtype=np.float32))
+        if where is None:
+            return [index.docs(row) for row in self._top_k(q @ index.vectors.T, k)]
+        rows, vectors = self._selection(index, where)
+        if not len(rows):
+            return [[] for _ in q_vecs]
+        return [index.docs(rows[top]) for top in self._top_k(q @ vectors.T, k)]
+
+    def prefix_exact(self, k: int) -> bool:
+        # 정확한 점수 순 top-k (행렬곱 + argpartition)
+        return True
+
+
+RETRIEVERS = ("chroma", "local", "bm25", "hybrid", "hybrid_local")
+
+
+def make_retriever(name: str, db, collection_name: str = COLLECTION_NAME, persist_directory=CHROMA_DIR):
+    """Retriever by name; "<name>+rerank[:<scorer>]" wraps it in a reranking stage (src.rerank)."""
+    if "+rerank" in name:
+        from src.config import RERANK_SCORER
+        from src.rerank import RerankingRetriever, make_scorer
+
+        base, _, scorer = name.partition("+rerank")
+        retriever = RerankingRetriever(make_retriever(base, db, collection_name, persist_directory),
+                                       make_scorer(scorer.lstrip(":") or RERANK_SCORER, db))
+        retriever.name = name
+        return retriever
+    if name == "chroma":
+        return ChromaRetriever(db)
+    if name == "local":
+        return LocalIndexRetriever(collection_name, persist_directory)
+    if name in ("bm25", "hybrid", "hybrid_local"):
+        from src.lexical import HybridRetriever, LexicalRetriever
+
+        lexical = LexicalRetriever(db, collection_name, persist_directory)
+        if name == "bm25":
+            return lexical
+        dense = make_retriever(name.split("_")[1] if "_" in name else "chroma", db, collection_name,
+                               persist_directory)
+        retriever = HybridRetriever(dense, lexical)
+        retriever.name = name
+        return retriever
+    raise ValueError(f"Unknown retriever backend: {name!r} (expected one of {', '.join(RETRIEVERS)}, "
+                     f"optionally with +rerank)")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--build", action="store_true", help="(Re)build the local index from Chroma")
+    ap.add_argument("--collection", default=COLLECTION_NAME)
+    args = ap.parse_args()
+
+    if args.build:
+        from src.index_variants import persist_dir
+
+        path = build_local_index(args.collection, persist_dir(args.collection))
+        print("[OK] Local index written to:", path)
+    else:
+        print("[OK] Retriever backend:", RETRIEVER_BACKEND, "| local index dir:", LOCAL_INDEX_DIR)
+
+
+if __name__ == "__main__":
+    main()
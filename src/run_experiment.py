@@ -1,13 +1,16 @@
 import argparse
 import json
+import time
 import uuid
+from dataclasses import replace
 from pathlib import Path
 
-from src.rag import answer_question
-from src.storage import log_event
+from src.engine import get_engine
+from src.experiments import get_experiment
+from src.runner import run_jobs
+from src.storage import flush, log_query, logged_jobs
 
 EXPERIMENT = "topk_ab_offline_k2_k4"
-TOPK_BY_VARIANT = {"A": 2, "B": 4}
 
 
 def main():
@@ -15,8 +18,26 @@ def main():
     # .ArgumentParse() 분석기 생성
     ap = argparse.ArgumentParser()
     # 메뉴 츄가(인자 정의), 이름, 타입, 기본설정, 도움말
+    ap.add_argument("--experiment", default=EXPERIMENT, help="Experiment in experiments/experiments.json")
+    ap.add_argument("--arm", action="append", help="Run only these arms (repeatable, default: every arm)")
     ap.add_argument("--questions", default="experiments/test_questions.json")
     ap.add_argument("--limit", type=int, default=0, help="0 means no limit")
+    ap.add_argument(
+        "--shared-retrieval",
+        action="store_true",
+        help="Embed/search once at max(top_k) per question and slice it per variant",
+    )
+    ap.add_argument("--concurrency", type=int, default=1, help="Jobs in flight at once (1 = sequential)")
+    ap.add_argument("--qps", type=float, default=0, help="Max job starts per second (0 = no cap)")
+    ap.add_argument("--retries", type=int, default=5, help="Retries on rate-limit errors (exponential backoff)")
+    ap.add_argument("--resume", metavar="SESSION_ID", help="Continue a previous run, skipping jobs already logged")
+    ap.add_argument(
+        "--retriever",
+        action="append",
+        default=[],
+        metavar="VARIANT=NAME",
+        help="Override an arm's retriever, e.g. --retriever B=hybrid",
+    )
     # 설정을 모은 최종 파싱기(바구니) 생성
     args = ap.parse_args()
 
@@ -24,36 +45,110 @@ def main():
     # args.questions 에 있는 주소를 Path로 변환
     questions_path = Path(args.questions)
     questions = json.loads(questions_path.read_text(encoding="utf-8"))
+    # 정답 페이지가 붙은 항목({"question": ..., "gold_pages": [...]}, eval_retrieval 용)은 질문만 사용
+    questions = [q["question"] if isinstance(q, dict) else q for q in questions]
 
     if args.limit and args.limit > 0:
         questions = questions[: args.limit]
 
+    # 실험 정의에서 arm 설정을 읽음. 오프라인은 배정 없이 모든 arm 을 질문마다 실행
+    experiment = get_experiment(args.experiment)
+    known = ", ".join(experiment.arms)
+    for name in args.arm or []:
+        if name not in experiment.arms:
+            ap.error(f"--arm {name}: experiment {experiment.name!r} has no such arm (arms: {known})")
+    arms = {name: arm for name, arm in experiment.arms.items() if not args.arm or name in args.arm}
+    for item in args.retriever:
+        name, sep, retriever = item.partition("=")
+        if not sep or not retriever:
+            ap.error(f"--retriever {item}: expected VARIANT=NAME")
+        if name not in experiment.arms:
+            ap.error(f"--retriever {item}: experiment {experiment.name!r} has no arm {name!r} (arms: {known})")
+        # --arm 으로 뺀 arm 의 override 는 무시
+        if name in arms:
+            arms[name] = replace(arms[name], retriever=retriever)
+    print(f"[OK] experiment={experiment.name} | " + " | ".join(f"{a.name}: {a.describe()}" for a in arms.values()))
+
     # uuid는 128비트 고유 식별 번호 생성, uuid4s는 완전 랜점 방식
     # run_experiment.py를 실행할때 마다 새로운 랜덤 번호 생성-> 특정 세선을 구별할 수 있음
-    session_id = str(uuid.uuid4())
-    print(f"[OK] session_id={session_id} | questions={len(questions)}")
+    # --resume 이면 이전 session_id 를 그대로 쓰고 이미 기록된 (질문, variant) 는 건너뜀
+    session_id = args.resume or str(uuid.uuid4())
+    done = logged_jobs(session_id, experiment.name) if args.resume else set()
 
+    # 작업 단위: (질문, variant 묶음). shared 모드는 질문당 1개, 아니면 variant 당 1개
+    jobs = []
     for q in questions:
-        for variant in ["A", "B"]:
-            top_k = TOPK_BY_VARIANT[variant]
-            answer, citations, sources, elapsed, source_pages = answer_question(q, top_k=top_k)
+        todo = tuple(v for v in arms if (q, v) not in done)
+        if not todo:
+            continue
+        if args.shared_retrieval:
+            # 검색 결과를 공유할 수 있는 건 같은 인덱스(collection)와 retriever 를 쓰는 variant 끼리만
+            groups = {}
+            for v in todo:
+                groups.setdefault((arms[v].collection, arms[v].retriever), []).append(v)
+            jobs.extend((q, tuple(vs)) for vs in groups.values())
+        else:
+            jobs.extend((q, (v,)) for v in todo)
+
+    print(f"[OK] session_id={session_id} | questions={len(questions)} | jobs={len(jobs)} | skipped={len(done)}")
+
+    # 클라이언트/컬렉션은 한 번만 열고 모든 질문에 재사용
+    engine = get_engine()
 
-            latency_ms = int(elapsed * 1000)
-            log_event(
+    def work(job):
+        q, variants = job
+        first = arms[variants[0]]
+        arm_engine = get_engine(first.collection)
+        # shared 모드: 질문당 임베딩/검색 1회, variant 별로는 생성만 따로 (model / prompt 는 arm 별)
+        if len(variants) > 1:
+            return arm_engine.answer_variants(
+                q, {v: arms[v].top_k for v in variants}, retriever=first.retriever,
+                generation={v: {"model": arms[v].model, "prompt": arms[v].prompt} for v in variants},
+                use_cache=False,
+            )
+        # 오프라인 latency 측정이므로 답변 / 검색 결과 캐시는 사용하지 않음
+        return {first.name: arm_engine.answer(q, **{**first.answer_kwargs(), "use_cache": False})}
+
+    # 결과는 끝나는 순서대로 바로 DB에 기록 -> 중간에 죽어도 --resume 으로 이어서 실행 가능
+    def on_done(job, results):
+        q, _ = job
+        for variant, result in results.items():
+            top_k = arms[variant].top_k
+            latency_ms = int(result.elapsed * 1000)
+            log_query(
                 session_id=session_id,
-                experiment=EXPERIMENT,
+                experiment=experiment.name,
                 variant=variant,
                 question=q,
                 top_k=top_k,
                 latency_ms=latency_ms,
-                citations=citations,
-                source_pages=source_pages,
-                answer=answer[:2000],
-                user_vote=None,  # 오프라인 실행은 투표 없음
+                citations=result.citations,
+                source_pages=result.source_pages,
+                answer=result.answer[:2000],
+                timings=result.timings,
+                retriever=result.retriever,
+                usage=result.usage,
             )
 
-            print(f"[OK] {variant} top_k={top_k} latency_ms={latency_ms} q={q[:60]}")
+            print(f"[OK] {variant} top_k={top_k} retriever={result.retriever} latency_ms={latency_ms} "
+                  f"{result.timings} {result.usage} q={q[:60]}")
+
+    t0 = time.time()
+    failed = run_jobs(jobs, work, on_done, concurrency=args.concurrency, qps=args.qps, retries=args.retries)
+    # 버퍼에 남은 이벤트까지 DB 에 기록
+    flush()
+    print(f"[OK] wall={time.time() - t0:.2f}s | concurrency={args.concurrency} | qps={args.qps or 'unlimited'}")
+    if getattr(engine.embeddings, "cache", None) is not None:
+        print("[OK] Embedding cache:", engine.embeddings.cache.stats())
+    # 검색 결과 캐시 hit 비율 / 절약 시간 (arm 이 쓰는 컬렉션마다). 오프라인 latency 측정은 캐시를 건너뛰므로
+    # hit 가 있으면 캐시를 거친 호출이 섞였다는 뜻
+    for collection in sorted({arms[v].collection or "" for v in arms}):
+        cache = get_engine(collection or None).retrieval_cache
+        if cache is not None:
+            print(f"[OK] Retrieval cache ({collection or 'default'}):", cache.stats())
 
+    if failed:
+        print(f"[WARN] {failed} jobs failed - rerun with --resume {session_id}")
     print("[DONE] Logged into experiments/events.db")
 
 
@@ -0,0 +1,95 @@
+"""Bounded, rate-limited worker pool for offline experiment jobs.
+
+LLM/임베딩 호출은 대부분 네트워크 대기 시간이므로 스레드 풀로 동시에 보낸다.
+- concurrency: 동시에 진행하는 작업 수 상한
+- qps: 초당 시작하는 작업 수 상한 (API rate limit 보호)
+- rate limit 에러(429)는 지수 백오프로 재시도
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Optional
+
+
+class RateLimiter:
+    """Spaces call starts so that at most `qps` begin per second (0 = unlimited)."""
+
+    def __init__(self, qps: float = 0):
+        self.interval = 1.0 / qps if qps and qps > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def is_rate_limit_error(exc: BaseException) -> bool:
+    # openai.RateLimitError, fake 백엔드의 FakeRateLimitError, 그 외 HTTP 429
+    if "RateLimit" in type(exc).__name__:
+        return True
+    return getattr(exc, "status_code", None) == 429
+
+
+def call_with_retry(fn: Callable, limiter: RateLimiter | None = None, retries: int = 5,
+                    base_delay: float = 0.5, max_delay: float = 20.0):
+    """Run fn(); on rate-limit errors sleep base_delay * 2**attempt (+jitter) and retry."""
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait()
+        try:
+            return fn()
+        except Exception as exc:
+            if attempt == retries or not is_rate_limit_error(exc):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            time.sleep(delay * (0.5 + random.random()))
+
+
+def run_jobs(jobs: Iterable, work: Callable, on_done: Callable, concurrency: int = 4,
+             qps: float = 0, retries: int = 5, on_error: Optional[Callable] = None) -> int:
+    """Run work(job) for every job in a pool and call on_done(job, result) as each finishes.
+
+    on_done 은 호출한 스레드(메인)에서 실행되므로 DB 기록을 한 곳에서 순서대로 처리할 수 있다.
+    대기 중인 작업은 concurrency 개로 제한해서 작업 목록이 커도 메모리가 일정하다.
+    Returns the number of failed jobs (their errors are printed, or passed to on_error(job, exc); the run continues).
+    """
+    limiter = RateLimiter(qps)
+    failed = 0
+    pending = {}
+    jobs = iter(jobs)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        def submit_next() -> bool:
+            job = next(jobs, None)
+            if job is None:
+                return False
+            fut = pool.submit(call_with_retry, lambda: work(job), limiter, retries)
+            pending[fut] = job
+            return True
+
+        for _ in range(max(1, concurrency)):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                job = pending.pop(fut)
+                try:
+                    on_done(job, fut.result())
+                except Exception as exc:
+                    failed += 1
+                    if on_error is not None:
+                        on_error(job, exc)
+                    else:
+                        print(f"[FAIL] {job}: {type(exc).__name__}: {exc}")
+                submit_next()
+    return failed
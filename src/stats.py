@@ -0,0 +1,220 @@
+"""Significance tests for A/B results (vote rates and latency).
+
+모두 집계값(건수, 히스토그램, 합계)만 입력으로 받는다 - events.db 의 행을 다시 읽지 않으므로 반복 갱신이 빠르다.
+scipy 없이 math / NumPy 만 사용.
+
+- 투표율: Wilson 신뢰구간, two-proportion z-test (+ 차이의 신뢰구간)
+- latency: Mann-Whitney U (히스토그램에서 중앙순위로 계산, tie 보정), 중앙값 차이 bootstrap (NumPy, Poisson 재표본)
+- 순차 모니터링: mSPRT always-valid p-value - 데이터가 쌓이는 중간에 여러 번 봐도 오류율이 유지되어 조기 종료 가능
+"""
+import math
+from typing import TYPE_CHECKING, Iterable, Optional, Sequence, Tuple
+
+# numpy 는 히스토그램 검정 / bootstrap 안에서만 import - 투표율만 보는 명령은 numpy 없이 바로 시작
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def norm_cdf(z: float) -> float:
+    return 0.5 * math.erfc(-z / math.sqrt(2))
+
+
+def norm_ppf(p: float) -> float:
+    """Inverse standard normal CDF (Acklam's rational approximation, |error| < 1.2e-9)."""
+    if not 0 < p < 1:
+        raise ValueError("p must be in (0, 1)")
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+         1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+         6.680131188771972e+01, -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+         -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+    lo = 0.02425
+    if p < lo:
+        q = math.sqrt(-2 * math.log(p))
+        return (((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) * q + c[5]) / \
+               ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1)
+    if p > 1 - lo:
+        return -norm_ppf(1 - p)
+    q = p - 0.5
+    r = q * q
+    return (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+           (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1)
+
+
+def _z(alpha: float) -> float:
+    return norm_ppf(1 - alpha / 2)
+
+
+def wilson_interval(successes: int, n: int, alpha: float = 0.05) -> Tuple[float, float]:
+    """Wilson score interval for a proportion (well-behaved for small n and rates near 0/1)."""
+    if n == 0:
+        return 0.0, 1.0
+    z = _z(alpha)
+    p = successes / n
+    denom = 1 + z * z / n
+    center = (p + z * z / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+    return max(0.0, center - half), min(1.0, center + half)
+
+
+def two_proportion_test(x1: int, n1: int, x2: int, n2: int, alpha: float = 0.05) -> dict:
+    """Two-sided z-test of p2 - p1 (pooled SE), with an unpooled CI for the difference."""
+    if n1 == 0 or n2 == 0:
+        return {"diff": None, "ci": None, "z": None, "p_value": None}
+    p1, p2 = x1 / n1, x2 / n2
+    pooled = (x1 + x2) / (n1 + n2)
+    se_pooled = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    z = (p2 - p1) / se_pooled if se_pooled > 0 else 0.0
+    se = math.sqrt(p1 * (1 - p1) / n1 + p2 * (1 - p2) / n2)
+    half = _z(alpha) * se
+    return {
+        "diff": p2 - p1,
+        "ci": (p2 - p1 - half, p2 - p1 + half),
+        "z": z,
+        "p_value": 2 * (1 - norm_cdf(abs(z))),
+    }
+
+
+def mann_whitney(values1: "np.ndarray", counts1: "np.ndarray", values2: "np.ndarray", counts2: "np.ndarray") -> dict:
+    """Mann-Whitney U test from two histograms (normal approximation with tie correction).
+
+    같은 값끼리는 중앙순위(midrank)를 주므로 서로 다른 값의 개수만큼만 계산한다.
+    prob_2_greater = P(X2 > X1) + 0.5 P(X2 = X1) (common-language effect size).
+    """
+    import numpy as np
+
+    values = np.union1d(values1, values2)
+    c1 = np.zeros(len(values), dtype=np.float64)
+    c2 = np.zeros(len(values), dtype=np.float64)
+    c1[np.searchsorted(values, values1)] = counts1
+    c2[np.searchsorted(values, values2)] = counts2
+    n1, n2 = c1.sum(), c2.sum()
+    if n1 == 0 or n2 == 0:
+        return {"u": None, "z": None, "p_value": None, "prob_2_greater": None}
+    t = c1 + c2
+    midrank = np.cumsum(t) - (t - 1) / 2
+    r2 = float((c2 * midrank).sum())
+    u2 = r2 - n2 * (n2 + 1) / 2
+    n = n1 + n2
+    mean = n1 * n2 / 2
+    tie = float((t ** 3 - t).sum())
+    var = n1 * n2 / 12 * ((n + 1) - tie / (n * (n - 1))) if n > 1 else 0.0
+    z = (u2 - mean) / math.sqrt(var) if var > 0 else 0.0
+    return {
+        "u": u2,
+        "z": z,
+        "p_value": 2 * (1 - norm_cdf(abs(z))),
+        "prob_2_greater": u2 / (n1 * n2),
+    }
+
+
+def _hist_quantile(counts: "np.ndarray", values: "np.ndarray", q: float) -> "np.ndarray":
+    """Nearest-rank quantile for each row of a (B, k) count matrix."""
+    import numpy as np
+
+    cum = np.cumsum(counts, axis=1)
+    rank = np.maximum(1, np.ceil(q * cum[:, -1])).astype(np.int64)
+    return values[np.minimum((cum < rank[:, None]).sum(axis=1), len(values) - 1)]
+
+
+def _poisson_boot_quantile(rng, values: "np.ndarray", counts: "np.ndarray", q: float, b: int) -> "np.ndarray":
+    """q-quantile of b Poisson-bootstrap resamples of a histogram.
+
+    재표본의 분위수는 원래 분위수 근처 칸에서만 나오므로(표준오차 ~ 1/sqrt(n)) 그 창(window) 안의 칸만
+    따로 뽑고, 창 아래/위 칸들의 합은 Poisson 하나씩으로 뽑는다 (독립 Poisson 의 합은 Poisson).
+    비용이 전체 칸 수가 아니라 창 크기에 비례한다.
+    """
+    import numpy as np
+
+    n = int(counts.sum())
+    cum = np.cumsum(counts)
+    delta = 10 / np.sqrt(n)
+    lo = int(np.searchsorted(cum, (q - delta) * n))
+    hi = min(len(counts), int(np.searchsorted(cum, (q + delta) * n)) + 1)
+    below = rng.poisson(cum[lo - 1] if lo > 0 else 0, size=b)
+    above = rng.poisson(n - cum[hi - 1], size=b)
+    mid = np.cumsum(rng.poisson(counts[lo:hi], size=(b, hi - lo)), axis=1) + below[:, None]
+    rank = np.maximum(1, np.ceil(q * (mid[:, -1] + above)))
+    # 창 밖으로 나가는 경우(확률 ~0)는 창 끝 값으로
+    idx = np.minimum((mid < rank[:, None]).sum(axis=1), hi - lo - 1)
+    return values[lo + idx]
+
+
+def bootstrap_quantile_diff(values1: "np.ndarray", counts1: "np.ndarray", values2: "np.ndarray", counts2: "np.ndarray",
+                            q: float = 0.5, n_boot: int = 2000, alpha: float = 0.05, seed: int = 0,
+                            chunk: int = 1024) -> dict:
+    """Bootstrap CI for quantile_q(X2) - quantile_q(X1) from histograms.
+
+    행 단위 재표본 대신 히스토그램 칸별 개수를 Poisson(count) 으로 뽑는다 (Poisson bootstrap - n 이 크면
+    multinomial 재표본과 같은 분포이고, 칸마다 독립이라 벡터화된다). 비용은 행 수와 무관.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    if counts1.sum() == 0 or counts2.sum() == 0:
+        return {"diff": None, "ci": None}
+    diffs = []
+    for start in range(0, n_boot, chunk):
+        b = min(chunk, n_boot - start)
+        diffs.append(_poisson_boot_quantile(rng, values2, counts2, q, b)
+                     - _poisson_boot_quantile(rng, values1, counts1, q, b))
+    diffs = np.concatenate(diffs)
+    point = float(_hist_quantile(counts2[None, :], values2, q)[0] - _hist_quantile(counts1[None, :], values1, q)[0])
+    lo, hi = np.quantile(diffs, [alpha / 2, 1 - alpha / 2])
+    return {"diff": point, "ci": (float(lo), float(hi))}
+
+
+def msprt_lambda(diff: float, var: float, tau2: float) -> float:
+    """Mixture likelihood ratio for H0: diff = 0 with a N(0, tau2) mixing prior (normal approximation)."""
+    if var <= 0:
+        return 1.0
+    log_lr = 0.5 * math.log(var / (var + tau2)) + diff * diff * tau2 / (2 * var * (var + tau2))
+    return math.exp(min(log_lr, 700.0))
+
+
+def always_valid_pvalues(steps: Iterable[Tuple[float, float]], tau2: float) -> list:
+    """Running always-valid p-values for a sequence of cumulative (diff, variance of diff) estimates.
+
+    p_t = min(p_{t-1}, 1 / Lambda_t) - 몇 번을 들여다봐도 p_t < alpha 일 확률은 H0 에서 alpha 이하.
+    """
+    out, p = [], 1.0
+    for diff, var in steps:
+        p = min(p, 1.0 / msprt_lambda(diff, var, tau2))
+        out.append(p)
+    return out
+
+
+def proportion_steps(cumulative: Sequence[Tuple[int, int, int, int]]) -> list:
+    """(x1, n1, x2, n2) cumulative counts -> (diff, var) per look, skipping looks without data."""
+    steps = []
+    for x1, n1, x2, n2 in cumulative:
+        if n1 == 0 or n2 == 0:
+            continue
+        p1, p2 = x1 / n1, x2 / n2
+        # 0% / 100% 인 초반에 분산이 0 이 되지 않도록 0.5 를 더한 추정치 사용
+        q1, q2 = (x1 + 0.5) / (n1 + 1), (x2 + 0.5) / (n2 + 1)
+        steps.append((p2 - p1, q1 * (1 - q1) / n1 + q2 * (1 - q2) / n2))
+    return steps
+
+
+def mean_steps(cumulative: Sequence[Tuple[int, float, float, int, float, float]]) -> list:
+    """(n1, sum1, sumsq1, n2, sum2, sumsq2) cumulative moments -> (mean diff, var) per look."""
+    steps = []
+    for n1, s1, ss1, n2, s2, ss2 in cumulative:
+        if n1 < 2 or n2 < 2:
+            continue
+        m1, m2 = s1 / n1, s2 / n2
+        v1 = max(0.0, (ss1 - n1 * m1 * m1) / (n1 - 1))
+        v2 = max(0.0, (ss2 - n2 * m2 * m2) / (n2 - 1))
+        steps.append((m2 - m1, v1 / n1 + v2 / n2))
+    return steps
+
+
+def sequential_decision(pvalues: Sequence[float], alpha: float = 0.05) -> Optional[int]:
+    """Index of the first look where the always-valid p-value drops below alpha (None = keep running)."""
+    for i, p in enumerate(pvalues):
+        if p < alpha:
+            return i
+    return None
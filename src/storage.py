@@ -1,11 +1,37 @@
+"""Event log (experiments/events.db).
+
+log_event 는 매번 DB 를 열고 닫지 않는다. 프로세스당 WAL 모드 연결 하나를 재사용하고,
+이벤트는 큐에 넣어서 백그라운드 writer 스레드가 executemany 로 모아서 기록한다.
+- batch 가 EVENT_LOG_BATCH_SIZE 개 모이거나 EVENT_LOG_FLUSH_MS 가 지나면 flush
+- 프로세스 종료 시(atexit) 남은 이벤트 flush
+- EVENT_LOG_BUFFERED=0 이거나 log_event(..., sync=True) 면 바로 기록 (동기 fallback)
+
+스키마 (PRAGMA user_version 으로 버전 관리, 연결할 때 migrate() 가 최신 버전으로 올림):
+- queries: 질문 1건 = 1행. query_id 는 클라이언트(log_query)가 만든 uuid 라서 버퍼링해도 바로 투표에 연결 가능
+           단계별 시간(ms)과 토큰 수(prompt / completion / context)도 같이 저장
+- votes:   투표 1건 = 1행 (query_id 로 queries 와 연결, 질문/답변을 다시 저장하지 않음)
+- events:  예전 코드/노트북용 호환 view (queries + votes 를 예전 events 행 모양으로)
+- spans:   src/tracing.py 의 단계별 구간 (trace_id 로 한 요청의 span 들을 묶음, parent_id 로 중첩)
+- v6: queries.retrieval_cache_hit - 검색 결과 캐시로 임베딩/검색을 건너뛴 질문 (답변 캐시 hit 처럼 latency 분석에서 제외)
+시간은 정수 epoch ms(ts_ms), (experiment, variant, ts_ms) 인덱스로 실험별 집계가 전체 스캔을 하지 않는다.
+"""
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+import time
+import uuid
 from pathlib import Path
-from datetime import datetime
+
+from src.config import EVENT_LOG_BATCH_SIZE, EVENT_LOG_BUFFERED, EVENT_LOG_FLUSH_MS
 
 DB_PATH = Path("experiments") / "events.db"
 
-# 스키마 작성(컬럼작성)
-SCHEMA = """
+SCHEMA_VERSION = 6
+
+# v1: 질문/투표를 한 테이블에 저장하던 예전 스키마 - migration 에서만 사용
+V1_EVENTS_SCHEMA = """
 CREATE TABLE IF NOT EXISTS events (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
   ts TEXT NOT NULL,
@@ -18,16 +44,488 @@ CREATE TABLE IF NOT EXISTS events (
   citations TEXT,
   source_pages TEXT,
   answer TEXT,
-  user_vote TEXT  
+  user_vote TEXT
+);
+"""
+
+# v1 에 나중에 추가된 컬럼들 - 예전 events.db 에는 ALTER TABLE 로 붙인 뒤 v2 로 옮긴다
+ADDED_COLUMNS = {
+    "embed_ms": "REAL",
+    "retrieve_ms": "REAL",
+    "generate_ms": "REAL",
+    "shared_retrieval_ms": "REAL",
+    # 답변 캐시 hit 여부 ("exact" / "semantic"), latency 분석에서 제외하기 위함
+    "cache_hit": "TEXT",
+    # 스트리밍 응답의 첫 토큰까지 시간 (generate_ms 는 전체 생성 시간)
+    "ttft_ms": "REAL",
+    # 검색 백엔드 (chroma / bm25 / hybrid ...) - retriever 를 A/B variant 로 비교할 때
+    "retriever": "TEXT",
+}
+
+# queries 의 측정 컬럼 (events view 와 migration 에서 같은 순서로 사용)
+QUERY_COLUMNS = ("session_id", "experiment", "variant", "question", "top_k", "latency_ms", "citations",
+                 "source_pages", "answer") + tuple(ADDED_COLUMNS)
+
+# v4: 토큰 수 (src/context.py 가 문맥을 토큰 예산으로 자른 결과) - latency / 비용 비교용
+USAGE_COLUMNS = {
+    "prompt_tokens": "INTEGER",
+    "completion_tokens": "INTEGER",
+    "context_tokens": "INTEGER",
+}
+
+V2_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+  query_id TEXT PRIMARY KEY,
+  ts_ms INTEGER NOT NULL,
+  session_id TEXT,
+  experiment TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  question TEXT,
+  top_k INTEGER,
+  latency_ms INTEGER,
+  citations TEXT,
+  source_pages TEXT,
+  answer TEXT,
+  embed_ms REAL,
+  retrieve_ms REAL,
+  generate_ms REAL,
+  shared_retrieval_ms REAL,
+  cache_hit TEXT,
+  ttft_ms REAL,
+  retriever TEXT
+);
+-- cache_hit, latency_ms 까지 넣어서 latency 집계가 테이블을 읽지 않고 인덱스만으로 끝나도록 (covering index)
+CREATE INDEX IF NOT EXISTS idx_queries_exp_variant_ts ON queries (experiment, variant, ts_ms, cache_hit, latency_ms);
+CREATE INDEX IF NOT EXISTS idx_queries_session ON queries (session_id, experiment);
+
+-- experiment/variant 는 join 없이 투표를 집계하려고 같이 저장 (질문/답변 본문은 저장하지 않음)
+CREATE TABLE IF NOT EXISTS votes (
+  id INTEGER PRIMARY KEY,
+  query_id TEXT NOT NULL REFERENCES queries (query_id),
+  ts_ms INTEGER NOT NULL,
+  session_id TEXT,
+  experiment TEXT NOT NULL,
+  variant TEXT NOT NULL,
+  vote TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_votes_exp_variant_ts ON votes (experiment, variant, ts_ms);
+CREATE INDEX IF NOT EXISTS idx_votes_query ON votes (query_id);
+"""
+
+_Q = ", ".join(f"q.{c}" for c in QUERY_COLUMNS[4:])
+EVENTS_VIEW = f"""
+CREATE VIEW events AS
+SELECT q.rowid AS id, strftime('%Y-%m-%dT%H:%M:%f', q.ts_ms / 1000.0, 'unixepoch') AS ts,
+       q.session_id, q.experiment, q.variant, q.question, {_Q.replace("q.answer", "q.answer, NULL AS user_vote")},
+       q.query_id
+FROM queries q
+UNION ALL
+SELECT NULL, strftime('%Y-%m-%dT%H:%M:%f', v.ts_ms / 1000.0, 'unixepoch'),
+       v.session_id, q.experiment, q.variant, q.question, {_Q.replace("q.answer", "q.answer, v.vote")},
+       q.query_id
+FROM votes v JOIN queries q ON q.query_id = v.query_id
+"""
+
+
+def _migrate_1(conn):
+    """v0 -> v1: the legacy events table with every later-added column."""
+    conn.execute(V1_EVENTS_SCHEMA)
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+    for name, col_type in ADDED_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE events ADD COLUMN {name} {col_type}")
+
+
+def _v1_columns(alias: str) -> str:
+    # v2 에서는 experiment/variant 가 NOT NULL
+    return ", ".join(f"COALESCE({alias}.{c}, '')" if c in ("experiment", "variant") else f"{alias}.{c}"
+                     for c in QUERY_COLUMNS)
+
+
+def _v1_ts_ms(alias: str) -> str:
+    # ISO 문자열(UTC) -> epoch ms
+    return f"CAST(ROUND((julianday({alias}.ts) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def _migrate_2(conn):
+    """v1 -> v2: split events into queries + votes; events becomes a view."""
+    for stmt in V2_SCHEMA.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+    cols = ", ".join(QUERY_COLUMNS)
+    # 질문 행 -> queries (query_id 는 예전 id 로 만듦)
+    conn.execute(f"""
+        INSERT INTO queries (query_id, ts_ms, {cols})
+        SELECT 'v1-' || e.id, {_v1_ts_ms("e")}, {_v1_columns("e")}
+        FROM events e WHERE e.user_vote IS NULL
+    """)
+    # 투표 행 -> 같은 세션에서 바로 앞에 기록된 같은 질문의 query 에 연결
+    conn.execute("CREATE INDEX tmp_events_lookup ON events (session_id, experiment, variant, question, id)")
+    conn.execute("""
+        CREATE TEMP TABLE vote_map AS
+        SELECT v.id AS vid, (
+            SELECT 'v1-' || q.id FROM events q
+            WHERE q.user_vote IS NULL AND q.session_id IS v.session_id AND q.experiment IS v.experiment
+              AND q.variant IS v.variant AND q.question IS v.question AND q.id < v.id
+            ORDER BY q.id DESC LIMIT 1
+        ) AS query_id
+        FROM events v WHERE v.user_vote IS NOT NULL
+    """)
+    # 연결할 질문이 없는 투표는 투표 행 자체를 query 로 보존
+    conn.execute(f"""
+        INSERT INTO queries (query_id, ts_ms, {cols})
+        SELECT 'v1-' || e.id, {_v1_ts_ms("e")}, {_v1_columns("e")}
+        FROM vote_map m JOIN events e ON e.id = m.vid WHERE m.query_id IS NULL
+    """)
+    conn.execute(f"""
+        INSERT INTO votes (query_id, ts_ms, session_id, experiment, variant, vote)
+        SELECT COALESCE(m.query_id, 'v1-' || e.id), {_v1_ts_ms("e")}, e.session_id,
+               COALESCE(e.experiment, ''), COALESCE(e.variant, ''), e.user_vote
+        FROM vote_map m JOIN events e ON e.id = m.vid
+    """)
+    conn.execute("DROP TABLE vote_map")
+    conn.execute("DROP TABLE events")
+    conn.execute(EVENTS_VIEW)
+
+
+def _migrate_3(conn):
+    """v2 -> v3: indexes for SQL-side latency histograms and vote counts (src/analytics.py)."""
+    # (experiment, variant, cache_hit) 가 같으면 latency_ms 순서로 정렬된 인덱스 - GROUP BY latency_ms 가 정렬 없이 스트리밍됨
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_queries_latency_hist
+        ON queries (experiment, variant, cache_hit, latency_ms, ts_ms)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_votes_exp_variant_ts")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_votes_exp_variant_ts ON votes (experiment, variant, ts_ms, vote)")
+
+
+def _migrate_4(conn):
+    """v3 -> v4: token counts per query (prompt / completion / packed context)."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(queries)")}
+    for name, col_type in USAGE_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE queries ADD COLUMN {name} {col_type}")
+
+
+SPANS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+  trace_id TEXT NOT NULL,
+  span_id INTEGER NOT NULL,
+  parent_id INTEGER,
+  name TEXT NOT NULL,
+  ts_ms INTEGER NOT NULL,
+  duration_ms REAL NOT NULL,
+  attrs TEXT
 );
+CREATE INDEX IF NOT EXISTS idx_spans_name_ts ON spans (name, ts_ms, duration_ms);
+CREATE INDEX IF NOT EXISTS idx_spans_trace ON spans (trace_id);
 """
 
+
+def _migrate_5(conn):
+    """v4 -> v5: spans table for per-stage tracing (src/tracing.py)."""
+    for stmt in SPANS_SCHEMA.split(";"):
+        if stmt.strip():
+            conn.execute(stmt)
+
+
+def _migrate_6(conn):
+    """v5 -> v6: retrieval_cache_hit per query; the latency histogram index also covers it."""
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(queries)")}
+    if "retrieval_cache_hit" not in existing:
+        conn.execute("ALTER TABLE queries ADD COLUMN retrieval_cache_hit INTEGER")
+    # 캐시 hit 제외 조건이 두 컬럼이 되어도 latency 히스토그램이 인덱스만 읽도록
+    conn.execute("DROP INDEX IF EXISTS idx_queries_latency_hist")
+    conn.execute("""
+        CREATE INDEX idx_queries_latency_hist
+        ON queries (experiment, variant, cache_hit, retrieval_cache_hit, latency_ms, ts_ms)
+    """)
+
+
+# (버전, 함수) - 새 스키마 변경은 여기에 추가
+MIGRATIONS = [(1, _migrate_1), (2, _migrate_2), (3, _migrate_3), (4, _migrate_4), (5, _migrate_5),
+              (6, _migrate_6)]
+
+
+def migrate(conn) -> int:
+    """Bring the DB up to SCHEMA_VERSION; returns the version it started from."""
+    start = conn.execute("PRAGMA user_version").fetchone()[0]
+    if start >= SCHEMA_VERSION:
+        return start
+    # 여러 프로세스가 동시에 열어도 한 곳만 migration 하도록 쓰기 잠금을 잡고 다시 확인
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, step in MIGRATIONS:
+            if version < target:
+                step(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return start
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # timeout: 다른 프로세스가 쓰는 중이면 바로 "database is locked" 를 내지 않고 기다림
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    # WAL: 읽기(analyze, UI)와 쓰기가 서로 막지 않음. NORMAL 은 WAL 에서 충분히 안전하고 fsync 가 적음
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate(conn)
+    return conn
+
+
 def get_conn():
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute(SCHEMA)
+    """New connection for readers (analyze, plots); the caller closes it."""
+    return _connect(DB_PATH)
+
+
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+def _pooled_conn() -> sqlite3.Connection:
+    """The process-wide write connection for the current DB_PATH (opened once)."""
+    path = Path(DB_PATH)
+    conn = _pool.get(path)
+    if conn is None:
+        with _pool_lock:
+            conn = _pool.get(path)
+            if conn is None:
+                conn = _pool[path] = _connect(path)
     return conn
 
+
+_write_lock = threading.Lock()
+
+
+def _write(batch) -> None:
+    """Insert [(sql, params), ...] in one transaction, one executemany per statement."""
+    by_sql = {}
+    for sql, params in batch:
+        by_sql.setdefault(sql, []).append(params)
+    conn = _pooled_conn()
+    # 한 연결을 여러 스레드(writer, 동기 호출)가 같이 쓰므로 트랜잭션 단위로 잠금
+    with _write_lock, conn:
+        for sql, rows in by_sql.items():
+            conn.executemany(sql, rows)
+
+
+# flush() 가 큐에 넣는 표시 - writer 가 flush_ms 를 기다리지 않고 바로 기록하게 함
+_FLUSH = object()
+
+
+class EventWriter:
+    """Background thread that drains a queue of (sql, params) into SQLite in batches."""
+
+    def __init__(self, batch_size: int = EVENT_LOG_BATCH_SIZE, flush_ms: float = EVENT_LOG_FLUSH_MS):
+        self.batch_size = batch_size
+        self.flush_s = flush_ms / 1000
+        self.queue = queue.Queue()
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, sql: str, params) -> None:
+        self.queue.put((sql, params))
+
+    def _run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            if item is _FLUSH:
+                self.queue.task_done()
+                continue
+            batch = [item]
+            # 첫 이벤트 이후 flush_s 동안 또는 batch_size 개까지 모아서 한 번에 기록
+            deadline = time.monotonic() + self.flush_s
+            stop = False
+            markers = 0
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    nxt = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                if nxt is _FLUSH:
+                    markers += 1
+                    break
+                batch.append(nxt)
+            try:
+                _write(batch)
+                self.written += len(batch)
+            except Exception as e:
+                # 로깅 실패로 질문 처리가 죽지 않도록 - 건수만 남김
+                self.failed += len(batch)
+                print(f"[WARN] event log write failed ({len(batch)} events): {e}")
+            for _ in range(len(batch) + stop + markers):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self) -> None:
+        """Block until everything queued so far is written."""
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> EventWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = EventWriter()
+                atexit.register(close)
+    return _writer
+
+
+def flush() -> None:
+    """Write out buffered events (call before reading events in the same process)."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def close() -> None:
+    """Flush buffered events and close pooled connections (registered with atexit)."""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+    with _pool_lock:
+        for conn in _pool.values():
+            conn.close()
+        _pool.clear()
+
+
+def _after_fork() -> None:
+    # fork 된 자식(ProcessPoolExecutor 워커)은 writer 스레드 없이 부모의 큐와 연결만 물려받음 -> 자식에서 새로 열게 비움
+    global _writer
+    _writer = None
+    _pool.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _submit(sql: str, params, sync) -> None:
+    if sync is None:
+        sync = not EVENT_LOG_BUFFERED
+    if sync:
+        _write([(sql, params)])
+    else:
+        get_writer().put(sql, params)
+
+
+INSERT_QUERY = f"""
+INSERT INTO queries (query_id, ts_ms, {", ".join(QUERY_COLUMNS + tuple(USAGE_COLUMNS))}, retrieval_cache_hit)
+VALUES ({", ".join("?" * (len(QUERY_COLUMNS) + len(USAGE_COLUMNS) + 3))})
+"""
+INSERT_VOTE = """
+INSERT INTO votes (query_id, ts_ms, session_id, experiment, variant, vote)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+INSERT_SPAN = """
+INSERT INTO spans (trace_id, span_id, parent_id, name, ts_ms, duration_ms, attrs)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def new_query_id() -> str:
+    return uuid.uuid4().hex
+
+
+def log_query(
+    session_id: str,
+    experiment: str,
+    variant: str,
+    question: str,
+    top_k: int,
+    latency_ms: int,
+    citations: str,
+    source_pages: str,
+    answer: str,
+    timings: dict | None = None,
+    cache_hit: str | None = None,
+    retriever: str | None = None,
+    usage: dict | None = None,
+    query_id: str | None = None,
+    sync: bool | None = None,
+) -> str:
+    """Log one answered question; returns its query_id (pass it to log_vote)."""
+    query_id = query_id or new_query_id()
+    # 단계별 시간(engine 의 RagResult.timings) / 토큰 수(RagResult.usage), 없으면 NULL
+    timings = timings or {}
+    usage = usage or {}
+    # (?,) 는 입력값을 단순한 글자로 취습, SQL 인젝션 공격을 막음, Parameter binding
+    _submit(
+        INSERT_QUERY,
+        (query_id, now_ms(), session_id, experiment, variant, question, top_k, latency_ms, citations, source_pages,
+         answer, timings.get("embed_ms"), timings.get("retrieve_ms"), timings.get("generate_ms"),
+         timings.get("shared_retrieval_ms"), cache_hit, timings.get("ttft_ms"), retriever)
+        + tuple(usage.get(c) for c in USAGE_COLUMNS)
+        # 검색 결과 캐시 hit 이면 1, 아니면 NULL (cache_hit 처럼 IS NULL 로 거름)
+        + (1 if "retrieval_cache_saved_ms" in timings else None,),
+        sync,
+    )
+    return query_id
+
+
+def log_vote(query_id: str, session_id: str, experiment: str, variant: str, vote: str,
+             sync: bool | None = None) -> None:
+    """Log a thumbs up/down for a query logged earlier with log_query."""
+    _submit(INSERT_VOTE, (query_id, now_ms(), session_id, experiment, variant, vote), sync)
+
+
+def log_span(trace_id: str, span_id: int, parent_id, name: str, ts_ms: int, duration_ms: float,
+             attrs: str | None = None, sync: bool | None = None) -> None:
+    """Log one finished tracing span (attrs is a JSON string)."""
+    _submit(INSERT_SPAN, (trace_id, span_id, parent_id, name, ts_ms, duration_ms, attrs), sync)
+
+
+def span_durations(since_ms: int | None = None, names=None) -> dict:
+    """{span name: [duration_ms, ...]} for spans started at or after since_ms."""
+    flush()
+    where, params = ["1 = 1"], []
+    if since_ms is not None:
+        where.append("ts_ms >= ?")
+        params.append(since_ms)
+    if names:
+        where.append(f"name IN ({_in_clause(names)})")
+        params.extend(names)
+    conn = get_conn()
+    out = {}
+    for name, duration in conn.execute(
+        f"SELECT name, duration_ms FROM spans WHERE {' AND '.join(where)} ORDER BY name", params
+    ):
+        out.setdefault(name, []).append(duration)
+    conn.close()
+    return out
+
+
 def log_event(
     session_id: str,
     experiment: str,
@@ -39,16 +537,71 @@ def log_event(
     source_pages: str,
     answer: str,
     user_vote: str | None = None,
-):
-    ts = datetime.utcnow().isoformat()
+    timings: dict | None = None,
+    cache_hit: str | None = None,
+    retriever: str | None = None,
+    sync: bool | None = None,
+) -> str:
+    """Old single-call API: logs a query (and a vote on it if user_vote is set)."""
+    query_id = log_query(session_id, experiment, variant, question, top_k, latency_ms, citations, source_pages,
+                         answer, timings=timings, cache_hit=cache_hit, retriever=retriever, sync=sync)
+    if user_vote is not None:
+        log_vote(query_id, session_id, experiment, variant, user_vote, sync=sync)
+    return query_id
+
+
+def logged_jobs(session_id: str, experiment: str) -> set:
+    """(question, variant) pairs already answered in a session - used to resume a crashed run."""
+    flush()
+    conn = get_conn()
+    rows = conn.execute(
+        """
+        SELECT DISTINCT question, variant
+        FROM queries
+        WHERE session_id = ? AND experiment = ?
+        """,
+        (session_id, experiment),
+    ).fetchall()
+    conn.close()
+    return set(rows)
+
+
+def _in_clause(values) -> str:
+    return ", ".join("?" * len(values))
+
+
+def vote_counts(experiments=None) -> list:
+    """(experiment, variant, vote, count) rows, optionally for some experiments only."""
+    flush()
+    where, params = "", []
+    if experiments is not None:
+        params = list(experiments)
+        where = f"WHERE experiment IN ({_in_clause(params)})"
+    conn = get_conn()
+    rows = conn.execute(
+        f"""
+        SELECT experiment, variant, vote, COUNT(*)
+        FROM votes {where}
+        GROUP BY experiment, variant, vote
+        ORDER BY COUNT(*) DESC
+        """,
+        params,
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def experiment_counts() -> list:
+    """(experiment, queries, votes) per experiment."""
+    flush()
     conn = get_conn()
-    with conn:
-        # (?,) 는 입력값을 단순한 글자로 취습, SQL 인젝션 공격을 막음, Parameter binding
-        conn.execute(
-            """
-            INSERT INTO events (ts, session_id, experiment, variant, question, top_k, latency_ms, citations, source_pages, answer, user_vote)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (ts, session_id, experiment, variant, question, top_k, latency_ms, citations, source_pages, answer, user_vote),         
-        )
+    rows = conn.execute(
+        """
+        SELECT q.experiment, q.n, COALESCE(v.n, 0)
+        FROM (SELECT experiment, COUNT(*) AS n FROM queries GROUP BY experiment) q
+        LEFT JOIN (SELECT experiment, COUNT(*) AS n FROM votes GROUP BY experiment) v USING (experiment)
+        ORDER BY q.n DESC
+        """
+    ).fetchall()
     conn.close()
+    return rows
@@ -0,0 +1,156 @@
+"""Local OpenAI-compatible stub server for load tests (/v1/embeddings, /v1/chat/completions).
+
+RAG_BACKEND=stub 이면 실제 OpenAIEmbeddings / ChatOpenAI 클라이언트가 이 서버(STUB_BASE_URL)로 요청을 보낸다.
+응답 내용과 지연시간은 fake 백엔드와 같다 (FakeEmbeddings / FakeChatModel, FAKE_* 설정, seed 고정).
+fake 백엔드와 달리 HTTP 커넥션 풀, JSON 직렬화, SSE 스트리밍, 429 재시도 같은 클라이언트 비용이 측정에 포함된다.
+부하를 거는 프로세스와 GIL 을 나눠 쓰지 않도록 별도 프로세스로 띄운다 (src.loadtest --start-stub).
+
+    python -m src.stub_server --port 8765 --embed-ms 30 --llm-ms 800 --dist lognormal
+"""
+import argparse
+import base64
+import itertools
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.config import FAKE_EMBED_LATENCY_MS, FAKE_LATENCY_DIST, FAKE_LLM_LATENCY_MS, FAKE_RATE_LIMIT_RATE
+from src.fake_backend import LATENCY_DISTS, FakeChatModel, FakeEmbeddings, FakeRateLimitError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive: 클라이언트 커넥션 풀이 실제 API 처럼 연결을 재사용
+    protocol_version = "HTTP/1.1"
+    embeddings: FakeEmbeddings = None
+    llm: FakeChatModel = None
+    requests = 0
+    _count_lock = threading.Lock()
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/health"):
+            self._send_json(200, {"status": "ok", "requests": StubHandler.requests})
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_POST(self):
+        with StubHandler._count_lock:
+            StubHandler.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        elif self.path.endswith("/chat/completions"):
+            try:
+                self._chat(body)
+            except FakeRateLimitError as e:
+                self._send_json(429, {"error": {"message": str(e), "type": "rate_limit_error"}})
+        else:
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _embeddings(self, body: dict) -> None:
+        texts = body.get("input", [])
+        texts = [texts] if isinstance(texts, str) else texts
+        vectors = self.embeddings.embed_documents(texts)
+        # openai 클라이언트는 기본으로 base64(float32) 응답을 요청함
+        if body.get("encoding_format") == "base64":
+            data = [base64.b64encode(np.asarray(v, dtype=np.float32).tobytes()).decode("ascii") for v in vectors]
+        else:
+            data = vectors
+        n_tokens = sum(len(t.split()) for t in texts)
+        self._send_json(200, {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": e} for i, e in enumerate(data)],
+            "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+        })
+
+    def _chat(self, body: dict) -> None:
+        messages = body.get("messages", [])
+        model = body.get("model")
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": model}
+        if not body.get("stream"):
+            answer = self.llm.invoke(messages).content
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(answer.split()),
+                          "total_tokens": len(answer.split())},
+            })
+            return
+        # 스트리밍: SSE 를 chunked 전송으로 (첫 조각 전에 rate limit 이면 위에서 429)
+        chunks = self.llm.stream(messages)
+        first = next(chunks, None)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for chunk in itertools.chain([first] if first is not None else [], chunks):
+            delta = {"object": "chat.completion.chunk", **base,
+                     "choices": [{"index": 0, "delta": {"content": chunk.content}, "finish_reason": None}]}
+            self._chunk(f"data: {json.dumps(delta)}\n\n".encode("utf-8"))
+        done = {"object": "chat.completion.chunk", **base,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self._chunk(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self._chunk(b"")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 부하 생성기가 끝나면서 keep-alive 연결을 끊는 것은 정상 - traceback 을 찍지 않음
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)
+
+
+def make_server(port: int, embed_ms: float, llm_ms: float, dist: str, rate_limit_rate: float) -> StubServer:
+    StubHandler.embeddings = FakeEmbeddings(latency_ms=embed_ms, init_ms=0, dist=dist)
+    StubHandler.llm = FakeChatModel(latency_ms=llm_ms, init_ms=0, rate_limit_rate=rate_limit_rate, dist=dist)
+    return StubServer(("127.0.0.1", port), StubHandler)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--embed-ms", type=float, default=FAKE_EMBED_LATENCY_MS, help="Mean embedding call latency")
+    ap.add_argument("--llm-ms", type=float, default=FAKE_LLM_LATENCY_MS, help="Mean chat completion latency")
+    ap.add_argument("--dist", choices=LATENCY_DISTS, default=FAKE_LATENCY_DIST, help="Latency distribution")
+    ap.add_argument("--rate-limit-rate", type=float, default=FAKE_RATE_LIMIT_RATE,
+                    help="Fraction of chat calls answered with HTTP 429")
+    args = ap.parse_args()
+
+    server = make_server(args.port, args.embed_ms, args.llm_ms, args.dist, args.rate_limit_rate)
+    print(f"[OK] stub OpenAI server on http://127.0.0.1:{args.port}/v1 | embed_ms={args.embed_ms} "
+          f"llm_ms={args.llm_ms} dist={args.dist}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Token counting with tiktoken (falls back to a ~4 chars/token estimate offline)."""
+from functools import lru_cache
+
+from src.config import EMBEDDING_MODEL
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = EMBEDDING_MODEL):
+    """tiktoken encoding for a model, or None if the BPE file can't be loaded (no network/cache)."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = EMBEDDING_MODEL) -> int:
+    enc = get_encoding(model)
+    if enc is None:
+        # 오프라인 등으로 tiktoken 파일을 못 받으면 영어 기준 대략 4글자 = 1토큰
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = EMBEDDING_MODEL) -> str:
+    """First max_tokens tokens of text."""
+    enc = get_encoding(model)
+    if enc is None:
+        return text[: max_tokens * 4]
+    ids = enc.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else enc.decode(ids[:max_tokens])
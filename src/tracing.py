@@ -0,0 +1,330 @@
+"""Lightweight per-stage tracing: nested spans around ingest, retrieval and generation.
+
+    from src import tracing
+    with tracing.span("retrieve", retriever="chroma", k=4):
+        ...
+
+TRACING=1 일 때만 기록한다. 꺼져 있으면 span() 은 아무 일도 하지 않는 같은 객체를 돌려주므로
+비용은 함수 호출 1번 정도 (python -m src.tracing --overhead 로 확인).
+부모 span 은 contextvars 로 추적한다. 스레드 풀로 넘기는 함수는 bind() 로 감싸야 부모 trace 에 붙는다.
+끝난 span 은 TRACE_SINK 에 따라 events.db 의 spans 테이블(이벤트 로그와 같은 버퍼 writer) 또는
+TRACE_FILE(JSONL) 에 기록한다.
+
+    python -m src.tracing --report                    # span 이름별 count / p50 / p95 / p99 / 합계
+    python -m src.tracing --report --since-hours 1
+    python -m src.tracing --profile "What is overfitting?"   # cProfile(.prof) + 샘플링 스택(.folded) 저장
+"""
+import argparse
+import contextvars
+import cProfile
+import functools
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from src.config import TRACE_FILE, TRACE_SINK, TRACING_ENABLED
+
+_enabled = TRACING_ENABLED
+_sink = TRACE_SINK
+# 현재 열려 있는 span (trace_id, span_id)
+_current: contextvars.ContextVar = contextvars.ContextVar("span", default=None)
+_ids = itertools.count(1)
+_file = None
+_file_lock = threading.Lock()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    """One timed stage; nested spans share the trace_id of the outermost one."""
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "ts_ms", "_t0", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            self.trace_id, self.parent_id = os.urandom(8).hex(), None
+        else:
+            self.trace_id, self.parent_id = parent
+        self.span_id = next(_ids)
+        self._token = _current.set((self.trace_id, self.span_id))
+        self.ts_ms = int(time.time() * 1000)
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_ms = (time.perf_counter() - self._t0) * 1000
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _emit(self, duration_ms)
+        return False
+
+    def set(self, **attrs) -> None:
+        """Attach attributes known only after the span started (e.g. result sizes)."""
+        self.attrs.update(attrs)
+
+
+def span(name: str, **attrs):
+    """Context manager timing one stage (a shared no-op object when tracing is off)."""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def record(name: str, t0: float, parent=None, **attrs) -> None:
+    """Emit a span that started at perf_counter() t0 and ends now, under parent (a Span) if given.
+
+    generator 처럼 with 블록으로 감쌀 수 없는 구간용 (스트리밍 답변의 LLM 구간 등).
+    """
+    if not _enabled or parent is _NOOP:
+        return
+    s = Span(name, attrs)
+    s.span_id = next(_ids)
+    if parent is not None:
+        s.trace_id, s.parent_id = parent.trace_id, parent.span_id
+    else:
+        cur = _current.get()
+        s.trace_id, s.parent_id = cur if cur else (os.urandom(8).hex(), None)
+    duration_ms = (time.perf_counter() - t0) * 1000
+    s.ts_ms = int(time.time() * 1000 - duration_ms)
+    _emit(s, duration_ms)
+
+
+def bind(fn):
+    """fn that runs inside the caller's current span when submitted to a thread pool."""
+    if not _enabled:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def enable(sink: Optional[str] = None) -> None:
+    global _enabled
+    _enabled = True
+    if sink:
+        set_sink(sink)
+
+
+def set_sink(sink: str) -> None:
+    global _sink
+    if sink not in ("db", "jsonl"):
+        raise ValueError(f"Unknown trace sink: {sink!r} (expected db or jsonl)")
+    _sink = sink
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def current_trace_id() -> Optional[str]:
+    cur = _current.get()
+    return cur[0] if cur else None
+
+
+def _emit(s: Span, duration_ms: float) -> None:
+    # 값이 없는 속성(기본값 None 인 인자 등)은 저장하지 않음
+    s.attrs = {k: v for k, v in s.attrs.items() if v is not None}
+    attrs = json.dumps(s.attrs, default=str) if s.attrs else None
+    if _sink == "jsonl":
+        global _file
+        line = json.dumps({"trace_id": s.trace_id, "span_id": s.span_id, "parent_id": s.parent_id, "name": s.name,
+                           "ts_ms": s.ts_ms, "duration_ms": round(duration_ms, 3), "attrs": s.attrs}, default=str)
+        with _file_lock:
+            if _file is None:
+                TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+                # 줄 단위 버퍼 - 프로세스가 죽어도 끝난 span 은 남음
+                _file = open(TRACE_FILE, "a", encoding="utf-8", buffering=1)
+            _file.write(line + "\n")
+        return
+    from src.storage import log_span
+
+    log_span(s.trace_id, s.span_id, s.parent_id, s.name, s.ts_ms, round(duration_ms, 3), attrs)
+
+
+def flush() -> None:
+    """Write out buffered spans (process-pool workers exit without running atexit)."""
+    if not _enabled:
+        return
+    if _sink == "jsonl":
+        with _file_lock:
+            if _file is not None:
+                _file.flush()
+        return
+    from src import storage
+
+    storage.flush()
+
+
+def _jsonl_durations(since_ms: Optional[int]) -> dict:
+    out = {}
+    if not TRACE_FILE.exists():
+        return out
+    with open(TRACE_FILE, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if since_ms is None or row["ts_ms"] >= since_ms:
+                out.setdefault(row["name"], []).append(row["duration_ms"])
+    return out
+
+
+def report(since_ms: Optional[int] = None) -> list:
+    """Per span name: count, p50/p95/p99/max and total time."""
+    if _sink == "jsonl":
+        durations = _jsonl_durations(since_ms)
+    else:
+        from src.storage import span_durations
+
+        durations = span_durations(since_ms)
+    rows = []
+    for name, xs in durations.items():
+        a = np.asarray(xs, dtype=np.float64)
+        p50, p95, p99 = np.percentile(a, [50, 95, 99])
+        rows.append({"span": name, "count": len(a), "p50_ms": round(p50, 2), "p95_ms": round(p95, 2),
+                     "p99_ms": round(p99, 2), "max_ms": round(a.max(), 2), "total_s": round(a.sum() / 1000, 2)})
+    rows.sort(key=lambda r: -r["total_s"])
+    cols = ["span", "count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_s"]
+    if rows:
+        widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+        print("  ".join(c.rjust(widths[c]) for c in cols))
+        for r in rows:
+            print("  ".join(str(r[c]).rjust(widths[c]) for c in cols))
+    else:
+        print("[OK] no spans recorded (run with TRACING=1)")
+    return rows
+
+
+class StackSampler:
+    """Samples one thread's Python stack every interval_s; writes flamegraph 'folded' stacks (a;b;c count)."""
+
+    def __init__(self, thread_id: int, interval_s: float = 0.001):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{Path(code.co_filename).stem}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def write(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def profile_query(question: str, out: Path, top_k: int = 4, retriever: Optional[str] = None,
+                  repeat: int = 1) -> None:
+    """Answer a question under cProfile and a stack sampler; spans of the run are printed too."""
+    from src.engine import get_engine
+
+    enable()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    # 클라이언트 생성(엔진 초기화)도 프로파일에 포함 - 첫 질문 p99 의 흔한 원인
+    prof = cProfile.Profile()
+    since = int(time.time() * 1000)
+    with StackSampler(threading.get_ident()) as sampler:
+        prof.enable()
+        engine = get_engine()
+        for _ in range(repeat):
+            engine.answer(question, top_k=top_k, retriever=retriever, use_cache=False)
+        prof.disable()
+    prof.dump_stats(str(out.with_suffix(".prof")))
+    sampler.write(out.with_suffix(".folded"))
+    print(f"[OK] cProfile: {out.with_suffix('.prof')} (snakeviz / flameprof / python -m pstats)")
+    print(f"[OK] sampled stacks: {out.with_suffix('.folded')} ({sum(sampler.counts.values())} samples, "
+          f"flamegraph.pl / speedscope)")
+    report(since)
+
+
+def overhead(n: int = 200_000) -> None:
+    """Cost of span() when tracing is disabled vs an empty loop."""
+    was = _enabled
+    disable()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pass
+    base = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with span("x", k=1):
+            pass
+    off = time.perf_counter() - t0
+    print(f"[OK] disabled span: {(off - base) / n * 1e9:.0f} ns per span")
+    if was:
+        enable()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--report", action="store_true", help="Per-stage latency percentiles from recorded spans")
+    ap.add_argument("--since-hours", type=float, default=0, help="Only spans from the last N hours (0 = all)")
+    ap.add_argument("--sink", choices=("db", "jsonl"), help="Where spans were written (default: TRACE_SINK)")
+    ap.add_argument("--profile", metavar="QUESTION", help="Profile one query (cProfile + sampled stacks)")
+    ap.add_argument("--out", default="experiments/profile/query", help="Profile output path (without suffix)")
+    ap.add_argument("--top_k", type=int, default=4)
+    ap.add_argument("--retriever")
+    ap.add_argument("--repeat", type=int, default=1, help="Answer the question this many times while profiling")
+    ap.add_argument("--overhead", action="store_true", help="Measure the cost of a disabled span")
+    args = ap.parse_args()
+
+    if args.sink:
+        set_sink(args.sink)
+    if args.overhead:
+        overhead()
+    if args.profile:
+        profile_query(args.profile, Path(args.out), args.top_k, args.retriever, args.repeat)
+    if args.report:
+        since = int((time.time() - args.since_hours * 3600) * 1000) if args.since_hours else None
+        report(since)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""SQL histogram percentiles (src/analytics.py) against sorting the raw rows."""
+import math
+
+import numpy as np
+import pytest
+
+from src import analytics, storage
+
+
+@pytest.fixture
+def events_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DB_PATH", tmp_path / "events.db")
+    rng = np.random.default_rng(0)
+    rows = {"A": [], "B": []}
+    conn = storage.get_conn()
+    with conn:
+        for i in range(3000):
+            variant = "A" if i % 3 else "B"
+            latency = int(300 + rng.exponential(700 if variant == "A" else 900))
+            # 답변 캐시 / 검색 결과 캐시 hit 은 latency 분석에서 빠져야 함
+            cache_hit = "exact" if i % 40 == 0 else None
+            retrieval_hit = 1 if i % 25 == 1 else None
+            if cache_hit is None and retrieval_hit is None:
+                rows[variant].append(latency)
+            conn.execute(
+                "INSERT INTO queries (query_id, ts_ms, experiment, variant, latency_ms, cache_hit,"
+                " retrieval_cache_hit) VALUES (?, ?, 'exp', ?, ?, ?, ?)",
+                (f"q{i}", 1_700_000_000_000 + i, variant, latency, cache_hit, retrieval_hit),
+            )
+    conn.close()
+    return rows
+
+
+def _nearest_rank(sorted_values, q):
+    return float(sorted_values[max(1, math.ceil(q / 100 * len(sorted_values))) - 1])
+
+
+def test_latency_stats_match_sorted_rows(events_db):
+    out = analytics.latency_stats(["exp"])
+    assert set(out) == {"A", "B"}
+    for variant, latencies in events_db.items():
+        x = np.sort(latencies)
+        row = out[variant]
+        assert row["n"] == len(x)
+        assert row["mean_ms"] == pytest.approx(x.mean(), abs=0.05)
+        assert (row["min_ms"], row["max_ms"]) == (x[0], x[-1])
+        for q in analytics.PERCENTILES:
+            assert row[f"p{q}_ms"] == _nearest_rank(x, q)
+
+
+def test_latency_stats_time_window(events_db):
+    since = 1_700_000_000_000 + 1500
+    out = analytics.latency_stats(["exp"], variants=["A"], since_ms=since)
+    # 창 안의 A 행만 (캐시 hit 제외)
+    expected = [i for i in range(1500, 3000) if i % 3 and i % 40 and i % 25 != 1]
+    assert out["A"]["n"] == len(expected)
+
+
+def test_percentile_on_histogram():
+    values = np.array([10.0, 20.0, 30.0])
+    counts = np.array([1, 2, 7])
+    expanded = np.repeat(values, counts)
+    for q in (1, 10, 11, 30, 31, 50, 99, 100):
+        assert analytics.percentile(values, counts, q) == _nearest_rank(expanded, q)
@@ -0,0 +1,177 @@
+"""src/stats.py against published values and brute-force references on the expanded samples."""
+import math
+
+import numpy as np
+import pytest
+
+from src import stats
+
+
+def _hist(sample):
+    values, counts = np.unique(sample, return_counts=True)
+    return values.astype(np.float64), counts.astype(np.int64)
+
+
+@pytest.mark.parametrize("p, z", [
+    (0.5, 0.0), (0.975, 1.959963984540054), (0.995, 2.5758293035489004), (0.01, -2.3263478740408408),
+    (1e-6, -4.753424308822899),
+])
+def test_norm_ppf_reference_values(p, z):
+    assert stats.norm_ppf(p) == pytest.approx(z, abs=1e-8)
+    assert stats.norm_cdf(z) == pytest.approx(p, rel=1e-7)
+
+
+def test_norm_ppf_rejects_out_of_range():
+    for p in (0, 1, -0.1):
+        with pytest.raises(ValueError):
+            stats.norm_ppf(p)
+
+
+@pytest.mark.parametrize("x, n, lo, hi", [
+    # Newcombe (1998), 95% Wilson 구간
+    (81, 263, 0.2553, 0.3662),
+    (15, 148, 0.0624, 0.1605),
+    (0, 20, 0.0, 0.1611),
+    (1, 29, 0.0061, 0.1718),
+    (5, 10, 0.2366, 0.7634),
+])
+def test_wilson_interval_reference_values(x, n, lo, hi):
+    assert stats.wilson_interval(x, n) == pytest.approx((lo, hi), abs=1e-4)
+
+
+def test_wilson_interval_without_data():
+    assert stats.wilson_interval(0, 0) == (0.0, 1.0)
+
+
+def test_two_proportion_test():
+    out = stats.two_proportion_test(40, 100, 55, 100)
+    pooled = 95 / 200
+    z = 0.15 / math.sqrt(pooled * (1 - pooled) * (2 / 100))
+    assert out["diff"] == pytest.approx(0.15)
+    assert out["z"] == pytest.approx(z)
+    assert out["p_value"] == pytest.approx(0.03367, abs=1e-4)
+    half = 1.959963984540054 * math.sqrt(0.4 * 0.6 / 100 + 0.55 * 0.45 / 100)
+    assert out["ci"] == pytest.approx((0.15 - half, 0.15 + half))
+    assert stats.two_proportion_test(1, 0, 1, 10)["p_value"] is None
+
+
+def _mann_whitney_brute(x1, x2):
+    """U, z, p from explicit pairs and average ranks of the pooled sample."""
+    diff = x2[:, None] - x1[None, :]
+    u2 = float((diff > 0).sum() + 0.5 * (diff == 0).sum())
+    n1, n2 = len(x1), len(x2)
+    pooled = np.concatenate([x1, x2])
+    _, ties = np.unique(pooled, return_counts=True)
+    n = n1 + n2
+    tie = float((ties.astype(np.float64) ** 3 - ties).sum())
+    var = n1 * n2 / 12 * ((n + 1) - tie / (n * (n - 1)))
+    z = (u2 - n1 * n2 / 2) / math.sqrt(var)
+    return u2, z, 2 * (1 - stats.norm_cdf(abs(z)))
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_mann_whitney_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    # 정수 ms 라서 tie 가 많다
+    x1 = rng.integers(100, 160, size=300).astype(np.float64)
+    x2 = (rng.integers(100, 160, size=200) + seed * 3).astype(np.float64)
+    u2, z, p = _mann_whitney_brute(x1, x2)
+    out = stats.mann_whitney(*_hist(x1), *_hist(x2))
+    assert out["u"] == pytest.approx(u2)
+    assert out["z"] == pytest.approx(z)
+    assert out["p_value"] == pytest.approx(p)
+    assert out["prob_2_greater"] == pytest.approx(u2 / (len(x1) * len(x2)))
+
+
+def test_mann_whitney_empty_side():
+    values, counts = _hist(np.array([1.0, 2.0]))
+    out = stats.mann_whitney(values, counts, np.zeros(0), np.zeros(0, dtype=np.int64))
+    assert out["p_value"] is None
+
+
+def test_bootstrap_quantile_diff():
+    rng = np.random.default_rng(0)
+    x1 = np.round(300 + rng.exponential(800, size=4000))
+    x2 = np.round(350 + rng.exponential(800, size=3000))
+    h1, h2 = _hist(x1), _hist(x2)
+    out = stats.bootstrap_quantile_diff(*h1, *h2, q=0.5, n_boot=2000, seed=1)
+
+    # 점 추정 = nearest-rank 중앙값의 차이 (정렬해서 인덱싱)
+    def nearest_rank(x, q):
+        return np.sort(x)[max(1, math.ceil(q * len(x))) - 1]
+
+    assert out["diff"] == nearest_rank(x2, 0.5) - nearest_rank(x1, 0.5)
+    # 같은 seed 면 같은 결과
+    assert stats.bootstrap_quantile_diff(*h1, *h2, q=0.5, n_boot=2000, seed=1) == out
+
+    # 행 단위 재표본 bootstrap 과 구간이 비슷해야 함 (Poisson bootstrap 은 n 이 크면 같은 분포)
+    boot = np.array([
+        nearest_rank(rng.choice(x2, len(x2)), 0.5) - nearest_rank(rng.choice(x1, len(x1)), 0.5)
+        for _ in range(2000)
+    ])
+    lo, hi = np.quantile(boot, [0.025, 0.975])
+    width = hi - lo
+    assert out["ci"][0] == pytest.approx(lo, abs=0.15 * width)
+    assert out["ci"][1] == pytest.approx(hi, abs=0.15 * width)
+
+
+def test_bootstrap_quantile_diff_without_data():
+    values, counts = _hist(np.array([1.0, 2.0]))
+    assert stats.bootstrap_quantile_diff(values, counts, values, np.zeros(2, dtype=np.int64))["ci"] is None
+
+
+@pytest.mark.parametrize("diff, var, tau2", [(0.0, 0.01, 0.04), (0.1, 0.001, 0.01), (-0.3, 0.02, 0.5)])
+def test_msprt_lambda_matches_numeric_mixture(diff, var, tau2):
+    # Lambda = ∫ N(diff; theta, var) N(theta; 0, tau2) dtheta / N(diff; 0, var) 를 수치 적분
+    sd = math.sqrt(tau2)
+    theta = np.linspace(-12 * sd, 12 * sd, 200001)
+    like = np.exp(-(diff - theta) ** 2 / (2 * var)) / math.sqrt(2 * math.pi * var)
+    prior = np.exp(-theta ** 2 / (2 * tau2)) / math.sqrt(2 * math.pi * tau2)
+    y = like * prior
+    numerator = float(((y[1:] + y[:-1]) / 2 * np.diff(theta)).sum())
+    null = math.exp(-diff * diff / (2 * var)) / math.sqrt(2 * math.pi * var)
+    assert stats.msprt_lambda(diff, var, tau2) == pytest.approx(numerator / null, rel=1e-6)
+    assert stats.msprt_lambda(diff, 0.0, tau2) == 1.0
+
+
+def test_always_valid_pvalues_are_monotone_and_decide():
+    steps = [(0.0, 0.01), (0.3, 0.01), (0.05, 0.001), (0.2, 0.0005)]
+    p = stats.always_valid_pvalues(steps, tau2=0.01)
+    # diff = 0 이면 Lambda < 1 -> p 는 1 에서 시작해서 줄기만 함
+    assert p[0] == 1.0
+    assert p[1] == pytest.approx(1 / stats.msprt_lambda(0.3, 0.01, 0.01))
+    assert all(a >= b for a, b in zip(p, p[1:]))
+    assert stats.sequential_decision(p) == next(i for i, v in enumerate(p) if v < 0.05)
+    assert stats.sequential_decision([1.0, 0.5]) is None
+
+
+def test_always_valid_pvalues_control_error_under_null():
+    # H0 (두 arm 의 전환율이 같음) 에서 매 20건마다 들여다봐도 한 번이라도 p < 0.05 인 비율이 alpha 근처 이하
+    rng = np.random.default_rng(0)
+    runs, looks, per_look = 400, 50, 20
+    rejected = 0
+    for _ in range(runs):
+        x = rng.random((2, looks * per_look)) < 0.3
+        cumulative = [(int(x[0, :m].sum()), m, int(x[1, :m].sum()), m)
+                      for m in range(per_look, looks * per_look + 1, per_look)]
+        p = stats.always_valid_pvalues(stats.proportion_steps(cumulative), tau2=0.01)
+        rejected += stats.sequential_decision(p) is not None
+    assert rejected / runs <= 0.05 + 0.025
+
+
+def test_mean_steps_match_sample_moments():
+    rng = np.random.default_rng(3)
+    a, b = rng.normal(100, 10, size=50), rng.normal(105, 20, size=40)
+    row = (len(a), a.sum(), (a * a).sum(), len(b), b.sum(), (b * b).sum())
+    [(diff, var)] = stats.mean_steps([row, (1, 1.0, 1.0, 5, 5.0, 5.0)])
+    assert diff == pytest.approx(b.mean() - a.mean())
+    assert var == pytest.approx(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+
+
+def test_proportion_steps_skip_empty_looks():
+    steps = stats.proportion_steps([(0, 0, 1, 3), (2, 10, 5, 10)])
+    assert len(steps) == 1
+    diff, var = steps[0]
+    assert diff == pytest.approx(0.3)
+    q1, q2 = 2.5 / 11, 5.5 / 11
+    assert var == pytest.approx(q1 * (1 - q1) / 10 + q2 * (1 - q2) / 10)
@@ -0,0 +1,126 @@
+"""Event-log migrations: a baseline events.db (the original single events table) -> SCHEMA_VERSION."""
+import sqlite3
+
+import pytest
+
+from src import storage
+
+# 초기 버전 storage.py 가 만들던 테이블 (ALTER TABLE 로 붙은 컬럼 없음)
+BASELINE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  ts TEXT NOT NULL,
+  session_id TEXT,
+  experiment TEXT,
+  variant TEXT,
+  question TEXT,
+  top_k INTEGER,
+  latency_ms INTEGER,
+  citations TEXT,
+  source_pages TEXT,
+  answer TEXT,
+  user_vote TEXT
+);
+"""
+
+# (ts, session_id, experiment, variant, question, top_k, latency_ms, citations, source_pages, answer, user_vote)
+BASELINE_ROWS = [
+    ("2024-01-02T03:04:05.678000", "s1", "topk_ab", "A", "What is KNN?", 2, 812, "[1]", "3,4", "KNN is ...", None),
+    ("2024-01-02T03:04:09.000000", "s1", "topk_ab", "A", "What is KNN?", 2, None, None, None, None, "up"),
+    ("2024-01-02T03:05:00.000000", "s1", "topk_ab", "A", "What is KNN?", 2, 640, "[2]", "4", "KNN again", None),
+    ("2024-01-02T03:05:01.500000", "s1", "topk_ab", "A", "What is KNN?", 2, None, None, None, None, "down"),
+    ("2024-01-02T03:06:00.000000", "s2", "topk_ab", "B", "What is SVM?", 4, 1500, "[1]", "7", "SVM is ...", None),
+    # 앞에 같은 질문이 없는 투표 -> 투표 행 자체가 query 로 보존됨
+    ("2024-01-02T03:07:00.000000", "s3", "topk_ab", "B", "orphan", 4, 99, None, None, None, "up"),
+    # experiment / variant 가 NULL 인 예전 행 -> '' 로 옮겨짐
+    ("2024-01-02T03:08:00.000000", None, None, None, "legacy", 4, 300, None, None, None, None),
+]
+
+LEGACY_COLUMNS = ["id", "ts", "session_id", "experiment", "variant", "question", "top_k", "latency_ms",
+                  "citations", "source_pages", "answer", "user_vote"]
+
+
+def _baseline_db(path, added_columns=()) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    for name in added_columns:
+        conn.execute(f"ALTER TABLE events ADD COLUMN {name} {storage.ADDED_COLUMNS[name]}")
+    conn.executemany(
+        "INSERT INTO events (ts, session_id, experiment, variant, question, top_k, latency_ms, citations,"
+        " source_pages, answer, user_vote) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        BASELINE_ROWS,
+    )
+    conn.commit()
+    return conn
+
+
+@pytest.mark.parametrize("added_columns", [(), ("embed_ms", "cache_hit")])
+def test_baseline_to_latest(tmp_path, added_columns):
+    conn = _baseline_db(tmp_path / "events.db", added_columns)
+    assert storage.migrate(conn) == 0
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == storage.SCHEMA_VERSION
+
+    # 질문 행 4개 + 연결할 질문이 없는 투표 1개
+    queries = conn.execute("SELECT query_id, ts_ms, experiment, variant, latency_ms FROM queries ORDER BY ts_ms")
+    assert [(q, ts, e, v, ms) for q, ts, e, v, ms in queries] == [
+        ("v1-1", 1704164645678, "topk_ab", "A", 812),
+        ("v1-3", 1704164700000, "topk_ab", "A", 640),
+        ("v1-5", 1704164760000, "topk_ab", "B", 1500),
+        ("v1-6", 1704164820000, "topk_ab", "B", 99),
+        ("v1-7", 1704164880000, "", "", 300),
+    ]
+    # 투표는 같은 세션에서 바로 앞에 기록된 같은 질문에 연결
+    votes = conn.execute("SELECT query_id, ts_ms, vote FROM votes ORDER BY ts_ms").fetchall()
+    assert votes == [("v1-1", 1704164649000, "up"), ("v1-3", 1704164701500, "down"), ("v1-6", 1704164820000, "up")]
+
+    # 이후 버전에서 추가된 컬럼 / 테이블 / 인덱스
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(queries)")]
+    for name in list(storage.ADDED_COLUMNS) + list(storage.USAGE_COLUMNS) + ["retrieval_cache_hit"]:
+        assert name in columns
+    assert conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'spans'").fetchone()
+    hist_index = [row[2] for row in conn.execute("PRAGMA index_info(idx_queries_latency_hist)")]
+    assert hist_index == ["experiment", "variant", "cache_hit", "retrieval_cache_hit", "latency_ms", "ts_ms"]
+
+
+def test_events_view_keeps_legacy_shape(tmp_path):
+    conn = _baseline_db(tmp_path / "events.db")
+    storage.migrate(conn)
+    view_columns = [row[1] for row in conn.execute("PRAGMA table_info(events)")]
+    assert view_columns[:len(LEGACY_COLUMNS)] == LEGACY_COLUMNS
+    assert view_columns[-1] == "query_id"
+
+    # 예전 코드처럼 events 를 읽으면 질문 행과 투표 행이 같은 모양으로 나온다
+    rows = conn.execute(
+        "SELECT ts, session_id, experiment, variant, question, top_k, latency_ms, answer, user_vote FROM events"
+        " ORDER BY ts, user_vote IS NOT NULL"
+    ).fetchall()
+    assert len(rows) == len(BASELINE_ROWS) + 1  # 고아 투표는 query + vote 두 행
+    assert rows[0] == ("2024-01-02T03:04:05.678", "s1", "topk_ab", "A", "What is KNN?", 2, 812, "KNN is ...", None)
+    # 투표 행은 연결된 질문의 답변과 함께, 시각은 투표 시각
+    assert rows[1] == ("2024-01-02T03:04:09.000", "s1", "topk_ab", "A", "What is KNN?", 2, 812, "KNN is ...", "up")
+    assert [r[8] for r in rows if r[8] is not None] == ["up", "down", "up"]
+
+
+def test_migrate_is_idempotent_and_logging_works(tmp_path, monkeypatch):
+    path = tmp_path / "events.db"
+    _baseline_db(path).close()
+    monkeypatch.setattr(storage, "DB_PATH", path)
+
+    conn = storage.get_conn()
+    assert storage.migrate(conn) == storage.SCHEMA_VERSION
+    conn.close()
+
+    query_id = storage.log_query("s9", "topk_ab", "B", "new question", 4, 321, "[1]", "2", "answer",
+                                 timings={"embed_ms": 1.0, "retrieval_cache_saved_ms": 5.0},
+                                 usage={"prompt_tokens": 10}, sync=True)
+    storage.log_vote(query_id, "s9", "topk_ab", "B", "up", sync=True)
+    conn = storage.get_conn()
+    try:
+        row = conn.execute("SELECT latency_ms, embed_ms, prompt_tokens, retrieval_cache_hit FROM queries"
+                           " WHERE query_id = ?", (query_id,)).fetchone()
+        assert row == (321, 1.0, 10, 1)
+        votes = conn.execute("SELECT user_vote FROM events WHERE query_id = ? AND user_vote IS NOT NULL",
+                             (query_id,)).fetchall()
+        assert votes == [("up",)]
+    finally:
+        conn.close()